@@ -0,0 +1,218 @@
+"""
+Write throughput, size and point-in-time reconstruction of the cluster delta
+log against one JSON line per cluster.
+
+Clusters are built up front from a synthetic listening session, where the
+track changes every few events and pauses and volume changes happen in
+between, or from the cluster frames of `spotivents.replay` recordings:
+
+```sh
+python -m benchmarks.deltalog --events 5000
+python -m benchmarks.deltalog --recording session.rec
+```
+"""
+
+import argparse
+import json as stdlib_json
+import logging
+import os
+import pathlib
+import random
+import sys
+import tempfile
+import time
+import typing as t
+
+from spotivents.clustercls import (
+    SharedObjects,
+    SpotifyDeviceStateChangeCluster,
+    merge_absent_fields,
+)
+from spotivents.deltalog import DeltaLogReader, DeltaLogWriter, decode_tree, encode_tree
+from spotivents.optopt import json
+
+from .payloads import cluster, recorded_frames
+
+
+def session_clusters(*, events: int, queue: int, devices: int) -> t.List:
+    payloads = []
+
+    for index in range(events):
+        payload = cluster(
+            queue=queue,
+            devices=devices,
+            position=index // 8,
+            paused=(index // 3) % 2 == 1,
+        )
+        payload["server_timestamp_ms"] = str(1666000000000 + index * 1000)
+
+        for device in payload["devices"].values():
+            device["volume"] = 65535 * (index % 16) // 15
+
+        payloads.append(payload)
+
+    return payloads
+
+
+def recorded_clusters(path: str) -> t.List:
+    return [
+        json.loads(frame)["payloads"][0]["cluster"] for frame in recorded_frames(path)
+    ]
+
+
+def materialise(payloads: t.List) -> t.List:
+    clusters = []
+    previous = None
+    shared = SharedObjects()
+
+    for payload in payloads:
+        current = SpotifyDeviceStateChangeCluster.from_dict(
+            "DEVICE_STATE_CHANGED", payload, shared=shared
+        )
+        # The client carries values missing from partial clusters over.
+        merge_absent_fields(previous, current)
+        clusters.append(current)
+        previous = current
+
+    return clusters
+
+
+def timestamp_of(cluster) -> float:
+    return int(cluster.server_timestamp_ms) / 1000
+
+
+def write_jsonl(path: str, clusters: t.List):
+    with open(path, "w") as file:
+        for cluster in clusters:
+            file.write(
+                json.dumps(
+                    {
+                        "timestamp": timestamp_of(cluster),
+                        "cluster": encode_tree(cluster),
+                    }
+                )
+            )
+            file.write("\n")
+
+
+def read_jsonl(path: str, timestamp: float):
+    state = None
+
+    with open(path) as file:
+        for line in file:
+            record = json.loads(line)
+
+            if record["timestamp"] > timestamp:
+                break
+
+            state = record["cluster"]
+
+    return None if state is None else decode_tree(state)
+
+
+def write_deltalog(path: str, clusters: t.List, snapshot_interval: int):
+    with DeltaLogWriter(path, snapshot_interval=snapshot_interval) as writer:
+        for cluster in clusters:
+            writer.write(cluster)
+
+
+def measure(
+    name: str, clusters: t.List, *, lookups: int, snapshot_interval: int
+) -> t.Dict[str, t.Any]:
+    with tempfile.TemporaryDirectory() as directory:
+        path = str(pathlib.Path(directory) / "clusters")
+
+        started = time.perf_counter()
+
+        if name == "jsonl":
+            write_jsonl(path, clusters)
+        else:
+            write_deltalog(path, clusters, snapshot_interval)
+
+        elapsed = time.perf_counter() - started
+
+        size = sum(os.path.getsize(file) for file in pathlib.Path(directory).iterdir())
+
+        timestamps = random.Random(0).choices(
+            [timestamp_of(cluster) for cluster in clusters], k=lookups
+        )
+
+        started = time.perf_counter()
+
+        if name == "jsonl":
+            for timestamp in timestamps:
+                read_jsonl(path, timestamp)
+        else:
+            reader = DeltaLogReader(path)
+
+            for timestamp in timestamps:
+                reader.at(timestamp)
+
+        lookup_elapsed = time.perf_counter() - started
+
+    return {
+        "format": name,
+        "events": len(clusters),
+        "events_per_second": len(clusters) / elapsed,
+        "bytes": size,
+        "bytes_per_event": size / len(clusters),
+        "lookup_ms": lookup_elapsed / lookups * 1000,
+    }
+
+
+def main(argv: t.Optional[t.List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--queue", type=int, default=50)
+    parser.add_argument("--devices", type=int, default=4)
+    parser.add_argument("--recording", action="append", default=[])
+    parser.add_argument("--snapshot-interval", type=int, default=256)
+    parser.add_argument("--lookups", type=int, default=20)
+    parser.add_argument("--output")
+
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL)
+
+    workloads = {
+        f"session-{args.events}": session_clusters(
+            events=args.events, queue=args.queue, devices=args.devices
+        )
+    }
+
+    for recording in args.recording:
+        payloads = recorded_clusters(recording)
+
+        if payloads:
+            workloads[f"recording:{pathlib.Path(recording).name}"] = payloads
+
+    results = []
+
+    for workload, payloads in workloads.items():
+        clusters = materialise(payloads)
+
+        for name in ("jsonl", "deltalog"):
+            result = measure(
+                name,
+                clusters,
+                lookups=args.lookups,
+                snapshot_interval=args.snapshot_interval,
+            )
+            result["workload"] = workload
+            results.append(result)
+
+            print(
+                f"{workload:<24} {name:<9} "
+                f"{result['events_per_second']:>9.0f} events/s "
+                f"{result['bytes_per_event']:>9.0f} B/event "
+                f"{result['bytes'] / 1024:>9.0f} KiB "
+                f"{result['lookup_ms']:>8.2f}ms/lookup",
+                file=sys.stderr,
+            )
+
+    if args.output:
+        pathlib.Path(args.output).write_text(stdlib_json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
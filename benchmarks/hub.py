@@ -0,0 +1,210 @@
+"""
+Per-connection cost of many accounts on one loop, against a local dealer
+stand-in running in a separate process.
+
+Accounts are connected either as independent `SpotifyClient`s, each with its
+own heartbeat task, or through one `SpotifyClientHub`; the traced memory and
+the CPU time spent while idling through heartbeats are reported per
+connection:
+
+```sh
+python -m benchmarks.hub --accounts 1000 --idle 30
+```
+"""
+
+import argparse
+import asyncio
+import gc
+import json as stdlib_json
+import logging
+import multiprocessing
+import pathlib
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing as t
+
+import aiohttp
+
+from spotivents.client import SpotifyClient
+from spotivents.hub import SpotifyClientHub
+from spotivents.optopt import json
+from spotivents.replay import DealerStandIn, FrameRecorder, ReplayAuthenticator
+
+from .payloads import cluster, cluster_frame
+
+
+def serve_stand_in(path: str, port: int):
+    async def serve():
+        async with DealerStandIn(path, speed=None, port=port, close_after_replay=False):
+            await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+async def wait_for_port(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+        else:
+            writer.close()
+            return
+
+
+async def connect_accounts(mode: str, stand_in: DealerStandIn, accounts: int):
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0))
+    received = [0]
+
+    async def on_cluster(cluster):
+        received[0] += 1
+
+    options = {
+        "dealer_endpoint": stand_in.dealer_endpoint,
+        "spclient_endpoint": stand_in.spclient_endpoint,
+    }
+
+    if mode == "hub":
+        hub = SpotifyClientHub(
+            session,
+            heartbeat_interval=1.0,
+            **options,
+        )
+        hub.on_cluster_receive()(on_cluster)
+
+        for index in range(accounts):
+            hub.add_account(str(index), ReplayAuthenticator())
+            hub.start_account(str(index))
+
+        return session, received, list(hub.clients.values()), hub.close
+
+    clients = []
+
+    for _ in range(accounts):
+        client = SpotifyClient(session, ReplayAuthenticator(), **options)
+        client.on_cluster_receive()(on_cluster)
+
+        clients.append(client)
+
+        await client.run(
+            is_blocking=False,
+            heartbeat=lambda ws, interval, client=client: client.heartbeat_task(
+                ws, interval=1.0
+            ),
+        )
+
+    async def close():
+        for client in clients:
+            client.ws_task.cancel()
+
+    return session, received, clients, close
+
+
+async def measure(mode: str, stand_in: DealerStandIn, *, accounts: int, idle: float):
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+
+    started = time.perf_counter()
+    session, received, clients, close = await connect_accounts(mode, stand_in, accounts)
+
+    # Every account receives the ON_LOAD cluster and one replayed frame.
+    while received[0] < accounts * 2:
+        await asyncio.sleep(0.01)
+
+    connected = time.perf_counter() - started
+
+    gc.collect()
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    pongs_started = sum(
+        client.latency_monitor.rtt.histogram.count for client in clients
+    )
+    cpu_started = time.process_time()
+    await asyncio.sleep(idle)
+    idle_cpu = time.process_time() - cpu_started
+    pongs = (
+        sum(client.latency_monitor.rtt.histogram.count for client in clients)
+        - pongs_started
+    )
+
+    await close()
+    await session.close()
+    await asyncio.sleep(0.1)
+
+    return {
+        "mode": mode,
+        "accounts": accounts,
+        "connect_s": connected,
+        "memory_bytes_per_connection": (memory - baseline) / accounts,
+        "idle_cpu_us_per_connection_second": idle_cpu / accounts / idle * 1e6,
+        "idle_cpu_us_per_heartbeat": idle_cpu / max(pongs, 1) * 1e6,
+        "heartbeats_per_second": pongs / idle,
+    }
+
+
+def main(argv: t.Optional[t.List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=500)
+    parser.add_argument("--idle", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=45761)
+    parser.add_argument("--mode", action="append", choices=("clients", "hub"))
+    parser.add_argument("--output")
+
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as directory:
+        recording = str(pathlib.Path(directory) / "hub.rec")
+
+        with FrameRecorder(recording) as recorder:
+            recorder.write_cluster_state(json.dumps(cluster(queue=10, devices=2)))
+            recorder.write_frame(cluster_frame(cluster(queue=10, devices=2)))
+
+        server = multiprocessing.Process(
+            target=serve_stand_in, args=(recording, args.port), daemon=True
+        )
+        server.start()
+
+        try:
+            # Only used for its endpoints; the server runs in the other process.
+            stand_in = DealerStandIn(recording, port=args.port)
+
+            async def run():
+                await wait_for_port(args.port)
+
+                return [
+                    await measure(
+                        mode, stand_in, accounts=args.accounts, idle=args.idle
+                    )
+                    for mode in args.mode or ("clients", "hub")
+                ]
+
+            results = asyncio.run(run())
+        finally:
+            server.terminate()
+
+    for result in results:
+        print(
+            f"{result['mode']:<8} {result['accounts']:>6} accounts "
+            f"connect {result['connect_s']:>6.2f}s "
+            f"{result['memory_bytes_per_connection'] / 1024:>7.1f}KiB/connection "
+            f"{result['idle_cpu_us_per_connection_second']:>7.1f}µs CPU/connection/s idle "
+            f"{result['idle_cpu_us_per_heartbeat']:>7.1f}µs CPU/heartbeat "
+            f"({result['heartbeats_per_second']:.0f}/s)",
+            file=sys.stderr,
+        )
+
+    if args.output:
+        pathlib.Path(args.output).write_text(stdlib_json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
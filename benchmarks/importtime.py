@@ -0,0 +1,133 @@
+"""
+Import cost of the package, as reported by `python -X importtime`.
+
+Every statement runs in a fresh interpreter `--repeat` times; the cost of a
+run is the cumulative time of the imports it triggered beyond interpreter
+startup. The median is reported along with the heaviest modules by their own
+import time and which optional heavy dependencies were pulled in:
+
+```sh
+python -m benchmarks.importtime
+python -m benchmarks.importtime --statement "from spotivents import SpotifyClient"
+python -m benchmarks.importtime --output importtime.json
+```
+"""
+
+import argparse
+import json as stdlib_json
+import pathlib
+import re
+import statistics
+import subprocess
+import sys
+import typing as t
+
+STATEMENTS = (
+    "import spotivents",
+    "from spotivents import SpotifyAuthenticator",
+    "from spotivents.utils import encode_bytes_to_basex",
+    "from spotivents import SpotifyAPIControllerClient",
+    "from spotivents import SpotifyClient",
+)
+
+HEAVY_MODULES = ("aiohttp", "yarl", "msgspec", "webbrowser")
+
+IMPORTTIME_LINE = re.compile(r"import time:\s*(\d+) \|\s*(\d+) \|( *)(\S+)")
+
+
+def imports(statement: str) -> t.List[t.Tuple[str, int, int, int]]:
+    """
+    `(module, self_us, cumulative_us, depth)` of every import `statement`
+    triggers, startup included.
+    """
+    stderr = subprocess.run(
+        (sys.executable, "-X", "importtime", "-c", statement),
+        capture_output=True,
+        check=True,
+        text=True,
+        cwd=pathlib.Path(__file__).parent.parent,
+    ).stderr
+
+    return [
+        (module, int(self_us), int(cumulative_us), len(indent) // 2)
+        for self_us, cumulative_us, indent, module in IMPORTTIME_LINE.findall(stderr)
+    ]
+
+
+def measure(
+    statement: str, startup: t.Set[str], *, repeat: int, top: int
+) -> t.Dict[str, t.Any]:
+    totals = []
+    self_times: t.Dict[str, t.List[int]] = {}
+    loaded: t.Set[str] = set()
+
+    for _ in range(repeat):
+        total = 0
+
+        for module, self_us, cumulative_us, depth in imports(statement):
+            if module in startup:
+                continue
+
+            if not depth:
+                total += cumulative_us
+
+            self_times.setdefault(module, []).append(self_us)
+            loaded.add(module)
+
+        totals.append(total)
+
+    heaviest = sorted(
+        ((module, statistics.median(times)) for module, times in self_times.items()),
+        key=lambda item: item[1],
+        reverse=True,
+    )[:top]
+
+    return {
+        "statement": statement,
+        "median_ms": statistics.median(totals) / 1000,
+        "best_ms": min(totals) / 1000,
+        "modules": len(loaded),
+        "heavy_modules": [module for module in HEAVY_MODULES if module in loaded],
+        "heaviest": [
+            {"module": module, "self_ms": self_us / 1000}
+            for module, self_us in heaviest
+        ],
+    }
+
+
+def main(argv: t.Optional[t.List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--statement", action="append")
+    parser.add_argument("--repeat", type=int, default=9)
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--output")
+
+    args = parser.parse_args(argv)
+
+    startup = {module for module, *_ in imports("pass")}
+
+    results = []
+
+    for statement in args.statement or STATEMENTS:
+        result = measure(statement, startup, repeat=args.repeat, top=args.top)
+        results.append(result)
+
+        print(
+            f"{statement:<52} {result['median_ms']:>7.1f}ms "
+            f"{result['modules']:>4} modules  "
+            f"{','.join(result['heavy_modules']) or '-'}",
+            file=sys.stderr,
+        )
+
+        for heavy in result["heaviest"]:
+            print(
+                f"{'':<4}{heavy['module']:<48} {heavy['self_ms']:>7.1f}ms",
+                file=sys.stderr,
+            )
+
+    if args.output:
+        pathlib.Path(args.output).write_text(stdlib_json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
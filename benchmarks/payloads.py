@@ -0,0 +1,176 @@
+"""
+Dealer frames for the benchmarks: synthetic clusters shaped like the ones
+the dealer sends, and frames taken from `spotivents.replay` recordings.
+"""
+
+import typing as t
+
+from spotivents.optopt import json
+from spotivents.replay import FRAME_RECORD, iter_records
+from spotivents.ws import CLUSTER_FRAME_URI
+
+
+def track_metadata(index: int) -> t.Dict[str, str]:
+    return {
+        "actions.advancing_past_track": "resume",
+        "actions.skipping_next_past_track": "resume",
+        "actions.skipping_prev_past_track": "resume",
+        "autoplay.is_autoplay": "false",
+        "media.media_type": "AUDIO",
+        "media.start_position": "0",
+        "collection.artist.is_banned": "false",
+        "collection.is_banned": "false",
+        "shuffle.distribution": "1",
+        "context_uri": "spotify:playlist:37i9dQZF1DXcBWIGoYBM5M",
+        "entity_uri": "spotify:playlist:37i9dQZF1DXcBWIGoYBM5M",
+        "page_instance_id": f"{index:036d}",
+        "track_player": "audio",
+        "title": f"Track {index}",
+        "artist_uri": f"spotify:artist:{index % 7:022d}",
+        "artist_name": f"Artist {index % 7}",
+        "artist_uri:1": f"spotify:artist:{index % 5:022d}",
+        "artist_name:1": f"Featured {index % 5}",
+        "image_url": f"spotify:image:{index:040d}",
+        "image_small_url": f"spotify:image:{index:040d}",
+        "image_large_url": f"spotify:image:{index:040d}",
+        "image_xlarge_url": f"spotify:image:{index:040d}",
+        "album_title": f"Album {index % 11}",
+        "album_uri": f"spotify:album:{index % 11:022d}",
+        "iteration": "0",
+        "interaction_id": f"{index:036d}",
+        "decision_id": f"{index:020d}",
+    }
+
+
+def track(index: int) -> t.Dict[str, t.Any]:
+    return {
+        "uri": f"spotify:track:{index:022d}",
+        "uid": f"{index:016x}",
+        "provider": "context",
+        "metadata": track_metadata(index),
+    }
+
+
+def device(index: int) -> t.Dict[str, t.Any]:
+    return {
+        "can_play": True,
+        "volume": 65535,
+        "name": f"Device {index}",
+        "capabilities": {
+            "can_be_player": True,
+            "gaia_eq_connect_id": True,
+            "supports_logout": True,
+            "is_observable": True,
+            "volume_steps": 64,
+            "supported_types": ["audio/track", "audio/episode"],
+            "command_acks": True,
+        },
+        "device_type": "COMPUTER",
+        "device_software_version": "1.2.3",
+        "spirc_version": "3.2.6",
+        "device_id": f"{index:040x}",
+        "client_id": f"{index:032x}",
+        "brand": "spotify",
+        "model": "PC desktop",
+        "metadata_map": {},
+        "public_ip": "192.0.2.1",
+        "license": "premium",
+    }
+
+
+def cluster(
+    *, queue: int, devices: int, position: int = 0, paused: bool = False
+) -> t.Dict[str, t.Any]:
+    active_device_id = f"{0:040x}"
+
+    return {
+        "timestamp": "1666000000000",
+        "server_timestamp_ms": "1666000000100",
+        "active_device_id": active_device_id,
+        "need_full_player_state": False,
+        "needs_state_updates": True,
+        "transfer_data_timestamp": "1666000000000",
+        "player_state": {
+            "timestamp": "1666000000000",
+            "context_uri": "spotify:playlist:37i9dQZF1DXcBWIGoYBM5M",
+            "context_url": "context://spotify:playlist:37i9dQZF1DXcBWIGoYBM5M",
+            "context_restrictions": {},
+            "play_origin": {"feature_identifier": "playlist"},
+            "index": {"page": "0", "track": str(position)},
+            "track": track(position),
+            "playback_id": f"{position:032x}",
+            "playback_speed": 1.0,
+            "position_as_of_timestamp": "12345",
+            "duration": "200000",
+            "is_playing": True,
+            "is_paused": paused,
+            "is_buffering": False,
+            "is_system_initiated": False,
+            "options": {
+                "shuffling_context": False,
+                "repeating_context": False,
+                "repeating_track": False,
+            },
+            "restrictions": {},
+            "suppressions": {},
+            "prev_tracks": [
+                track(index) for index in range(max(0, position - 10), position)
+            ],
+            "next_tracks": [
+                track(index) for index in range(position + 1, position + queue + 1)
+            ],
+            "context_metadata": {"zelda.context_uri": "spotify:playlist:"},
+            "page_metadata": {},
+            "session_id": f"{position:032x}",
+            "queue_revision": str(position),
+            "playback_quality": {
+                "bitrate_level": "VERY_HIGH",
+                "strategy": "BEST_MATCHING",
+                "target_bitrate_level": "VERY_HIGH",
+                "target_bitrate_available": True,
+            },
+        },
+        "devices": {f"{index:040x}": device(index) for index in range(devices)},
+    }
+
+
+def cluster_frame(
+    cluster: t.Dict[str, t.Any], update_reason: str = "DEVICE_STATE_CHANGED"
+) -> bytes:
+    return json.dumps(
+        {
+            "type": "message",
+            "uri": CLUSTER_FRAME_URI,
+            "headers": {"Content-Type": "application/json"},
+            "payloads": [
+                {
+                    "cluster": cluster,
+                    "update_reason": update_reason,
+                    "devices_that_changed": [cluster["active_device_id"]],
+                }
+            ],
+        }
+    ).encode()
+
+
+def synthetic_frames(*, queue: int, devices: int) -> t.List[bytes]:
+    """
+    Consecutive cluster frames for a session skipping through its queue
+    and pausing in between.
+    """
+    return [
+        cluster_frame(
+            cluster(
+                queue=queue, devices=devices, position=step // 2, paused=step % 2 == 1
+            )
+        )
+        for step in range(4)
+    ]
+
+
+def recorded_frames(path: str) -> t.List[bytes]:
+    return [
+        data
+        for kind, _, data in iter_records(path)
+        if kind == FRAME_RECORD and CLUSTER_FRAME_URI.encode() in data
+    ]
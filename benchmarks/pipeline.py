@@ -0,0 +1,453 @@
+"""
+Per-stage benchmarks for the cluster event pipeline.
+
+Each stage is timed over synthetic frames at several queue and device counts,
+and over the frames of any `spotivents.replay` recordings given. For every
+stage the best and median time per operation is reported along with the peak
+and retained memory of a single operation, traced with `tracemalloc`.
+
+Results are written as JSON to `benchmarks/results/<commit>.json` so runs
+from different commits can be compared:
+
+```sh
+python -m benchmarks.pipeline
+python -m benchmarks.pipeline --recording session.rec --output after.json
+python -m benchmarks.pipeline --compare before.json after.json
+```
+"""
+
+import argparse
+import asyncio
+import datetime
+import json as stdlib_json
+import logging
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import typing as t
+
+from spotivents.client import SpotifyClient
+from spotivents.clustercls import (
+    SharedObjects,
+    SpotifyConnectDevice,
+    SpotifyDeviceStateChangeCluster,
+    SpotifyPlayerStatePartialTrack,
+    SpotifyTrackMetadata,
+    iter_handled_payloads,
+    merge_absent_fields,
+)
+from spotivents.optopt import json
+from spotivents.utils import get_from_cluster_getter
+
+from .payloads import recorded_frames, synthetic_frames
+
+RESULTS_DIRECTORY = pathlib.Path(__file__).parent / "results"
+
+SCENARIOS = {
+    "queue-0-devices-1": {"queue": 0, "devices": 1},
+    "queue-10-devices-2": {"queue": 10, "devices": 2},
+    "queue-50-devices-4": {"queue": 50, "devices": 4},
+    "queue-200-devices-4": {"queue": 200, "devices": 4},
+    "queue-50-devices-16": {"queue": 50, "devices": 16},
+    "queue-100-devices-8": {"queue": 100, "devices": 8},
+}
+
+# Shared across the runs of a stage, as a client shares it across frames.
+SHARED_OBJECTS = SharedObjects()
+
+DISPATCH_HANDLER_COUNTS = (1, 10, 100)
+
+CLUSTER_GETTERS = (
+    "player_state.track.uri",
+    "player_state.is_paused",
+    "player_state.options.shuffling_context",
+    "player_state.next_tracks",
+    "active_device_id",
+    "devices",
+)
+
+
+class Stage(t.NamedTuple):
+    name: str
+    # Builds the arguments of each operation up front, so that copying
+    # mutable inputs stays out of the measurements.
+    prepare: t.Callable[[t.List[bytes], int], t.List[t.Tuple]]
+    run: t.Callable
+
+
+def cycle(values: t.List, count: int) -> t.List:
+    return [values[index % len(values)] for index in range(count)]
+
+
+def decoded_clusters(frames: t.List[bytes], count: int) -> t.List[t.Tuple]:
+    return [
+        (payload["update_reason"], payload["cluster"])
+        for payload in (
+            json.loads(frame)["payloads"][0] for frame in cycle(frames, count)
+        )
+    ]
+
+
+def materialise(
+    update_reason: str, cluster: t.Dict, shared: SharedObjects = SHARED_OBJECTS
+):
+    return SpotifyDeviceStateChangeCluster.from_dict(
+        update_reason, cluster, shared=shared
+    )
+
+
+def device_fields(frames: t.List[bytes], count: int) -> t.List[t.Tuple]:
+    return [
+        (device,)
+        for device in cycle(
+            [
+                device
+                for _, cluster in decoded_clusters(frames, len(frames))
+                for device in cluster.get("devices", {}).values()
+            ],
+            count,
+        )
+    ]
+
+
+def queued_tracks(frames: t.List[bytes]) -> t.List[t.Dict]:
+    return [
+        track
+        for _, cluster in decoded_clusters(frames, len(frames))
+        for track in (
+            cluster["player_state"]["track"],
+            *cluster["player_state"].get("next_tracks", ()),
+        )
+    ]
+
+
+def track_fields(frames: t.List[bytes], count: int) -> t.List[t.Tuple]:
+    # Metadata is parsed up front, so that only the constructor is measured.
+    return [
+        ({**track, "metadata": SpotifyTrackMetadata.from_dict(track.get("metadata"))},)
+        for track in cycle(queued_tracks(frames), count)
+    ]
+
+
+def track_metadata(frames: t.List[bytes], count: int) -> t.List[t.Tuple]:
+    return [(track.get("metadata"),) for track in cycle(queued_tracks(frames), count)]
+
+
+def cold_clusters(frames: t.List[bytes], count: int) -> t.List[t.Tuple]:
+    # A new SharedObjects per operation: every part of the cluster is parsed.
+    return [
+        (update_reason, cluster, SharedObjects())
+        for update_reason, cluster in decoded_clusters(frames, count)
+    ]
+
+
+def warm_clusters(frames: t.List[bytes], count: int) -> t.List[t.Tuple]:
+    # Every frame has been seen once, as by a client replaying a session:
+    # parts equal to the last ones seen for their key are reused.
+    shared = SharedObjects()
+
+    for update_reason, cluster in decoded_clusters(frames, len(frames)):
+        materialise(update_reason, cluster, shared)
+
+    return [
+        (update_reason, cluster, shared)
+        for update_reason, cluster in decoded_clusters(frames, count)
+    ]
+
+
+def materialised_clusters(frames: t.List[bytes], count: int) -> t.List[t.Tuple]:
+    return [
+        (
+            materialise(*previous),
+            materialise(*current),
+        )
+        for previous, current in zip(
+            decoded_clusters(frames, count),
+            decoded_clusters(frames[1:] + frames[:1], count),
+        )
+    ]
+
+
+def evaluate_getters(old_cluster, new_cluster):
+    for cluster_getter in CLUSTER_GETTERS:
+        get_from_cluster_getter(old_cluster, cluster_getter) != get_from_cluster_getter(
+            new_cluster, cluster_getter
+        )
+
+
+def sync_handler(cluster, old_value, new_value):
+    pass
+
+
+async def async_handler(cluster, old_value, new_value):
+    pass
+
+
+async def dispatch(cluster, handlers: t.List[t.Callable]):
+    SpotifyClient.dispatch_event_callbacks(
+        asyncio.get_event_loop(), handlers, cluster, None, cluster
+    )
+    await asyncio.sleep(0)
+
+
+def dispatch_stage(kind: str, handler: t.Callable, handler_count: int) -> Stage:
+    handlers = [handler] * handler_count
+
+    return Stage(
+        f"dispatch-{kind}-{handler_count}",
+        lambda frames, count: [
+            (new_cluster, handlers)
+            for _, new_cluster in materialised_clusters(frames, count)
+        ],
+        dispatch,
+    )
+
+
+def pipeline_client() -> SpotifyClient:
+    client = SpotifyClient(None, None, filter_payloads=True)
+
+    for cluster_getter in CLUSTER_GETTERS:
+        client.on_cluster_change(cluster_getter)(async_handler)
+
+    return client
+
+
+async def handle_event(client: SpotifyClient, frame: bytes):
+    await client.event_handler(frame)
+    await asyncio.sleep(0)
+
+
+STAGES = (
+    Stage(
+        "decode",
+        lambda frames, count: [(frame,) for frame in cycle(frames, count)],
+        json.loads,
+    ),
+    Stage(
+        "iter_handled_payloads",
+        lambda frames, count: [
+            (json.loads(frame)["payloads"],) for frame in cycle(frames, count)
+        ],
+        lambda payloads: list(
+            iter_handled_payloads(payloads, copy=False, shared=SHARED_OBJECTS)
+        ),
+    ),
+    Stage(
+        "device_init",
+        device_fields,
+        lambda fields: SpotifyConnectDevice(**fields),
+    ),
+    Stage(
+        "partial_track_init",
+        track_fields,
+        lambda fields: SpotifyPlayerStatePartialTrack(**fields),
+    ),
+    Stage("track_metadata", track_metadata, SpotifyTrackMetadata.from_dict),
+    Stage("from_dict-cold", cold_clusters, materialise),
+    Stage("from_dict-warm", warm_clusters, materialise),
+    Stage("cluster_getters", materialised_clusters, evaluate_getters),
+    Stage("merge_absent_fields", materialised_clusters, merge_absent_fields),
+    *(
+        dispatch_stage(kind, handler, handler_count)
+        for kind, handler in (("sync", sync_handler), ("async", async_handler))
+        for handler_count in DISPATCH_HANDLER_COUNTS
+    ),
+    Stage(
+        "event_handler",
+        lambda frames, count: [
+            (client, frame)
+            for client in (pipeline_client(),)
+            for frame in cycle(frames, count)
+        ],
+        handle_event,
+    ),
+)
+
+
+async def measure(stage: Stage, frames: t.List[bytes], *, operations: int, repeat: int):
+    is_coroutine = asyncio.iscoroutinefunction(stage.run)
+    timings = []
+
+    for _ in range(repeat):
+        arguments = stage.prepare(frames, operations)
+
+        started = time.perf_counter()
+
+        if is_coroutine:
+            for argument in arguments:
+                await stage.run(*argument)
+        else:
+            for argument in arguments:
+                stage.run(*argument)
+
+        timings.append((time.perf_counter() - started) / operations)
+
+    peaks, retained = [], []
+
+    for argument in stage.prepare(frames, min(operations, 20)):
+        tracemalloc.start()
+        baseline, _ = tracemalloc.get_traced_memory()
+
+        result = stage.run(*argument)
+
+        if is_coroutine:
+            result = await result
+
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        peaks.append(peak - baseline)
+        retained.append(current - baseline)
+
+        del result
+
+    return {
+        "best_us": min(timings) * 1e6,
+        "median_us": statistics.median(timings) * 1e6,
+        "peak_bytes": int(statistics.median(peaks)),
+        "retained_bytes": int(statistics.median(retained)),
+    }
+
+
+async def run_benchmarks(
+    workloads: t.Dict[str, t.List[bytes]],
+    *,
+    stages: t.Iterable[Stage] = STAGES,
+    operations: int,
+    repeat: int,
+) -> t.List[t.Dict]:
+    results = []
+
+    for workload, frames in workloads.items():
+        for stage in stages:
+            result = {
+                "workload": workload,
+                "stage": stage.name,
+                "frame_bytes": int(statistics.mean(map(len, frames))),
+                **await measure(stage, frames, operations=operations, repeat=repeat),
+            }
+            results.append(result)
+
+            print(
+                f"{workload:<24} {stage.name:<22} "
+                f"{result['best_us']:>10.1f}µs {result['median_us']:>10.1f}µs "
+                f"{result['peak_bytes'] / 1024:>10.1f}KiB {result['retained_bytes'] / 1024:>10.1f}KiB",
+                file=sys.stderr,
+            )
+
+    return results
+
+
+def current_commit() -> t.Optional[str]:
+    try:
+        return subprocess.run(
+            ("git", "rev-parse", "--short", "HEAD"),
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=pathlib.Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before_path: str, after_path: str):
+    before, after = (
+        {
+            (result["workload"], result["stage"]): result
+            for result in stdlib_json.loads(pathlib.Path(path).read_text())["results"]
+        }
+        for path in (before_path, after_path)
+    )
+
+    print(
+        f"{'workload':<24} {'stage':<22} {'before':>10} {'after':>10} {'speedup':>8} {'peak':>8}"
+    )
+
+    for key, after_result in after.items():
+        before_result = before.get(key)
+
+        if before_result is None:
+            continue
+
+        print(
+            f"{key[0]:<24} {key[1]:<22} "
+            f"{before_result['best_us']:>8.1f}µs {after_result['best_us']:>8.1f}µs "
+            f"{before_result['best_us'] / after_result['best_us']:>7.2f}x "
+            f"{after_result['peak_bytes'] / max(before_result['peak_bytes'], 1):>7.2f}x"
+        )
+
+
+def main(argv: t.Optional[t.List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--recording", action="append", default=[])
+    parser.add_argument(
+        "--stage", action="append", choices=[stage.name for stage in STAGES]
+    )
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS))
+    parser.add_argument("--operations", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare)
+
+    # Handlers log at debug level on every event; keep that out of the numbers.
+    logging.disable(logging.CRITICAL)
+
+    workloads = {
+        scenario: synthetic_frames(**SCENARIOS[scenario])
+        for scenario in args.scenario or SCENARIOS
+    }
+
+    for recording in args.recording:
+        frames = recorded_frames(recording)
+
+        if frames:
+            workloads[f"recording:{pathlib.Path(recording).name}"] = frames
+
+    commit = current_commit()
+
+    results = asyncio.run(
+        run_benchmarks(
+            workloads,
+            stages=[
+                stage for stage in STAGES if not args.stage or stage.name in args.stage
+            ],
+            operations=args.operations,
+            repeat=args.repeat,
+        )
+    )
+
+    output = pathlib.Path(
+        args.output or RESULTS_DIRECTORY / f"{commit or 'worktree'}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(
+        stdlib_json.dumps(
+            {
+                "commit": commit,
+                "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "implementation": platform.python_implementation(),
+                "platform": platform.platform(),
+                "operations": args.operations,
+                "repeat": args.repeat,
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+    print(output, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
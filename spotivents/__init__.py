@@ -1,3 +1,46 @@
-from .auth import SpotifyAuthenticator
-from .client import SpotifyClient
-from .controller import SpotifyAPIControllerClient
+"""
+The public API is loaded on first access (PEP 562), so importing a single
+name, such as `SpotifyAuthenticator`, does not import the client and
+aiohttp along with it.
+"""
+
+import importlib
+import typing as t
+
+if t.TYPE_CHECKING:
+    from .auth import SpotifyAuthenticator
+    from .broadcaster import ClusterBroadcaster
+    from .client import SpotifyClient
+    from .controller import SpotifyAPIControllerClient
+    from .history import PlaybackHistory
+    from .hub import SpotifyClientHub
+    from .sharding import ShardSupervisor
+    from .tracing import Tracer
+
+LAZY_ATTRIBUTES = {
+    "SpotifyAuthenticator": "auth",
+    "ClusterBroadcaster": "broadcaster",
+    "SpotifyClient": "client",
+    "SpotifyAPIControllerClient": "controller",
+    "PlaybackHistory": "history",
+    "SpotifyClientHub": "hub",
+    "ShardSupervisor": "sharding",
+    "Tracer": "tracing",
+}
+
+__all__ = list(LAZY_ATTRIBUTES)
+
+
+def __getattr__(name: str):
+    module = LAZY_ATTRIBUTES.get(name)
+
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted([*globals(), *LAZY_ATTRIBUTES])
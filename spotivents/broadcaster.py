@@ -0,0 +1,205 @@
+"""
+Re-publishing of one client's clusters to local subscribers.
+
+`ClusterBroadcaster` serves websockets, over TCP or a unix socket, on which
+every subscriber first receives a snapshot of the current cluster and then a
+JSON merge patch (RFC 7396) per cluster change:
+
+```json
+{"type": "snapshot", "seq": 41, "cluster": {...}}
+{"type": "delta", "seq": 42, "patch": {"player_state": {"is_paused": true}}}
+```
+
+`utils.apply_patch` applies deltas onto a snapshot. A merge patch cannot set
+a member to null, only remove it, so members that become null are missing
+from patched snapshots: subscribers must read absent members as null.
+
+Subscribers that fall `max_pending` messages behind lose their pending deltas
+and are sent a fresh snapshot instead, so slow readers never hold the
+broadcaster back.
+"""
+
+import asyncio
+import logging
+import typing as t
+from dataclasses import is_dataclass
+
+import aiohttp
+from aiohttp import web
+
+from .client import SpotifyClient
+from .optopt import json
+from .utils import TimePosition, merge_patch
+
+
+def plain_value(value):
+    if is_dataclass(value):
+        return {
+            name: plain_value(getattr(value, name))
+            for name in value.__dataclass_fields__
+        }
+
+    if isinstance(value, TimePosition):
+        return {
+            "is_moving": value.is_moving,
+            "position": value.position,
+            "timestamp": value.timestamp,
+            "playback_speed": value.playback_speed,
+        }
+
+    if isinstance(value, dict):
+        return {key: plain_value(item) for key, item in value.items()}
+
+    if isinstance(value, (list, tuple)):
+        return [plain_value(item) for item in value]
+
+    return value
+
+
+class Subscriber:
+    def __init__(self, ws: web.WebSocketResponse, max_pending: int):
+        self.ws = ws
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(max_pending)
+        self.resyncs = 0
+
+
+class ClusterBroadcaster:
+    """
+    Fan-out of `client`'s clusters to local websocket subscribers, served on
+    `host`:`port` or on the unix socket at `path`.
+    """
+
+    logger = logging.getLogger("spotivents.broadcaster")
+
+    def __init__(
+        self,
+        client: SpotifyClient,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        path: t.Optional[str] = None,
+        max_pending: int = 64,
+    ):
+        self.client = client
+        self.host = host
+        self.port = port
+        self.path = path
+        self.max_pending = max_pending
+
+        self.seq = 0
+        self.snapshot: t.Optional[t.Dict] = None
+        self.snapshot_message: t.Optional[str] = None
+
+        self.subscribers: t.Set[Subscriber] = set()
+
+        self.app = web.Application()
+        self.app.router.add_get("/", self.subscribe)
+
+        self.runner: t.Optional[web.AppRunner] = None
+
+        client.on_cluster_merged()(self.publish)
+
+    def publish(self, cluster):
+        snapshot = plain_value(cluster)
+        patch = None if self.snapshot is None else merge_patch(self.snapshot, snapshot)
+
+        if patch == {}:
+            return
+
+        self.seq += 1
+        self.snapshot = snapshot
+        self.snapshot_message = None
+
+        if patch is None:
+            message = self.current_snapshot()
+        else:
+            message = json.dumps({"type": "delta", "seq": self.seq, "patch": patch})
+
+        for subscriber in self.subscribers:
+            self.send(subscriber, message)
+
+    def current_snapshot(self) -> str:
+        if self.snapshot_message is None:
+            self.snapshot_message = json.dumps(
+                {"type": "snapshot", "seq": self.seq, "cluster": self.snapshot}
+            )
+
+        return self.snapshot_message
+
+    def send(self, subscriber: Subscriber, message: str):
+        try:
+            subscriber.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # The snapshot supersedes every pending delta.
+            while not subscriber.queue.empty():
+                subscriber.queue.get_nowait()
+
+            subscriber.queue.put_nowait(self.current_snapshot())
+            subscriber.resyncs += 1
+
+            self.logger.warning(
+                f"Subscriber fell {self.max_pending} messages behind, resynchronising from a snapshot"
+            )
+
+    async def write(self, subscriber: Subscriber):
+        while not subscriber.ws.closed:
+            await subscriber.ws.send_str(await subscriber.queue.get())
+
+    async def subscribe(self, request: web.Request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        subscriber = Subscriber(ws, self.max_pending)
+
+        if self.snapshot is not None:
+            subscriber.queue.put_nowait(self.current_snapshot())
+
+        self.subscribers.add(subscriber)
+        writer = asyncio.get_event_loop().create_task(self.write(subscriber))
+
+        try:
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.ERROR:
+                    break
+        finally:
+            self.subscribers.discard(subscriber)
+            writer.cancel()
+
+        return ws
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+
+        if self.path is not None:
+            site = web.UnixSite(self.runner, self.path)
+            await site.start()
+        else:
+            site = web.TCPSite(self.runner, self.host, self.port)
+            await site.start()
+
+            self.port = self.runner.addresses[0][1]
+
+        if self.client.cluster is not None:
+            self.publish(self.client.cluster)
+
+    async def stop(self):
+        for subscriber in list(self.subscribers):
+            await subscriber.ws.close()
+
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *_):
+        await self.stop()
+
+    def summary(self) -> t.Dict[str, t.Any]:
+        return {
+            "seq": self.seq,
+            "subscribers": len(self.subscribers),
+            "pending": sum(subscriber.queue.qsize() for subscriber in self.subscribers),
+        }
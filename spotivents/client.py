@@ -1,4 +1,6 @@
 import asyncio
+import functools
+import inspect
 import logging
 import threading
 import time
@@ -6,17 +8,31 @@ import typing as t
 from collections import defaultdict
 
 import aiohttp
+import yarl
 
 from .auth import SpotifyAuthenticator
-from .clustercls import SpotifyDeviceStateChangeCluster, iter_handled_payloads
-from .simstate import SpotiyState
-from .utils import (
-    CaseInsensitiveDict,
-    get_from_cluster_getter,
-    retain_nulled_values,
-    truncated_repl,
+from .clustercls import (
+    SharedObjects,
+    SpotifyDeviceStateChangeCluster,
+    merge_absent_fields,
+)
+from .constants import EVENT_DEALER_WS, SPCLIENT_ENDPOINT
+from .handlers import CoalescingChangeHandler, ManagedEventHandler
+from .latency import LatencyMonitor
+from .profiling import (
+    CProfileSession,
+    LoopLagMonitor,
+    SamplingProfiler,
+    SlowEventWatchdog,
 )
-from .ws import ws_connect
+from .simstate import SpotiyState
+from .tracing import FrameTrace, Tracer
+from .typedframes import decode_frame
+from .utils import Histogram, get_from_cluster_getter, header_value, truncated_repl
+from .ws import PING_FRAME, FrameDeduplicator, ws_connect
+
+if t.TYPE_CHECKING:
+    from .optimistic import OptimisticState
 
 
 class SpotifyClient:
@@ -29,20 +45,47 @@ class SpotifyClient:
         auth: "SpotifyAuthenticator",
         *,
         playable_spotivents: bool = False,
+        typed_decoding: bool = False,
+        filter_payloads: bool = False,
+        deduplicate_frames: bool = False,
+        tracer: t.Optional[Tracer] = None,
+        dealer_endpoint: yarl.URL = EVENT_DEALER_WS,
+        spclient_endpoint: yarl.URL = SPCLIENT_ENDPOINT,
     ):
 
         self.loop = asyncio.get_event_loop()
         self.auth = auth
         self.session = session
         self.ws_task = None
+        self.dealer_endpoint = dealer_endpoint
+        self.spclient_endpoint = spclient_endpoint
+        self.typed_decoding = typed_decoding
+        self.filter_payloads = filter_payloads
+        self.frame_deduplicator = FrameDeduplicator() if deduplicate_frames else None
+        self.tracer = tracer
+        self.shared_objects = SharedObjects()
+
+        self.profiler: t.Union[CProfileSession, SamplingProfiler, None] = None
+        self.loop_lag_monitor: t.Optional[LoopLagMonitor] = None
+        self.slow_event_watchdog: t.Optional[SlowEventWatchdog] = None
+
+        self.optimistic: t.Optional["OptimisticState"] = None
 
         self.cluster_change_handlers = defaultdict(list)
         self.cluster: "SpotifyDeviceStateChangeCluster | None" = None
         self.cluster_receive_callbacks = list()
         self.cluster_ready_callbacks = list()
+        self.cluster_merged_callbacks = list()
+
+        # Runtimes of this client's handlers, shared with its hub if any.
+        self.handler_runtimes: t.DefaultDict[t.Callable, Histogram] = defaultdict(
+            Histogram
+        )
 
         self.latency: float = float("inf")
         self.last_ping: float = 0.0
+        self.latency_monitor = LatencyMonitor()
+        self.high_latency_threshold: float = 1.0
 
         self.replace_state_callbacks = (
             [self.accept_replace_state, self.update_replace_state]
@@ -83,68 +126,208 @@ class SpotifyClient:
 
         return await self.state.accept()
 
-    async def event_handler(self, content: t.Dict):
+    async def event_handler(
+        self, data: t.Union[bytes, str], received_at: t.Optional[float] = None
+    ):
+        watchdog = self.slow_event_watchdog
+
+        if watchdog is None:
+            return await self.process_frame(data, received_at)
+
+        watchdog.begin(data)
+
+        try:
+            await self.process_frame(data, received_at)
+        finally:
+            watchdog.end()
+
+    async def process_frame(
+        self, data: t.Union[bytes, str], received_at: t.Optional[float] = None
+    ):
+        if received_at is None:
+            received_at = time.time()
+
+        if self.frame_deduplicator is not None and (
+            self.frame_deduplicator.is_duplicate(data)
+        ):
+            return
+
+        trace = None if self.tracer is None else self.tracer.frame(received_at)
+
+        if trace is not None:
+            started = time.perf_counter()
+
+        content = decode_frame(
+            data,
+            typed=self.typed_decoding,
+            subtrees=self.subscribed_subtrees(),
+            trace=trace,
+            shared=self.shared_objects,
+        )
+
+        if trace is not None:
+            trace.add("decode", time.perf_counter() - started)
 
         if content["type"] == "pong":
+            rtt = self.latency_monitor.pong_received(received_at)
+
+            if rtt is None:
+                return
 
-            self.latency = time.time() - self.last_ping
+            self.latency = rtt
             self.logger.debug(
-                f"Spotify websocket running at latency: {self.latency * 1000:.2f}ms"
+                "Spotify websocket running at latency: %.2fms", self.latency * 1000
             )
-            if self.latency > 1000:
+            if self.latency > self.high_latency_threshold:
                 self.logger.warning(
                     f"Spotify websocket latency is high: {self.latency * 1000:.2f}ms, you may receive events late!"
                 )
             return
 
-        self.logger.debug(f"Received event payload: {truncated_repl(content)}")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Received event payload: %s", truncated_repl(data))
 
-        headers = CaseInsensitiveDict(content.get("headers", {}))
+        headers = content.get("headers")
 
-        if headers.get("content-type") != "application/json":
+        if not headers or header_value(headers, "content-type") != "application/json":
             return
 
-        for payload in iter_handled_payloads(content.get("payloads", [])):
+        payloads = content.get("payloads", ())
+
+        if trace is not None:
+            payloads = trace.timed("iter_handled_payloads", payloads)
+
+        for payload in payloads:
             cluster = payload.get("cluster")
 
             if isinstance(cluster, SpotifyDeviceStateChangeCluster):
-                await self.cluster_handler(cluster)
+                self.latency_monitor.event_received(
+                    cluster.server_timestamp_ms, received_at
+                )
+                await self.cluster_handler(cluster, trace)
 
             if payload.get("type") == "replace_state":
-                SpotifyClient.dispatch_event_callbacks(
-                    self.loop, self.replace_state_callbacks, payload
-                )
+                self.dispatch(trace, self.replace_state_callbacks, payload)
+
+        if trace is not None:
+            trace.finish()
+
+    def subscribed_subtrees(self) -> t.Optional[t.Set[str]]:
+        """
+        Dotted cluster paths the registered hooks can observe, or None when
+        the full cluster is needed. Always None unless `filter_payloads` is
+        set, and until a first cluster is known; parts outside these paths
+        keep their previous value.
+        """
+        if (
+            not self.filter_payloads
+            or self.cluster is None
+            or self.cluster_receive_callbacks
+            or self.cluster_ready_callbacks
+            or self.cluster_merged_callbacks
+        ):
+            return None
+
+        subtrees = set()
+
+        for cluster_getter, handlers in self.cluster_change_handlers.items():
+            if not handlers:
+                continue
+
+            if not isinstance(cluster_getter, str):
+                return None
+
+            subtrees.add(cluster_getter)
+
+        if self.state is not None or self.replace_state_callbacks:
+            subtrees.add("player_state")
+
+        return subtrees
 
     async def cluster_handler(
-        self, cluster: t.Optional[SpotifyDeviceStateChangeCluster]
+        self,
+        cluster: t.Optional[SpotifyDeviceStateChangeCluster],
+        trace: t.Optional[FrameTrace] = None,
     ):
         if cluster is None:
             return
 
+        received = cluster
+
+        if self.optimistic is None:
+            merge_absent_fields(self.cluster, cluster)
+        else:
+            cluster = self.optimistic.reconcile(received)
+
+        self.emit_cluster(cluster, trace, received=received)
+
+    def emit_cluster(
+        self,
+        cluster: SpotifyDeviceStateChangeCluster,
+        trace: t.Optional[FrameTrace] = None,
+        *,
+        received: t.Optional[SpotifyDeviceStateChangeCluster] = None,
+    ):
+        """
+        Make an already merged `cluster` current and run the handlers of
+        everything that changed. Receive, ready and merged callbacks are
+        given `received`, the merged cluster as the dealer sent it, and are
+        not run for clusters that were not received, such as predictions.
+        """
         old_cluster, self.cluster = self.cluster, cluster
-        SpotifyClient.dispatch_event_callbacks(
-            self.loop, self.cluster_receive_callbacks, cluster
-        )
 
-        if old_cluster is None:
-            SpotifyClient.dispatch_event_callbacks(
-                self.loop, self.cluster_ready_callbacks, cluster
-            )
+        if received is not None:
+            self.dispatch(trace, self.cluster_receive_callbacks, received)
+
+            if old_cluster is None:
+                self.dispatch(trace, self.cluster_ready_callbacks, received)
 
         for cluster_getter, handlers in self.cluster_change_handlers.items():
 
+            if trace is not None:
+                started = time.perf_counter()
+
             old_value, new_value = get_from_cluster_getter(
                 old_cluster, cluster_getter
             ), get_from_cluster_getter(cluster, cluster_getter)
 
+            if trace is not None:
+                trace.add("diff", time.perf_counter() - started)
+
             if old_value != new_value:
-                SpotifyClient.dispatch_event_callbacks(
-                    self.loop, handlers, self.cluster, old_value, new_value
-                )
+                self.dispatch(trace, handlers, self.cluster, old_value, new_value)
 
-        retain_nulled_values(old_cluster, cluster)
+        if received is not None:
+            self.dispatch(trace, self.cluster_merged_callbacks, received)
+
+    def dispatch(self, trace: t.Optional[FrameTrace], mutable_callbacks: list, *args):
+        if trace is None:
+            SpotifyClient.dispatch_event_callbacks(
+                self.loop, mutable_callbacks, *args, runtimes=self.handler_runtimes
+            )
+            return
+
+        started = time.perf_counter()
+        task = SpotifyClient.dispatch_event_callbacks(
+            self.loop, mutable_callbacks, *args, runtimes=self.handler_runtimes
+        )
+        trace.add("dispatch", time.perf_counter() - started)
 
-    def on_cluster_change(self, *cluster_getters: t.Union[str, t.Callable[..., t.Any]]):
+        if task is not None:
+            trace.wait_for(task)
+
+    def on_cluster_change(
+        self,
+        *cluster_getters: t.Union[str, t.Callable[..., t.Any]],
+        coalesce: t.Optional[float] = None,
+        **options,
+    ):
+        """
+        Register a `(cluster, old_value, new_value)` handler for changes of
+        any of `cluster_getters`. With `coalesce`, changes closer together
+        than that many seconds are delivered once, as the first old value and
+        the final new value.
+        """
 
         for cluster_getter in cluster_getters:
             if not isinstance(cluster_getter, str) and not hasattr(
@@ -152,65 +335,289 @@ class SpotifyClient:
             ):
                 raise TypeError("cluster_getter must be a string or a function")
 
-        return SpotifyClient.event_handler_wrapper(
-            *(
-                self.cluster_change_handlers[cluster_getter]
-                for cluster_getter in cluster_getters
+        mutable_callbacks = [
+            self.cluster_change_handlers[cluster_getter]
+            for cluster_getter in cluster_getters
+        ]
+
+        if coalesce is None:
+            return SpotifyClient.event_handler_wrapper(
+                *mutable_callbacks, runtimes=self.handler_runtimes, **options
             )
+
+        dispatch = functools.partial(
+            SpotifyClient.dispatch_event_callbacks, runtimes=self.handler_runtimes
         )
 
+        def inner(func):
+            registered = []
+            SpotifyClient.event_handler_wrapper(
+                registered, runtimes=self.handler_runtimes, **options
+            )(func)
+
+            # One coalescer per getter, so that a burst spanning several
+            # getters never pairs the old value of one with the new of another.
+            for mutable_callback in mutable_callbacks:
+                mutable_callback.append(
+                    CoalescingChangeHandler(registered[0], coalesce, dispatch)
+                )
+
+            return func
+
+        return inner
+
     @staticmethod
-    def event_handler_wrapper(*mutable_callbacks):
+    def event_handler_wrapper(
+        *mutable_callbacks,
+        runtimes: t.Optional[t.DefaultDict[t.Callable, Histogram]] = None,
+        **options,
+    ):
+        """
+        Register the decorated function onto `mutable_callbacks`, its
+        runtimes recorded in `runtimes` when given.
+
+        Options (`max_concurrency`, `timeout`, `overflow`) wrap a coroutine
+        function into a `ManagedEventHandler`.
+        """
+        if "coalesce" in options:
+            raise TypeError("coalesce only applies to cluster change handlers")
+
         def inner(func):
-            if not asyncio.iscoroutinefunction(func):
-                raise TypeError("Event handler must be a coroutine function")
+            if not callable(func):
+                raise TypeError("Event handler must be a function")
 
-            async def wrapper(*args, **kwargs):
-                await func(*args, **kwargs)
+            callback = (
+                ManagedEventHandler(
+                    func, Histogram() if runtimes is None else runtimes[func], **options
+                )
+                if options
+                else func
+            )
 
             SpotifyClient.logger.debug(
-                f"Registered event handler: {func!r} onto {mutable_callbacks!r}"
+                f"Registered event handler: {callback!r} onto {mutable_callbacks!r}"
             )
             for mutable_callback in mutable_callbacks:
-                mutable_callback.append(func)
-            return wrapper
+                mutable_callback.append(callback)
+            return func
 
         return inner
 
+    @staticmethod
+    async def timed_event_coroutine(
+        callback: t.Callable,
+        coroutine: t.Awaitable,
+        runtimes: t.Optional[t.DefaultDict[t.Callable, Histogram]] = None,
+    ):
+        if runtimes is None:
+            return await coroutine
+
+        started = time.perf_counter()
+
+        try:
+            return await coroutine
+        finally:
+            runtimes[callback].record(time.perf_counter() - started)
+
+    @staticmethod
+    async def run_event_coroutines(
+        coroutines: t.List[t.Tuple[t.Callable, t.Awaitable]],
+        runtimes: t.Optional[t.DefaultDict[t.Callable, Histogram]] = None,
+    ):
+        results = await asyncio.gather(
+            *(
+                SpotifyClient.timed_event_coroutine(callback, coroutine, runtimes)
+                for callback, coroutine in coroutines
+            ),
+            return_exceptions=True,
+        )
+
+        for (callback, _), result in zip(coroutines, results):
+            if isinstance(result, Exception):
+                SpotifyClient.logger.error(
+                    f"Event handler raised: {callback!r}", exc_info=result
+                )
+
     @staticmethod
     def dispatch_event_callbacks(
-        loop: asyncio.AbstractEventLoop, mutable_callbacks: list, *args, **kwargs
+        loop: asyncio.AbstractEventLoop,
+        mutable_callbacks: list,
+        *args,
+        runtimes: t.Optional[t.DefaultDict[t.Callable, Histogram]] = None,
+        **kwargs,
     ):
+        """
+        Run synchronous handlers inline and the coroutine handlers for this
+        event concurrently, from a single task, which is returned. Handler
+        runtimes are recorded in `runtimes` when given.
+        """
+        if not mutable_callbacks:
+            return
 
-        if mutable_callbacks:
+        if SpotifyClient.logger.isEnabledFor(logging.DEBUG):
             SpotifyClient.logger.debug(
-                f"Dispatching event callbacks: {mutable_callbacks!r} with {truncated_repl((args, kwargs))})"
+                "Dispatching event callbacks: %r with %s",
+                mutable_callbacks,
+                truncated_repl((args, kwargs)),
             )
 
+        coroutines = []
+
         for callback in mutable_callbacks:
-            loop.create_task(callback(*args, **kwargs))
+            started = time.perf_counter()
+
+            try:
+                result = callback(*args, **kwargs)
+            except Exception:
+                SpotifyClient.logger.exception(f"Event handler raised: {callback!r}")
+                continue
+
+            if result is not None and inspect.isawaitable(result):
+                coroutines.append((callback, result))
+            elif runtimes is not None and not isinstance(
+                callback, (ManagedEventHandler, CoalescingChangeHandler)
+            ):
+                runtimes[callback].record(time.perf_counter() - started)
 
-    def on_cluster_receive(self):
-        return SpotifyClient.event_handler_wrapper(self.cluster_receive_callbacks)
+        if coroutines:
+            return loop.create_task(
+                SpotifyClient.run_event_coroutines(coroutines, runtimes)
+            )
 
-    def on_cluster_ready(self):
-        return SpotifyClient.event_handler_wrapper(self.cluster_ready_callbacks)
+    def slowest_handlers(self, limit: int = 10) -> t.List[t.Tuple[t.Callable, t.Dict]]:
+        """
+        This client's handlers ranked by total time spent in them, with
+        runtime summaries.
+        """
+        return sorted(
+            (
+                (handler, runtimes.summary())
+                for handler, runtimes in self.handler_runtimes.items()
+            ),
+            key=lambda item: item[1]["mean"] * item[1]["count"],
+            reverse=True,
+        )[:limit]
+
+    def latency_summary(self) -> t.Dict[str, t.Any]:
+        """
+        Heartbeat round trips and cluster event ages, in seconds, over the
+        most recent samples.
+        """
+        return self.latency_monitor.summary()
+
+    def start_profiling(self, mode: str = "sampling", *, interval: float = 0.005):
+        """
+        Profile the calling thread, normally the event loop's, until
+        `stop_profiling`: `"sampling"` samples its stack every `interval`
+        seconds from another thread, `"cprofile"` traces every call.
+        """
+        if self.profiler is not None:
+            raise RuntimeError("Profiling is already running")
+
+        if mode == "sampling":
+            self.profiler = SamplingProfiler(threading.get_ident(), interval=interval)
+        elif mode == "cprofile":
+            self.profiler = CProfileSession()
+        else:
+            raise ValueError(f"Unknown profiling mode: {mode!r}")
+
+        self.profiler.start()
+
+    def stop_profiling(self, path: str) -> str:
+        """
+        Stop profiling and dump the results to `path`: collapsed stacks for
+        sampling, `pstats` data for cProfile.
+        """
+        profiler, self.profiler = self.profiler, None
+
+        if profiler is None:
+            raise RuntimeError("Profiling is not running")
+
+        return profiler.stop(path)
+
+    def start_loop_monitor(self, interval: float = 0.1):
+        if self.loop_lag_monitor is not None:
+            raise RuntimeError("The loop monitor is already running")
+
+        self.loop_lag_monitor = LoopLagMonitor(interval=interval)
+        self.loop_lag_monitor.start(self.loop)
+
+    def stop_loop_monitor(self, path: t.Optional[str] = None) -> t.Dict[str, t.Any]:
+        """
+        Stop monitoring the loop lag and return its summary, in seconds, also
+        dumped to `path` as JSON when given.
+        """
+        monitor, self.loop_lag_monitor = self.loop_lag_monitor, None
+
+        if monitor is None:
+            raise RuntimeError("The loop monitor is not running")
+
+        return monitor.stop(path)
+
+    def start_slow_event_watchdog(
+        self, threshold: float = 0.1, *, path: t.Optional[str] = None
+    ) -> SlowEventWatchdog:
+        """
+        Capture the payload and the loop's stack of every frame still being
+        processed after `threshold` seconds, appending them to `path` as JSON
+        lines when given. Call from the event loop's thread.
+        """
+        if self.slow_event_watchdog is not None:
+            raise RuntimeError("The slow event watchdog is already running")
+
+        self.slow_event_watchdog = SlowEventWatchdog(
+            threshold, thread_id=threading.get_ident(), path=path
+        )
+        self.slow_event_watchdog.start()
+        return self.slow_event_watchdog
 
-    def on_replace_state(self):
-        return SpotifyClient.event_handler_wrapper(self.replace_state_callbacks)
+    def stop_slow_event_watchdog(self):
+        watchdog, self.slow_event_watchdog = self.slow_event_watchdog, None
 
-    async def run(self, *, is_blocking=True, is_invisible=False):
+        if watchdog is not None:
+            watchdog.stop()
 
-        cluster_future = asyncio.Future()
+    def on_cluster_receive(self, **options):
+        return SpotifyClient.event_handler_wrapper(
+            self.cluster_receive_callbacks, runtimes=self.handler_runtimes, **options
+        )
+
+    def on_cluster_ready(self, **options):
+        return SpotifyClient.event_handler_wrapper(
+            self.cluster_ready_callbacks, runtimes=self.handler_runtimes, **options
+        )
+
+    def on_cluster_merged(self, **options):
+        """
+        Register a `(cluster)` handler run once values missing from the
+        received cluster have been carried over from the previous one. It
+        is given the received cluster, without optimistic predictions.
+        """
+        return SpotifyClient.event_handler_wrapper(
+            self.cluster_merged_callbacks, runtimes=self.handler_runtimes, **options
+        )
+
+    def on_replace_state(self, **options):
+        return SpotifyClient.event_handler_wrapper(
+            self.replace_state_callbacks, runtimes=self.handler_runtimes, **options
+        )
+
+    def load_cluster_future(self) -> asyncio.Future:
+        cluster_future = self.loop.create_future()
         cluster_future.add_done_callback(
             lambda future: self.loop.create_task(
                 self.cluster_handler(
                     SpotifyDeviceStateChangeCluster.from_dict(
-                        "ON_LOAD", future.result()
+                        "ON_LOAD", future.result(), shared=self.shared_objects
                     )
                 )
             )
         )
+        return cluster_future
+
+    async def run(
+        self, *, is_blocking=True, is_invisible=False, recorder=None, heartbeat=None
+    ):
 
         self.logger.debug("Starting websocket connection to Spotify dealer.")
         self.ws_task = self.loop.create_task(
@@ -218,9 +625,12 @@ class SpotifyClient:
                 self.session,
                 self.auth,
                 self.event_handler,
-                cluster_future=cluster_future,
+                cluster_future=self.load_cluster_future(),
                 invisible=is_invisible,
-                heartbeat_coro=self.heartbeat_task,
+                heartbeat_coro=heartbeat or self.heartbeat_task,
+                dealer_endpoint=self.dealer_endpoint,
+                spclient_endpoint=self.spclient_endpoint,
+                recorder=recorder,
             )
         )
 
@@ -232,6 +642,7 @@ class SpotifyClient:
         main_thread = threading.main_thread()
 
         while not ws.closed and main_thread.is_alive():
-            await ws.send_json({"type": "ping"})
             self.last_ping = time.time()
+            self.latency_monitor.ping_sent(self.last_ping)
+            await ws.send_str(PING_FRAME)
             await asyncio.sleep(interval)
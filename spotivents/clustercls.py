@@ -1,10 +1,27 @@
 import re
+import time
 import warnings
-from dataclasses import _MISSING_TYPE, dataclass, field
-from typing import Dict, List, Optional
+from collections import defaultdict
+from dataclasses import _MISSING_TYPE, MISSING, dataclass, field
+from sys import intern
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    FrozenSet,
+    Hashable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 from .utils import TimePosition
 
+if TYPE_CHECKING:
+    from .tracing import FrameTrace
+
 
 def iter_defaults(dataclass_fields):
 
@@ -16,8 +33,207 @@ def iter_defaults(dataclass_fields):
             yield key, value.default_factory()
 
 
+reported_fields = defaultdict(set)
+
+
+def warn_once(cls, kind: str, keys):
+    """
+    Warn about schema drift only for keys that have not been reported for
+    this class yet.
+    """
+    reported = reported_fields[cls]
+    unreported = {key for key in keys if (kind, key) not in reported}
+
+    if unreported:
+        reported.update((kind, key) for key in unreported)
+        warnings.warn(f"{kind} fields: {unreported} for {cls.__name__}")
+
+
+def admitted_types(annotation) -> Tuple:
+    """
+    The types a field annotation admits, other than None.
+    """
+    if getattr(annotation, "__origin__", None) is Union:
+        return tuple(
+            argument for argument in annotation.__args__ if argument is not type(None)
+        )
+
+    return (annotation,)
+
+
+def is_model(annotation) -> bool:
+    types = admitted_types(annotation)
+    return (
+        len(types) == 1
+        and isinstance(types[0], type)
+        and issubclass(types[0], SafeDataclass)
+    )
+
+
+def compile_safe_init(cls):
+    """
+    Generate a keyword-only `__init__` for a dataclass with the field and
+    default table resolved once, at class-definition time.
+
+    Boolean fields left out or null are False, as the dealer omits false
+    booleans. Other fields left out or null are None and listed in
+    `_absent_fields` for `merge_absent_fields`.
+    """
+    namespace = {"MISSING": MISSING, "warn_once": warn_once, "cls": cls}
+
+    parameters = []
+    body = []
+
+    for name, dataclass_field in cls.__dataclass_fields__.items():
+        has_default = not isinstance(dataclass_field.default, _MISSING_TYPE)
+        has_factory = not isinstance(dataclass_field.default_factory, _MISSING_TYPE)
+
+        if admitted_types(dataclass_field.type) == (bool,):
+            parameters.append(f"{name}=MISSING")
+            body.append(
+                f"    if {name} is MISSING or {name} is None:\n"
+                + (
+                    ""
+                    if has_default or has_factory
+                    else f"        if {name} is MISSING:\n"
+                    f"            missing_fields.append({name!r})\n"
+                )
+                + f"        self.{name} = False\n"
+                f"    else:\n"
+                f"        self.{name} = {name}"
+            )
+
+        elif has_default:
+            namespace[f"default_{name}"] = dataclass_field.default
+            parameters.append(f"{name}=default_{name}")
+            body.append(
+                f"    self.{name} = {name}\n"
+                f"    if {name} is None:\n"
+                f"        absent_fields.append({name!r})"
+            )
+
+        elif has_factory:
+            namespace[f"factory_{name}"] = dataclass_field.default_factory
+            parameters.append(f"{name}=MISSING")
+            body.append(
+                f"    if {name} is None:\n"
+                f"        absent_fields.append({name!r})\n"
+                f"    self.{name} = factory_{name}() if {name} is MISSING else {name}"
+            )
+        else:
+            parameters.append(f"{name}=MISSING")
+            body.append(
+                f"    if {name} is MISSING:\n"
+                f"        missing_fields.append({name!r})\n"
+                f"        absent_fields.append({name!r})\n"
+                f"        self.{name} = None\n"
+                f"    else:\n"
+                f"        self.{name} = {name}\n"
+                f"        if {name} is None:\n"
+                f"            absent_fields.append({name!r})"
+            )
+
+    source = "\n".join(
+        (
+            f"def __init__(self, *, {', '.join(parameters + ['**new_fields'])}):",
+            "    if new_fields:",
+            "        warn_once(cls, 'New', new_fields)",
+            "    missing_fields = []",
+            "    absent_fields = []",
+            *body,
+            "    self._absent_fields = tuple(absent_fields)",
+            "    if missing_fields:",
+            "        warn_once(cls, 'Missing', missing_fields)",
+        )
+    )
+
+    exec(source, namespace)
+
+    __init__ = namespace["__init__"]
+    __init__.__qualname__ = f"{cls.__qualname__}.__init__"
+
+    return __init__
+
+
+def safe_dataclass(cls):
+    """
+    Turn `cls` into a slotted dataclass with a precompiled, schema-tolerant
+    constructor, and record which of its fields hold nested models, directly
+    or as the values of a mapping, for `merge_absent_fields`.
+    """
+    cls = dataclass(init=False)(cls)
+
+    field_names = tuple(cls.__dataclass_fields__)
+    namespace = dict(cls.__dict__)
+
+    for name in field_names:
+        namespace.pop(name, None)
+
+    namespace.pop("__dict__", None)
+    namespace.pop("__weakref__", None)
+    namespace["__slots__"] = field_names + ("_absent_fields",)
+
+    namespace["_nested_fields"] = tuple(
+        name
+        for name, dataclass_field in cls.__dataclass_fields__.items()
+        if is_model(dataclass_field.type)
+    )
+    namespace["_mapping_fields"] = tuple(
+        name
+        for name, dataclass_field in cls.__dataclass_fields__.items()
+        if getattr(dataclass_field.type, "__origin__", None) is dict
+        and is_model(getattr(dataclass_field.type, "__args__", (None, None))[-1])
+    )
+
+    cls = type(cls)(cls.__name__, cls.__bases__, namespace)
+    cls.__init__ = compile_safe_init(cls)
+
+    return cls
+
+
+def merge_absent_fields(old, new):
+    """
+    Carry the fields `new` was parsed without over from `old`, in place.
+
+    Only the fields listed as absent when `new` was built are copied, then
+    nested models are merged the same way, and null entries of mappings such
+    as `devices` are taken from the old mapping; nothing else is visited.
+    """
+    if old is None or new is None or old is new:
+        return
+
+    absent_fields = getattr(new, "_absent_fields", ())
+
+    for name in absent_fields:
+        value = getattr(old, name, None)
+
+        if value is not None:
+            setattr(new, name, value)
+
+    for name in new._nested_fields:
+        if name not in absent_fields:
+            merge_absent_fields(getattr(old, name, None), getattr(new, name, None))
+
+    for name in new._mapping_fields:
+        if name in absent_fields:
+            continue
+
+        old_mapping = getattr(old, name, None)
+        new_mapping = getattr(new, name, None)
+
+        if not old_mapping or not new_mapping:
+            continue
+
+        for key, value in new_mapping.items():
+            if value is None and key in old_mapping:
+                new_mapping[key] = old_mapping[key]
+
+
 @dataclass
 class SafeDataclass:
+
+    __slots__ = ()
+
     def __init__(self, **kwargs):
 
         values = dict(iter_defaults(self.__dataclass_fields__))
@@ -30,12 +246,10 @@ class SafeDataclass:
         new_fields = passed - fields
 
         if new_fields:
-            warnings.warn(f"New fields: {new_fields} for {self.__class__.__name__}")
+            warn_once(type(self), "New", new_fields)
 
         if missing_fields:
-            warnings.warn(
-                f"Missing fields: {missing_fields} for {self.__class__.__name__}"
-            )
+            warn_once(type(self), "Missing", missing_fields)
 
         for new_field in new_fields:
             values.pop(new_field, None)
@@ -44,7 +258,118 @@ class SafeDataclass:
             setattr(self, key, value)
 
 
-@dataclass(init=False)
+def intern_value(value):
+    return intern(value) if value.__class__ is str else value
+
+
+def intern_strings(data: Dict, names: Tuple[str, ...]) -> Dict:
+    """
+    Copy of `data` with the string values of `names` interned, so values
+    recurring across events are held once.
+    """
+    data = data.copy()
+
+    for name in names:
+        value = data.get(name)
+
+        if value.__class__ is str:
+            data[name] = intern(value)
+
+    return data
+
+
+class SharedObjects:
+    """
+    Recently parsed objects by key, along with the payload they were parsed
+    from. A payload equal to the one seen last for its key gets the same
+    object back, so successive clusters share their unchanged parts.
+
+    Only queue entries and devices are shared: unlike the current track, they
+    are never modified in place by `merge_absent_fields`. Each client keeps
+    its own, so clusters of different accounts never share objects.
+    """
+
+    def __init__(self, limit: int = 4096):
+        self.limit = limit
+        self.objects: Dict[Hashable, Tuple[Dict, Any]] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, data: Dict):
+        cached = self.objects.get(key)
+
+        if cached is not None and cached[0] == data:
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, data: Dict, value):
+        objects = self.objects
+        objects.pop(key, None)
+
+        if len(objects) >= self.limit:
+            del objects[next(iter(objects))]
+
+        objects[key] = (data, value)
+        return value
+
+    def clear(self):
+        self.objects.clear()
+
+
+TRACK_INTERNED_FIELDS = ("uri", "provider", "uid")
+METADATA_INTERNED_FIELDS = (
+    "context_uri",
+    "entity_uri",
+    "track_player",
+    "title",
+    "artist_uri",
+    "artist_name",
+    "image_url",
+    "image_xlarge_url",
+    "image_large_url",
+    "image_small_url",
+    "album_title",
+    "album_uri",
+    "provider",
+)
+DEVICE_INTERNED_FIELDS = (
+    "device_type",
+    "device_id",
+    "name",
+    "device_software_version",
+    "client_id",
+    "brand",
+    "model",
+    "license",
+    "spirc_version",
+)
+
+
+METADATA_ACTIONS_KEYS = (
+    "advancing_past_track",
+    "skipping_next_past_track",
+    "skipping_prev_past_track",
+)
+METADATA_MEDIA_KEYS = ("media_type", "media_start_position")
+
+METADATA_KEY_DISPATCH = {
+    **{f"actions.{key}": ("actions", key) for key in METADATA_ACTIONS_KEYS},
+    "autoplay.is_autoplay": ("autoplay", "is_autoplay"),
+    "media.media_type": ("media", "media_type"),
+    "media.start_position": ("media", "media_start_position"),
+    "collection.artist.is_banned": ("collection.artist", "is_banned"),
+    "collection.is_banned": ("collection", "is_banned"),
+    "shuffle.distribution": ("shuffle", "distribution"),
+}
+
+METADATA_ARTIST_KEY_REGEX = re.compile(r"artist_(name|uri):(\d+)$")
+
+
+@safe_dataclass
 class SpotifyTrackMetadata(SafeDataclass):
 
     actions: Dict[str, Optional[str]]
@@ -95,49 +420,54 @@ class SpotifyTrackMetadata(SafeDataclass):
         if not data:
             return None
 
-        actions: Dict[str, Optional[str]] = {
-            "advancing_past_track": data.pop("actions.advancing_past_track", None),
-            "skipping_next_past_track": data.pop(
-                "actions.skipping_next_past_track", None
-            ),
-            "skipping_prev_past_track": data.pop(
-                "actions.skipping_prev_past_track", None
-            ),
+        actions: Dict[str, Optional[str]] = dict.fromkeys(METADATA_ACTIONS_KEYS)
+        autoplay: Dict[str, Optional[str]] = {"is_autoplay": None}
+        media: Dict[str, Optional[str]] = dict.fromkeys(METADATA_MEDIA_KEYS)
+        collection = {"artist": {"is_banned": None}, "is_banned": None}
+        shuffle: Dict[str, Optional[str]] = {"distribution": None}
+
+        fields = {}
+        groups = {
+            "actions": actions,
+            "autoplay": autoplay,
+            "media": media,
+            "collection": collection,
+            "collection.artist": collection["artist"],
+            "shuffle": shuffle,
+            "fields": fields,
         }
 
-        autoplay: Dict[str, Optional[str]] = {
-            "is_autoplay": data.pop("autoplay.is_autoplay", None),
-        }
+        artist_names = {}
+        artist_uris = {}
 
-        media: Dict[str, Optional[str]] = {
-            "media_type": data.pop("media.media_type", None),
-            "media_start_position": data.pop("media.start_position", None),
-        }
+        for key, value in data.items():
+            dispatched = METADATA_KEY_DISPATCH.get(key)
 
-        collection = {
-            "artist": {
-                "is_banned": data.pop("collection.artist.is_banned", None),
-            },
-            "is_banned": data.pop("collection.is_banned", None),
-        }
+            if dispatched is not None:
+                group, name = dispatched
+                groups[group][name] = value
+                continue
 
-        shuffle: Dict[str, Optional[str]] = {
-            "distribution": data.pop("shuffle.distribution", None),
-        }
+            match = METADATA_ARTIST_KEY_REGEX.match(key)
 
-        for key, value in tuple(data.items()):
-            match = re.match(r"artist_name:(\d+)", key)
+            if match is None:
+                fields[key] = value
+            elif match.group(1) == "name":
+                artist_names[match.group(2)] = value
+            else:
+                artist_uris[match.group(2)] = value
 
-            if match is not None:
+        fields = intern_strings(fields, METADATA_INTERNED_FIELDS)
 
-                data.setdefault("artists", []).append(
-                    {
-                        "name": value,
-                        "index": match.group(1),
-                        "uri": data.pop(f"artist_uri:{match.group(1)}", None),
-                    },
-                )
-            data.pop(key, None)
+        if artist_names:
+            fields["artists"] = [
+                {
+                    "name": intern_value(name),
+                    "index": index,
+                    "uri": intern_value(artist_uris.get(index)),
+                }
+                for index, name in artist_names.items()
+            ]
 
         return cls(
             actions=actions,
@@ -145,11 +475,18 @@ class SpotifyTrackMetadata(SafeDataclass):
             media=media,
             collection=collection,
             shuffle=shuffle,
-            **data,
+            **fields,
         )
 
 
-@dataclass(init=False)
+METADATA_KEY_DISPATCH.update(
+    (name, ("fields", name))
+    for name in SpotifyTrackMetadata.__dataclass_fields__
+    if name not in ("actions", "autoplay", "shuffle", "collection", "media")
+)
+
+
+@safe_dataclass
 class SpotifyTrack(SafeDataclass):
 
     uri: str
@@ -163,18 +500,20 @@ class SpotifyTrack(SafeDataclass):
         if not data:
             return None
 
+        data = intern_strings(data, TRACK_INTERNED_FIELDS)
+
         return cls(
             metadata=SpotifyTrackMetadata.from_dict(data.pop("metadata", None)),
             **data,
         )
 
 
-@dataclass(init=False)
+@safe_dataclass
 class SpotifyPlayerStateOptions(SafeDataclass):
 
-    shuffling_context: bool
-    repeating_context: bool
-    repeating_track: bool
+    shuffling_context: bool = False
+    repeating_context: bool = False
+    repeating_track: bool = False
 
     @classmethod
     def from_dict(cls, data: Optional[Dict]):
@@ -184,7 +523,7 @@ class SpotifyPlayerStateOptions(SafeDataclass):
         return cls(**data)
 
 
-@dataclass(init=False)
+@safe_dataclass
 class SpotifyPlayerStatePartialTrack(SafeDataclass):
 
     uri: str
@@ -195,22 +534,32 @@ class SpotifyPlayerStatePartialTrack(SafeDataclass):
     uid: Optional[str] = None
 
     @classmethod
-    def from_dict(cls, data: Optional[Dict]):
+    def from_dict(cls, data: Optional[Dict], shared: Optional[SharedObjects] = None):
         if not data:
             return None
 
-        return cls(
-            metadata=SpotifyTrackMetadata.from_dict(data.pop("metadata", None)),
-            **data,
+        if shared is not None:
+            key = (cls, data.get("uid"), data.get("uri"))
+            track = shared.get(key, data)
+
+            if track is not None:
+                return track
+
+        fields = intern_strings(data, TRACK_INTERNED_FIELDS)
+        track = cls(
+            metadata=SpotifyTrackMetadata.from_dict(fields.pop("metadata", None)),
+            **fields,
         )
 
+        return track if shared is None else shared.put(key, data, track)
+
 
-@dataclass(init=False)
+@safe_dataclass
 class SpotifyPlaybackQuality(SafeDataclass):
 
-    bitrate_level: str
-    strategy: str
-    target_bitrate_level: str
+    bitrate_level: Optional[str] = None
+    strategy: Optional[str] = None
+    target_bitrate_level: Optional[str] = None
     target_bitrate_available: bool = False
 
     @classmethod
@@ -221,7 +570,7 @@ class SpotifyPlaybackQuality(SafeDataclass):
         return cls(**data)
 
 
-@dataclass(init=False)
+@safe_dataclass
 class SpotifyPlayerState(SafeDataclass):
 
     context_url: str
@@ -255,42 +604,66 @@ class SpotifyPlayerState(SafeDataclass):
     context_metadata: Optional[Dict] = None
 
     @classmethod
-    def from_dict(cls, data: Optional[Dict]):
+    def from_dict(
+        cls,
+        data: Optional[Dict],
+        subtrees: Optional[Set[str]] = None,
+        shared: Optional[SharedObjects] = None,
+    ):
         if not data:
             return None
 
         position_as_of_timestamp = data.pop("position_as_of_timestamp")
         is_playing = not data.get("is_paused", False)
 
+        track = data.pop("track", None)
+        next_tracks = data.pop("next_tracks", [])
+        prev_tracks = data.pop("prev_tracks", [])
+
         return cls(
-            track=SpotifyTrack.from_dict(data.pop("track", None)),
+            track=(
+                SpotifyTrack.from_dict(track)
+                if needs_subtree(subtrees, "player_state.track")
+                else None
+            ),
             options=SpotifyPlayerStateOptions.from_dict(data.pop("options", None)),
             playback_quality=SpotifyPlaybackQuality.from_dict(
                 data.pop("playback_quality", None)
             ),
-            next_tracks=[
-                SpotifyPlayerStatePartialTrack.from_dict(track)
-                for track in data.pop("next_tracks", [])
-                if track is not None
-            ],
-            prev_tracks=[
-                SpotifyPlayerStatePartialTrack.from_dict(track)
-                for track in data.pop("prev_tracks", [])
-                if track is not None
-            ],
+            next_tracks=(
+                [
+                    SpotifyPlayerStatePartialTrack.from_dict(track, shared)
+                    for track in next_tracks
+                    if track is not None
+                ]
+                if needs_subtree(subtrees, "player_state.next_tracks")
+                else None
+            ),
+            prev_tracks=(
+                [
+                    SpotifyPlayerStatePartialTrack.from_dict(track, shared)
+                    for track in prev_tracks
+                    if track is not None
+                ]
+                if needs_subtree(subtrees, "player_state.prev_tracks")
+                else None
+            ),
             position_as_of_timestamp=TimePosition(
-                is_playing, int(position_as_of_timestamp)
+                is_playing,
+                int(position_as_of_timestamp),
+                data.get("timestamp"),
+                data.get("playback_speed"),
             ),
             **data,
         )
 
 
-@dataclass(init=False)
+@safe_dataclass
 class SpotifyConnectDevice(SafeDataclass):
 
-    capabilities: Dict
     device_type: str
     device_id: str
+    capabilities: Dict = field(default_factory=dict)
     can_play: bool = False
 
     name: Optional[str] = None
@@ -308,14 +681,23 @@ class SpotifyConnectDevice(SafeDataclass):
     public_ip: Optional[str] = None
 
     @classmethod
-    def from_dict(cls, data: Optional[Dict]):
+    def from_dict(cls, data: Optional[Dict], shared: Optional[SharedObjects] = None):
         if not data:
             return None
 
-        return cls(**data)
+        if shared is not None:
+            key = (cls, data.get("device_id"))
+            device = shared.get(key, data)
+
+            if device is not None:
+                return device
+
+        device = cls(**intern_strings(data, DEVICE_INTERNED_FIELDS))
 
+        return device if shared is None else shared.put(key, data, device)
 
-@dataclass(init=False)
+
+@safe_dataclass
 class SpotifyDeviceStateChangeCluster(SafeDataclass):
 
     type: str
@@ -332,31 +714,103 @@ class SpotifyDeviceStateChangeCluster(SafeDataclass):
     active_device_id: Optional[str] = None
 
     @classmethod
-    def from_dict(cls, type: str, data: Optional[Dict]):
+    def from_dict(
+        cls,
+        type: str,
+        data: Optional[Dict],
+        subtrees: Optional[Set[str]] = None,
+        shared: Optional[SharedObjects] = None,
+    ):
         if not data:
             return None
 
-        devices = {
-            device_id: SpotifyConnectDevice.from_dict(device)
-            for device_id, device in data.pop("devices", {}).items()
-        }
+        devices = data.pop("devices", None)
+        player_state = data.pop("player_state", None)
 
         return cls(
             type=type,
-            player_state=SpotifyPlayerState.from_dict(data.pop("player_state", None)),
-            devices=devices,
+            player_state=(
+                SpotifyPlayerState.from_dict(player_state, subtrees, shared)
+                if needs_subtree(subtrees, "player_state")
+                else None
+            ),
+            devices=(
+                {
+                    device_id: SpotifyConnectDevice.from_dict(device, shared)
+                    for device_id, device in devices.items()
+                }
+                if devices is not None and needs_subtree(subtrees, "devices")
+                else None
+            ),
             **data,
         )
 
 
+handled_update_reasons = frozenset(
+    (
+        "DEVICE_STATE_CHANGED",
+        "DEVICE_VOLUME_CHANGED",
+        "DEVICES_DISAPPEARED",
+        "DEVICE_NEW_CONNECTION",
+        "CLIENT_CALLBACK",
+    )
+)
+
+
+def needs_subtree(subtrees: Optional[Set[str]], path: str) -> bool:
+    """
+    Whether `path` has to be materialised for the subscribed dotted
+    `subtrees`; `None` subscribes to everything.
+    """
+    if subtrees is None:
+        return True
+
+    return any(
+        subtree == path
+        or subtree.startswith(path + ".")
+        or path.startswith(subtree + ".")
+        for subtree in subtrees
+    )
+
+
+def subscribed_update_reasons(subtrees: Optional[Set[str]]) -> FrozenSet[str]:
+    if subtrees is None:
+        return handled_update_reasons
+
+    if not subtrees:
+        return frozenset()
+
+    if all(
+        subtree == "player_state" or subtree.startswith("player_state.")
+        for subtree in subtrees
+    ):
+        return handled_update_reasons - {"DEVICE_VOLUME_CHANGED"}
+
+    return handled_update_reasons
+
+
 def iter_handled_payloads(
     payloads: List[Dict],
+    *,
+    copy: bool = True,
+    subtrees: Optional[Set[str]] = None,
+    trace: Optional["FrameTrace"] = None,
+    shared: Optional[SharedObjects] = None,
 ):
+    """
+    Yield payloads with their clusters materialised. With `subtrees`, only
+    the update reasons and parts of the cluster that can affect those dotted
+    paths are decoded; skipped parts are left as None. Materialisation is
+    timed under `from_dict` on `trace`; with `shared`, unchanged queue
+    entries and devices are taken from it.
+    """
+    update_reasons = subscribed_update_reasons(subtrees)
+
     for payload in payloads:
         if not isinstance(payload, dict):
             continue
 
-        shallow_payload = payload.copy()
+        shallow_payload = payload.copy() if copy else payload
 
         if shallow_payload.get("type") == "replace_state":
             yield shallow_payload
@@ -366,17 +820,17 @@ def iter_handled_payloads(
             "update_reason", "CLIENT_CALLBACK"
         )
 
-        if update_reason in (
-            "DEVICE_STATE_CHANGED",
-            "DEVICE_VOLUME_CHANGED",
-            "DEVICES_DISAPPEARED",
-            "DEVICE_NEW_CONNECTION",
-            "CLIENT_CALLBACK",
-        ):
+        if update_reason in update_reasons:
             cluster = shallow_payload.pop("cluster", None)
-            yield {
-                "cluster": SpotifyDeviceStateChangeCluster.from_dict(
-                    update_reason, cluster
-                ),
-                **shallow_payload,
-            }
+
+            if trace is not None:
+                started = time.perf_counter()
+
+            cluster = SpotifyDeviceStateChangeCluster.from_dict(
+                update_reason, cluster, subtrees, shared
+            )
+
+            if trace is not None:
+                trace.add("from_dict", time.perf_counter() - started)
+
+            yield {"cluster": cluster, **shallow_payload}
@@ -1,15 +1,28 @@
 import random
 
-import yarl
-
 SPOTIVENTS_DEVICE_ID = "spotivents_" + "".join(random.choices("abcdef1234567890", k=4))
 
 SPOTIFY_HOSTNAME = "spotify.com"
 
-EVENT_DEALER_WS = yarl.URL(f"wss://dealer.{SPOTIFY_HOSTNAME}/")
-SPOTIFY_API_ENDPOINT = yarl.URL(f"https://api.{SPOTIFY_HOSTNAME}/v1/")
+# Built into `yarl.URL`s on first access, so that modules only needing the
+# plain constants do not import yarl.
+URLS = {
+    "EVENT_DEALER_WS": f"wss://dealer.{SPOTIFY_HOSTNAME}/",
+    "SPOTIFY_API_ENDPOINT": f"https://api.{SPOTIFY_HOSTNAME}/v1/",
+    "SPCLIENT_ENDPOINT": f"https://gae-spclient.{SPOTIFY_HOSTNAME}/",
+}
+
+
+def __getattr__(name: str):
+    url = URLS.get(name)
+
+    if url is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    import yarl
 
-SPCLIENT_ENDPOINT = yarl.URL(f"https://gae-spclient.{SPOTIFY_HOSTNAME}/")
+    value = globals()[name] = yarl.URL(url)
+    return value
 
 
 DEVICE_PAYLOAD = {
@@ -6,10 +6,14 @@ from binascii import hexlify, unhexlify
 from aiohttp import ClientResponseError, ClientSession
 
 from .auth import SpotifyAuthenticator
-from .constants import (SPCLIENT_ENDPOINT, SPOTIFY_HOSTNAME,
-                        SPOTIVENTS_DEVICE_ID)
+from .constants import SPCLIENT_ENDPOINT, SPOTIFY_HOSTNAME, SPOTIVENTS_DEVICE_ID
 from .optopt import json
-from .utils import decode_basex_to_bytes, encode_bytes_to_basex
+from .tracing import MeteredSession, MetricsSink
+from .utils import decode_basex_to_bytes, encode_bytes_to_basex, server_clock
+
+if t.TYPE_CHECKING:
+    from .effects import EffectTracker
+    from .optimistic import Expectations, OptimisticState
 
 
 class SpotifyAPIControllerClient:
@@ -24,9 +28,83 @@ class SpotifyAPIControllerClient:
         "episode",
     )
 
-    def __init__(self, session: ClientSession, auth: SpotifyAuthenticator):
-        self.session = session
+    clock_samples = 4
+    clock_resync_interval = 900.0
+
+    def __init__(
+        self,
+        session: ClientSession,
+        auth: SpotifyAuthenticator,
+        *,
+        metrics: t.Optional[MetricsSink] = None,
+    ):
+        # With a sink, every request is counted per controller method.
+        self.session = (
+            session
+            if metrics is None
+            else MeteredSession(session, metrics, SpotifyAPIControllerClient)
+        )
         self.auth = auth
+        self.optimistic: t.Optional["OptimisticState"] = None
+        self.effects: t.Optional["EffectTracker"] = None
+
+    def link(self, client, *, timeout: float = 3.0, optimistic: bool = True):
+        """
+        Track the effects of commands on `client`'s cluster, so commands can
+        `wait_for_effect`. With `optimistic`, also apply their predictable
+        effects to the cluster as soon as they are issued, until the dealer
+        confirms them or `timeout` seconds have passed.
+        """
+        from .effects import EffectTracker
+        from .optimistic import OptimisticState
+
+        self.effects = EffectTracker(client)
+
+        if optimistic:
+            self.optimistic = OptimisticState(client, timeout=timeout)
+
+        return self
+
+    async def predicted(
+        self,
+        command: str,
+        call: t.Awaitable,
+        predict: t.Callable[["Expectations"], t.Dict],
+        wait_for_effect: t.Union[bool, float] = False,
+        device_id: t.Optional[str] = None,
+    ):
+        """
+        Await `call`, predicting its effect when optimistic and, with
+        `wait_for_effect` (True or a timeout in seconds), returning only once
+        a received cluster shows it.
+        """
+        expectation = None
+
+        if wait_for_effect:
+            if self.effects is None:
+                call.close()
+                raise RuntimeError(
+                    "wait_for_effect needs a controller linked to a SpotifyClient"
+                )
+
+            expectation = self.effects.expect(command, predict(self.effects), device_id)
+
+        try:
+            if self.optimistic is None:
+                result = await call
+            else:
+                result = await self.optimistic.run(call, predict(self.optimistic))
+        except BaseException:
+            if expectation is not None:
+                self.effects.cancel(expectation)
+            raise
+
+        if expectation is not None:
+            await self.effects.wait(
+                expectation, None if wait_for_effect is True else wait_for_effect
+            )
+
+        return result
 
     async def get_headers(self, json: bool = False, platform: t.Optional[str] = None):
 
@@ -101,13 +179,32 @@ class SpotifyAPIControllerClient:
             **kwargs,
         )
 
-    async def set_volume(self, volume: int, percent: bool = True, *args, **kwargs):
+    async def set_volume(
+        self,
+        volume: int,
+        percent: bool = True,
+        *args,
+        wait_for_effect: t.Union[bool, float] = False,
+        **kwargs,
+    ):
         if percent:
             volume = int(volume * 65535)
 
-        return await self.change_connect_state("volume", volume, *args, **kwargs)
+        return await self.predicted(
+            "volume",
+            self.change_connect_state("volume", volume, *args, **kwargs),
+            lambda expectations: expectations.volume(volume, kwargs.get("to_device")),
+            wait_for_effect,
+            kwargs.get("to_device"),
+        )
 
-    async def set_playback(self, playback: str, *args, **kwargs):
+    async def set_playback(
+        self,
+        playback: str,
+        *args,
+        wait_for_effect: t.Union[bool, float] = False,
+        **kwargs,
+    ):
 
         assert playback in (
             "resume",
@@ -116,7 +213,11 @@ class SpotifyAPIControllerClient:
             "skip_prev",
         )
 
-        return await self.connect_call(
+        # Skips have no predictable effect to wait for.
+        if wait_for_effect and playback not in ("pause", "resume"):
+            raise ValueError(f"{playback} has no effect to wait for")
+
+        call = self.connect_call(
             "POST",
             f"/player/command",
             json={"command": {"endpoint": playback}},
@@ -124,18 +225,41 @@ class SpotifyAPIControllerClient:
             **kwargs,
         )
 
-    async def set_seek(self, position: int, *args, **kwargs):
-        return await self.connect_call(
-            "POST",
-            f"/player/command",
-            json={
-                "command": {
-                    "endpoint": "seek_to",
-                    "value": position,
-                }
-            },
-            *args,
-            **kwargs,
+        if playback not in ("pause", "resume"):
+            return await call
+
+        return await self.predicted(
+            playback,
+            call,
+            lambda expectations: expectations.paused(playback == "pause"),
+            wait_for_effect,
+            kwargs.get("to_device"),
+        )
+
+    async def set_seek(
+        self,
+        position: int,
+        *args,
+        wait_for_effect: t.Union[bool, float] = False,
+        **kwargs,
+    ):
+        return await self.predicted(
+            "seek",
+            self.connect_call(
+                "POST",
+                f"/player/command",
+                json={
+                    "command": {
+                        "endpoint": "seek_to",
+                        "value": position,
+                    }
+                },
+                *args,
+                **kwargs,
+            ),
+            lambda expectations: expectations.seeked(position),
+            wait_for_effect,
+            kwargs.get("to_device"),
         )
 
     async def set_repeat(
@@ -143,36 +267,57 @@ class SpotifyAPIControllerClient:
         track: bool = False,
         context: bool = False,
         *args,
+        wait_for_effect: t.Union[bool, float] = False,
         **kwargs,
     ):
 
-        return await self.connect_call(
-            "POST",
-            f"/player/command",
-            json={
-                "command": {
-                    "endpoint": "set_options",
-                    "repeating_context": context,
-                    "repeating_track": track,
-                }
-            },
-            *args,
-            **kwargs,
+        return await self.predicted(
+            "repeat",
+            self.connect_call(
+                "POST",
+                f"/player/command",
+                json={
+                    "command": {
+                        "endpoint": "set_options",
+                        "repeating_context": context,
+                        "repeating_track": track,
+                    }
+                },
+                *args,
+                **kwargs,
+            ),
+            lambda expectations: expectations.options(
+                repeating_context=context, repeating_track=track
+            ),
+            wait_for_effect,
+            kwargs.get("to_device"),
         )
 
-    async def set_shuffle(self, shuffle: bool, *args, **kwargs):
+    async def set_shuffle(
+        self,
+        shuffle: bool,
+        *args,
+        wait_for_effect: t.Union[bool, float] = False,
+        **kwargs,
+    ):
 
-        return await self.connect_call(
-            "POST",
-            f"/player/command",
-            json={
-                "command": {
-                    "endpoint": "set_options",
-                    "shuffling_context": shuffle,
-                }
-            },
-            *args,
-            **kwargs,
+        return await self.predicted(
+            "shuffle",
+            self.connect_call(
+                "POST",
+                f"/player/command",
+                json={
+                    "command": {
+                        "endpoint": "set_options",
+                        "shuffling_context": shuffle,
+                    }
+                },
+                *args,
+                **kwargs,
+            ),
+            lambda expectations: expectations.options(shuffling_context=shuffle),
+            wait_for_effect,
+            kwargs.get("to_device"),
         )
 
     async def next_track(self, *args, **kwargs):
@@ -471,24 +616,46 @@ class SpotifyAPIControllerClient:
             response.raise_for_status()
             return await response.json()
 
+    async def synchronise_clock(self, samples: int = 4, *args, **kwargs) -> float:
+        """
+        Sample the server time `samples` times into `server_clock` and return
+        the resulting offset of the local clock, in seconds.
+        """
+        headers = await self.get_headers()
+
+        for _ in range(samples):
+            sent_at = time.time()
+
+            async with self.session.get(
+                SPCLIENT_ENDPOINT.with_path("melody/v1/time"),
+                headers=headers,
+                *args,
+                **kwargs,
+            ) as response:
+                response.raise_for_status()
+                data = await response.json()
+
+            server_clock.add_sample(sent_at, data["timestamp"] / 1000, time.time())
+
+        self.logger.debug(f"Server clock offset: {server_clock.offset() * 1000:.2f}ms")
+        return server_clock.offset()
+
     async def fetch_spotify_timestamp(
         self,
         *args,
         instant: bool = False,
+        refresh: bool = False,
         **kwargs,
     ):
-
-        if instant:
-            return {"timestamp": int(time.time() * 1000)}
-
-        async with self.session.get(
-            SPCLIENT_ENDPOINT.with_path("melody/v1/time"),
-            headers=await self.get_headers(),
-            *args,
-            **kwargs,
-        ) as response:
-            response.raise_for_status()
-            return await response.json()
+        """
+        Server time in milliseconds, read from the `server_clock` estimate.
+        The estimate is resampled first when `refresh` is set or it is older
+        than `clock_resync_interval` seconds, unless `instant` is set.
+        """
+        if refresh or (not instant and server_clock.age() > self.clock_resync_interval):
+            await self.synchronise_clock(self.clock_samples, *args, **kwargs)
+
+        return {"timestamp": int(server_clock.now() * 1000)}
 
     async def fetch_stream_url(
         self,
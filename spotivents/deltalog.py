@@ -0,0 +1,221 @@
+"""
+Append-only log of cluster changes.
+
+Records use the `<kind:u8><timestamp:f64><length:u32>` header of
+`spotivents.replay` recordings, followed by zlib-compressed JSON. A snapshot
+record holds the whole cluster tree; every following delta record holds the
+JSON merge patch (RFC 7396) from the previous cluster to the next. Dataclass
+nodes carry their class name under `"$"`, so the reader rebuilds the same
+`SpotifyDeviceStateChangeCluster` the client held.
+
+A sidecar `<path>.idx` lists the `<timestamp:f64><offset:u64>` of every
+snapshot, so `DeltaLogReader.at` seeks to the nearest snapshot before the
+requested time and replays only the deltas after it.
+"""
+
+import bisect
+import struct
+import time
+import typing as t
+import zlib
+from dataclasses import is_dataclass
+
+from . import clustercls
+from .optopt import json
+from .replay import RECORD_HEADER
+from .utils import TimePosition, apply_patch, merge_patch
+
+if t.TYPE_CHECKING:
+    from .client import SpotifyClient
+
+SNAPSHOT_RECORD = 2
+DELTA_RECORD = 3
+
+INDEX_ENTRY = struct.Struct("<dQ")
+
+TREE_CLASSES = {
+    cls.__name__: cls
+    for cls in vars(clustercls).values()
+    if isinstance(cls, type) and is_dataclass(cls)
+}
+TREE_CLASSES[TimePosition.__name__] = TimePosition
+
+
+def encode_tree(value):
+    if is_dataclass(value):
+        tree = {"$": type(value).__name__}
+
+        for name in value.__dataclass_fields__:
+            tree[name] = encode_tree(getattr(value, name))
+
+        return tree
+
+    if isinstance(value, TimePosition):
+        return {
+            "$": TimePosition.__name__,
+            "is_moving": value.is_moving,
+            "position": value.position,
+            "timestamp": value.timestamp,
+            "playback_speed": value.playback_speed,
+        }
+
+    if isinstance(value, dict):
+        return {key: encode_tree(item) for key, item in value.items()}
+
+    if isinstance(value, (list, tuple)):
+        return [encode_tree(item) for item in value]
+
+    return value
+
+
+def decode_tree(tree):
+    if isinstance(tree, list):
+        return [decode_tree(item) for item in tree]
+
+    if not isinstance(tree, dict):
+        return tree
+
+    cls = TREE_CLASSES.get(tree.get("$"))
+
+    # Merge patches drop null members, so absent members were None: null
+    # members of snapshots are dropped alike, for both to decode the same.
+    if cls is None:
+        return {
+            key: decode_tree(item) for key, item in tree.items() if item is not None
+        }
+
+    if cls is TimePosition:
+        return TimePosition(
+            tree.get("is_moving"),
+            tree.get("position"),
+            tree.get("timestamp"),
+            tree.get("playback_speed"),
+        )
+
+    return cls(
+        **{name: decode_tree(tree.get(name)) for name in cls.__dataclass_fields__}
+    )
+
+
+class DeltaLogWriter:
+    """
+    Append clusters to the log at `path` as deltas, with a full snapshot
+    every `snapshot_interval` records. Every writer starts with a snapshot.
+    """
+
+    def __init__(self, path: str, *, snapshot_interval: int = 256):
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+
+        self.file = open(path, "ab")
+        self.index_file = open(f"{path}.idx", "ab")
+
+        self.tree: t.Optional[t.Dict] = None
+        self.since_snapshot = 0
+
+    def attach(self, client: "SpotifyClient"):
+        """
+        Log every cluster of `client` once it has been merged.
+        """
+        client.on_cluster_merged()(self.write)
+        return self
+
+    def write(self, cluster, timestamp: t.Optional[float] = None):
+        tree = encode_tree(cluster)
+
+        if timestamp is None:
+            timestamp = (
+                int(cluster.server_timestamp_ms) / 1000
+                if cluster.server_timestamp_ms
+                else time.time()
+            )
+
+        if self.tree is None or self.since_snapshot >= self.snapshot_interval:
+            self.index_file.write(INDEX_ENTRY.pack(timestamp, self.file.tell()))
+            self.append(
+                SNAPSHOT_RECORD, timestamp, zlib.compress(json.dumps(tree).encode())
+            )
+
+            self.since_snapshot = 0
+        else:
+            patch = merge_patch(self.tree, tree)
+
+            if not patch:
+                return
+
+            self.append(
+                DELTA_RECORD, timestamp, zlib.compress(json.dumps(patch).encode())
+            )
+            self.since_snapshot += 1
+
+        self.tree = tree
+
+    def append(self, kind: int, timestamp: float, data: bytes):
+        self.file.write(RECORD_HEADER.pack(kind, timestamp, len(data)))
+        self.file.write(data)
+
+    def flush(self):
+        self.file.flush()
+        self.index_file.flush()
+
+    def close(self):
+        self.file.close()
+        self.index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class DeltaLogReader:
+    def __init__(self, path: str):
+        self.path = path
+
+        self.snapshot_timestamps: t.List[float] = []
+        self.snapshot_offsets: t.List[int] = []
+
+        with open(f"{path}.idx", "rb") as index_file:
+            for timestamp, offset in INDEX_ENTRY.iter_unpack(index_file.read()):
+                self.snapshot_timestamps.append(timestamp)
+                self.snapshot_offsets.append(offset)
+
+    def records(self, offset: int = 0) -> t.Iterator[t.Tuple[int, float, t.Dict]]:
+        with open(self.path, "rb") as file:
+            file.seek(offset)
+
+            while True:
+                header = file.read(RECORD_HEADER.size)
+
+                if len(header) < RECORD_HEADER.size:
+                    return
+
+                kind, timestamp, length = RECORD_HEADER.unpack(header)
+                data = file.read(length)
+
+                yield kind, timestamp, json.loads(zlib.decompress(data))
+
+    def at(
+        self, timestamp: float
+    ) -> t.Optional["clustercls.SpotifyDeviceStateChangeCluster"]:
+        """
+        The cluster as it was at `timestamp`, or None before the first one.
+        """
+        index = bisect.bisect_right(self.snapshot_timestamps, timestamp) - 1
+
+        if index < 0:
+            return None
+
+        tree = None
+
+        for kind, logged_at, data in self.records(self.snapshot_offsets[index]):
+            if logged_at > timestamp:
+                break
+
+            if kind == SNAPSHOT_RECORD:
+                tree = data
+            else:
+                apply_patch(tree, data)
+
+        return decode_tree(tree)
@@ -0,0 +1,141 @@
+"""
+Command-to-effect latency of controller commands.
+
+With a controller linked to a running `SpotifyClient`, commands given
+`wait_for_effect` only return once a cluster received from the dealer shows
+their effect (`is_paused` flipped, the position near the seek target, the
+volume set), or raise `asyncio.TimeoutError`. The time from issuing the
+command to that cluster is recorded per command and target device:
+
+```py
+controller.link(client)
+await controller.pause(wait_for_effect=True)
+
+controller.effects.summary()
+# {"pause@<device id>": {"count": 1, "p50": 0.21, ..., "timeouts": 0}}
+```
+"""
+
+import asyncio
+import time
+import typing as t
+from collections import Counter, defaultdict
+
+from .latency import LatencySeries
+from .optimistic import IS_PAUSED, Expectations, Path
+
+if t.TYPE_CHECKING:
+    from .client import SpotifyClient
+
+Key = t.Tuple[str, t.Optional[str]]
+
+
+class Expectation:
+    __slots__ = ("key", "changes", "started", "future")
+
+    def __init__(self, key: Key, changes: t.Dict[Path, t.Any], future: asyncio.Future):
+        self.key = key
+        self.changes = changes
+        self.started = time.perf_counter()
+        self.future = future
+
+
+class EffectTracker(Expectations):
+    """
+    Latency, in seconds, from issuing a command until a received cluster
+    shows its effect, per `(command, device_id)`.
+    """
+
+    timeout = 10.0
+
+    def __init__(self, client: "SpotifyClient", *, position_tolerance: int = 1500):
+        super().__init__(client, position_tolerance=position_tolerance)
+
+        self.waiting: t.List[Expectation] = []
+
+        self.latencies: t.DefaultDict[Key, LatencySeries] = defaultdict(LatencySeries)
+        self.timeouts: t.Counter[Key] = Counter()
+
+        client.on_cluster_merged()(self.cluster_merged)
+
+    def paused(self, is_paused: bool) -> t.Dict[Path, t.Any]:
+        # Slow devices report the position late; the position is only part
+        # of the effect of a seek.
+        return {IS_PAUSED: is_paused}
+
+    def received_cluster(self):
+        # Optimistic predictions are not effects; only what the dealer sent is.
+        optimistic = self.client.optimistic
+        return self.client.cluster if optimistic is None else optimistic.confirmed
+
+    def expect(
+        self,
+        command: str,
+        changes: t.Dict[Path, t.Any],
+        device_id: t.Optional[str] = None,
+    ) -> t.Optional[Expectation]:
+        """
+        Start waiting for `changes`; None when there is nothing to wait for,
+        the cluster showing them already.
+        """
+        cluster = self.received_cluster()
+
+        if not changes or self.shows(cluster, changes):
+            return None
+
+        if device_id is None and cluster is not None:
+            device_id = cluster.active_device_id
+
+        expectation = Expectation(
+            (command, device_id), changes, self.client.loop.create_future()
+        )
+        self.waiting.append(expectation)
+
+        return expectation
+
+    def cluster_merged(self, _):
+        cluster = self.received_cluster()
+
+        for expectation in list(self.waiting):
+            if not self.shows(cluster, expectation.changes):
+                continue
+
+            latency = time.perf_counter() - expectation.started
+
+            self.latencies[expectation.key].record(latency)
+            self.waiting.remove(expectation)
+
+            if not expectation.future.done():
+                expectation.future.set_result(latency)
+
+    def cancel(self, expectation: t.Optional[Expectation]):
+        if expectation is not None and expectation in self.waiting:
+            self.waiting.remove(expectation)
+
+    async def wait(
+        self, expectation: t.Optional[Expectation], timeout: t.Optional[float] = None
+    ) -> t.Optional[float]:
+        """
+        The latency of the effect, once seen.
+        """
+        if expectation is None:
+            return None
+
+        try:
+            return await asyncio.wait_for(
+                expectation.future, self.timeout if timeout is None else timeout
+            )
+        except asyncio.TimeoutError:
+            self.timeouts[expectation.key] += 1
+            raise
+        finally:
+            self.cancel(expectation)
+
+    def summary(self) -> t.Dict[str, t.Dict[str, t.Any]]:
+        return {
+            f"{command}@{device_id}": {
+                **self.latencies[command, device_id].summary(),
+                "timeouts": self.timeouts[command, device_id],
+            }
+            for command, device_id in {*self.latencies, *self.timeouts}
+        }
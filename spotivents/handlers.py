@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+import typing as t
+from collections import deque
+
+from .utils import Histogram
+
+OVERFLOW_POLICIES = ("skip", "queue_latest", "queue_all")
+
+
+class ManagedEventHandler:
+    """
+    Coroutine event handler with a concurrency cap, a timeout and an
+    overflow policy for invocations arriving while the cap is reached:
+
+    - `skip` drops them,
+    - `queue_latest` keeps only the most recent one,
+    - `queue_all` runs every one of them in order.
+    """
+
+    logger = logging.getLogger("spotivents.handlers")
+
+    def __init__(
+        self,
+        func: t.Callable[..., t.Awaitable],
+        runtimes: Histogram,
+        *,
+        max_concurrency: t.Optional[int] = None,
+        timeout: t.Optional[float] = None,
+        overflow: str = "skip",
+    ):
+        if not asyncio.iscoroutinefunction(func):
+            raise TypeError("Managed event handlers must be coroutine functions")
+
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES!r}")
+
+        self.func = func
+        self.runtimes = runtimes
+
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.overflow = overflow
+
+        self.pending: t.Deque = deque(maxlen=1 if overflow == "queue_latest" else None)
+
+        self.running = 0
+        self.skipped = 0
+        self.timeouts = 0
+
+    def __call__(self, *args, **kwargs):
+        if self.max_concurrency is None or self.running < self.max_concurrency:
+            self.start(args, kwargs)
+        elif self.overflow == "skip":
+            self.skipped += 1
+        else:
+            self.pending.append((args, kwargs))
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.func!r}>"
+
+    def start(self, args, kwargs):
+        self.running += 1
+        asyncio.get_event_loop().create_task(self.run(args, kwargs))
+
+    async def run(self, args, kwargs):
+        started = time.perf_counter()
+
+        try:
+            await asyncio.wait_for(self.func(*args, **kwargs), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.logger.warning(
+                f"Event handler {self.func!r} timed out after {self.timeout}s"
+            )
+        except Exception:
+            self.logger.exception(f"Event handler raised: {self.func!r}")
+        finally:
+            self.runtimes.record(time.perf_counter() - started)
+            self.running -= 1
+
+            if self.pending:
+                self.start(*self.pending.popleft())
+
+
+class CoalescingChangeHandler:
+    """
+    Debounces a cluster change handler: changes arriving less than `window`
+    seconds apart are folded into one call carrying the first old value and
+    the last new value. A burst is flushed after at most `max_windows`
+    windows even if changes keep arriving.
+    """
+
+    max_windows = 10
+
+    def __init__(
+        self,
+        callback: t.Callable,
+        window: float,
+        dispatch: t.Callable[..., None],
+    ):
+        self.callback = callback
+        self.window = window
+        self.dispatch = dispatch
+
+        self.timer: t.Optional[asyncio.TimerHandle] = None
+        self.burst_started = 0.0
+
+        self.cluster = None
+        self.old_value = None
+        self.new_value = None
+
+        self.coalesced = 0
+
+    def __call__(self, cluster, old_value, new_value):
+        loop = asyncio.get_event_loop()
+
+        if self.timer is None:
+            self.old_value = old_value
+            self.burst_started = loop.time()
+        else:
+            self.timer.cancel()
+            self.coalesced += 1
+
+        self.cluster = cluster
+        self.new_value = new_value
+
+        if loop.time() - self.burst_started >= self.window * self.max_windows:
+            self.flush()
+        else:
+            self.timer = loop.call_later(self.window, self.flush)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.callback!r} window={self.window}>"
+
+    def flush(self):
+        cluster, old_value, new_value = self.cluster, self.old_value, self.new_value
+
+        self.timer = None
+        self.cluster = self.old_value = self.new_value = None
+
+        if old_value == new_value:
+            return
+
+        self.dispatch(
+            asyncio.get_event_loop(), [self.callback], cluster, old_value, new_value
+        )
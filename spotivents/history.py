@@ -0,0 +1,292 @@
+"""
+Bounded history of playback states in array-backed columns.
+
+Every entry takes 33 bytes across the columns (timestamp and position
+timestamp as doubles, position as a 64-bit integer, track and device as
+32-bit ids into interned tables, one byte of flags), plus the interned
+strings, which are shared between entries and released with the last entry
+referring to them. `PlaybackHistory.memory_usage` reports the total.
+"""
+
+import sys
+import typing as t
+from array import array
+
+from .utils import server_clock
+
+if t.TYPE_CHECKING:
+    from .client import SpotifyClient
+    from .clustercls import SpotifyDeviceStateChangeCluster
+
+PLAYING = 1
+PAUSED = 2
+BUFFERING = 4
+SHUFFLING = 8
+REPEATING_CONTEXT = 16
+REPEATING_TRACK = 32
+
+
+class InternTable:
+    """
+    Strings by id, reference counted so ids of evicted entries are reused.
+    """
+
+    def __init__(self):
+        self.ids: t.Dict[str, int] = {}
+        self.values: t.List[t.Optional[str]] = []
+        self.counts = array("I")
+        self.free: t.List[int] = []
+
+    def acquire(self, value: t.Optional[str]) -> int:
+        if value is None:
+            return -1
+
+        value_id = self.ids.get(value)
+
+        if value_id is None:
+            if self.free:
+                value_id = self.free.pop()
+                self.values[value_id] = value
+            else:
+                value_id = len(self.values)
+                self.values.append(value)
+                self.counts.append(0)
+
+            self.ids[value] = value_id
+
+        self.counts[value_id] += 1
+        return value_id
+
+    def release(self, value_id: int):
+        if value_id < 0:
+            return
+
+        self.counts[value_id] -= 1
+
+        if not self.counts[value_id]:
+            del self.ids[self.values[value_id]]
+            self.values[value_id] = None
+            self.free.append(value_id)
+
+    def get(self, value_id: int) -> t.Optional[str]:
+        return None if value_id < 0 else self.values[value_id]
+
+    def memory_usage(self) -> int:
+        return (
+            sys.getsizeof(self.ids)
+            + sys.getsizeof(self.values)
+            + self.counts.buffer_info()[1] * self.counts.itemsize
+            + sum(sys.getsizeof(value) for value in self.ids)
+        )
+
+
+class PlaybackHistory:
+    """
+    The last `capacity` playback states, recorded whenever the track, the
+    active device, the flags or the reported position change.
+
+    Timestamps are server seconds when the cluster carries them, so that
+    intervals line up with `server_clock`.
+    """
+
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+
+        self.timestamps = array("d", bytes(8 * capacity))
+        self.tracks = array("i", bytes(4 * capacity))
+        self.devices = array("i", bytes(4 * capacity))
+        self.positions = array("q", bytes(8 * capacity))
+        self.position_timestamps = array("d", bytes(8 * capacity))
+        self.flags = array("B", bytes(capacity))
+
+        self.track_uris = InternTable()
+        self.device_ids = InternTable()
+
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def slot(self, index: int) -> int:
+        return (self.start + index) % self.capacity
+
+    def attach(self, client: "SpotifyClient"):
+        """
+        Record every cluster of `client` once it has been merged.
+        """
+        client.on_cluster_merged()(self.record)
+        return self
+
+    def record(self, cluster: t.Optional["SpotifyDeviceStateChangeCluster"]):
+        if cluster is None or cluster.player_state is None:
+            return
+
+        player_state = cluster.player_state
+        track = player_state.track
+        options = player_state.options
+        position = player_state.position_as_of_timestamp
+
+        flags = (
+            PLAYING * bool(player_state.is_playing)
+            | PAUSED * bool(player_state.is_paused)
+            | BUFFERING * bool(player_state.is_buffering)
+        )
+
+        if options is not None:
+            flags |= (
+                SHUFFLING * bool(options.shuffling_context)
+                | REPEATING_CONTEXT * bool(options.repeating_context)
+                | REPEATING_TRACK * bool(options.repeating_track)
+            )
+
+        track_uri = track.uri if track is not None else None
+        position_ms = int(position.position) if position is not None else 0
+        position_timestamp = (
+            position.timestamp / 1000
+            if position is not None and position.timestamp
+            else 0.0
+        )
+
+        if self.size:
+            last = self.slot(self.size - 1)
+
+            if (
+                self.flags[last] == flags
+                and self.positions[last] == position_ms
+                and self.position_timestamps[last] == position_timestamp
+                and self.track_uris.get(self.tracks[last]) == track_uri
+                and self.device_ids.get(self.devices[last]) == cluster.active_device_id
+            ):
+                return
+
+        if cluster.server_timestamp_ms:
+            timestamp = int(cluster.server_timestamp_ms) / 1000
+        else:
+            timestamp = server_clock.now()
+
+        if self.size == self.capacity:
+            self.track_uris.release(self.tracks[self.start])
+            self.device_ids.release(self.devices[self.start])
+
+            self.start = (self.start + 1) % self.capacity
+            self.size -= 1
+
+        slot = self.slot(self.size)
+        self.size += 1
+
+        self.timestamps[slot] = timestamp
+        self.tracks[slot] = self.track_uris.acquire(track_uri)
+        self.devices[slot] = self.device_ids.acquire(cluster.active_device_id)
+        self.positions[slot] = position_ms
+        self.position_timestamps[slot] = position_timestamp
+        self.flags[slot] = flags
+
+    def bisect(self, timestamp: float) -> int:
+        """
+        Index of the first entry recorded after `timestamp`.
+        """
+        low, high = 0, self.size
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if self.timestamps[self.slot(middle)] <= timestamp:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def intervals(
+        self, since: t.Optional[float] = None, until: t.Optional[float] = None
+    ) -> t.Iterator[t.Tuple[int, float, float]]:
+        """
+        `(slot, start, end)` of every entry overlapping `[since, until]`, each
+        lasting until the next one; the last lasts until now.
+        """
+        if not self.size:
+            return
+
+        if until is None:
+            until = server_clock.now()
+
+        index = 0 if since is None else max(0, self.bisect(since) - 1)
+
+        while index < self.size:
+            slot = self.slot(index)
+            start = self.timestamps[slot]
+
+            if start >= until:
+                return
+
+            index += 1
+            end = self.timestamps[self.slot(index)] if index < self.size else until
+
+            if since is not None:
+                start = max(start, since)
+
+            end = min(end, until)
+
+            if end > start:
+                yield slot, start, end
+
+    def is_audible(self, slot: int) -> bool:
+        return self.flags[slot] & (PLAYING | PAUSED) == PLAYING
+
+    def played_between(
+        self, since: t.Optional[float] = None, until: t.Optional[float] = None
+    ) -> t.List[t.Tuple[str, float, float]]:
+        """
+        `(track_uri, start, end)` of the stretches a track was playing,
+        consecutive entries of the same track merged.
+        """
+        played: t.List[t.Tuple[str, float, float]] = []
+
+        for slot, start, end in self.intervals(since, until):
+            if not self.is_audible(slot) or self.tracks[slot] < 0:
+                continue
+
+            track_uri = self.track_uris.get(self.tracks[slot])
+
+            if played and played[-1][0] == track_uri and played[-1][2] == start:
+                played[-1] = (track_uri, played[-1][1], end)
+            else:
+                played.append((track_uri, start, end))
+
+        return played
+
+    def time_per_device(
+        self, since: t.Optional[float] = None, until: t.Optional[float] = None
+    ) -> t.Dict[str, float]:
+        """
+        Seconds of playback per active device id.
+        """
+        durations: t.Dict[int, float] = {}
+
+        for slot, start, end in self.intervals(since, until):
+            if self.is_audible(slot) and self.devices[slot] >= 0:
+                device = self.devices[slot]
+                durations[device] = durations.get(device, 0.0) + end - start
+
+        return {
+            self.device_ids.get(device): duration
+            for device, duration in durations.items()
+        }
+
+    def memory_usage(self) -> int:
+        return (
+            sum(
+                column.buffer_info()[1] * column.itemsize
+                for column in (
+                    self.timestamps,
+                    self.tracks,
+                    self.devices,
+                    self.positions,
+                    self.position_timestamps,
+                    self.flags,
+                )
+            )
+            + self.track_uris.memory_usage()
+            + self.device_ids.memory_usage()
+        )
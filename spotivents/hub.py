@@ -0,0 +1,358 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+import typing as t
+from collections import defaultdict
+
+import aiohttp
+
+from .auth import SpotifyAuthenticator
+from .client import SpotifyClient
+from .handlers import CoalescingChangeHandler
+from .utils import Histogram
+from .ws import PING_FRAME
+
+
+class AccountRoutedHandler:
+    """
+    Event handler invoked only for events of the given accounts.
+    """
+
+    def __init__(
+        self,
+        callback: t.Callable,
+        accounts: t.Iterable[str],
+        current_account: contextvars.ContextVar,
+    ):
+        self.callback = callback
+        self.accounts = frozenset(accounts)
+        self.current_account = current_account
+
+    def __call__(self, *args, **kwargs):
+        if self.current_account.get() in self.accounts:
+            return self.callback(*args, **kwargs)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.callback!r} for {len(self.accounts)} accounts>"
+
+
+class AccountCoalescingHandler:
+    """
+    Cluster change handler coalesced per account, so that the changes of
+    different accounts are never folded into one call.
+    """
+
+    def __init__(
+        self,
+        callback: t.Callable,
+        window: float,
+        dispatch: t.Callable[..., None],
+        current_account: contextvars.ContextVar,
+    ):
+        self.callback = callback
+        self.window = window
+        self.dispatch = dispatch
+        self.current_account = current_account
+
+        self.handlers: t.Dict[t.Optional[str], CoalescingChangeHandler] = {}
+
+    def __call__(self, cluster, old_value, new_value):
+        account_id = self.current_account.get()
+        handler = self.handlers.get(account_id)
+
+        if handler is None:
+            handler = self.handlers[account_id] = CoalescingChangeHandler(
+                self.callback, self.window, self.dispatch
+            )
+
+        handler(cluster, old_value, new_value)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.callback!r} window={self.window}>"
+
+
+class SpotifyClientHub:
+    """
+    Many accounts' `SpotifyClient`s on one event loop and one session.
+
+    Handlers are registered once on the hub and shared by every account; the
+    account an event belongs to is available from `current_account` while
+    handlers run, and `accounts=` limits a handler to some of them.
+    Heartbeats of all connections are sent from a single timer wheel instead
+    of one sleeping task per connection.
+    """
+
+    logger = logging.getLogger("spotivents.hub")
+    current_account = contextvars.ContextVar("spotivents_current_account", default=None)
+
+    def __init__(
+        self,
+        session: t.Optional[aiohttp.ClientSession] = None,
+        *,
+        heartbeat_interval: float = 15.0,
+        heartbeat_resolution: float = 0.25,
+        **client_options,
+    ):
+        self.session = session
+        self.owns_session = session is None
+        self.client_options = client_options
+
+        self.clients: t.Dict[str, SpotifyClient] = {}
+        self.account_tasks: t.Dict[str, asyncio.Task] = {}
+
+        self.cluster_change_handlers = defaultdict(list)
+        self.cluster_receive_callbacks = list()
+        self.cluster_ready_callbacks = list()
+        self.cluster_merged_callbacks = list()
+        self.handler_runtimes: t.DefaultDict[t.Callable, Histogram] = defaultdict(
+            Histogram
+        )
+
+        self.heartbeat_interval = heartbeat_interval
+        # One slot per tick of `heartbeat_resolution` seconds; the wheel only
+        # wakes up once per tick, however many connections it serves.
+        self.heartbeat_wheel: t.List[t.Dict] = [
+            dict()
+            for _ in range(max(1, round(heartbeat_interval / heartbeat_resolution)))
+        ]
+        self.heartbeat_cursor = 0
+        self.next_heartbeat_slot = 0
+        self.heartbeat_task: t.Optional[asyncio.Task] = None
+
+    def get_session(self) -> aiohttp.ClientSession:
+        if self.session is None:
+            # Dealer websockets hold their connection for the whole session,
+            # so the connector must not cap the number of connections.
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=0)
+            )
+
+        return self.session
+
+    def add_account(
+        self, account_id: str, auth: "SpotifyAuthenticator"
+    ) -> SpotifyClient:
+        if account_id in self.clients:
+            raise ValueError(f"Account {account_id!r} is already registered")
+
+        client = SpotifyClient(self.session, auth, **self.client_options)
+
+        client.cluster_change_handlers = self.cluster_change_handlers
+        client.cluster_receive_callbacks = self.cluster_receive_callbacks
+        client.cluster_ready_callbacks = self.cluster_ready_callbacks
+        client.cluster_merged_callbacks = self.cluster_merged_callbacks
+        client.handler_runtimes = self.handler_runtimes
+
+        self.clients[account_id] = client
+        return client
+
+    def remove_account(self, account_id: str):
+        task = self.account_tasks.pop(account_id, None)
+
+        if task is not None:
+            task.cancel()
+
+        self.clients.pop(account_id, None)
+
+    def client(self, account_id: str) -> SpotifyClient:
+        return self.clients[account_id]
+
+    async def run_account(self, account_id: str, *, is_invisible: bool = False):
+        self.current_account.set(account_id)
+
+        client = self.clients[account_id]
+        client.session = self.get_session()
+
+        await client.run(
+            is_invisible=is_invisible,
+            heartbeat=functools.partial(self.schedule_heartbeat, client),
+        )
+
+    def start_account(self, account_id: str, *, is_invisible: bool = False):
+        task = self.account_tasks.get(account_id)
+
+        if task is None or task.done():
+            if self.heartbeat_task is None or self.heartbeat_task.done():
+                self.heartbeat_task = asyncio.get_event_loop().create_task(
+                    self.run_heartbeat_wheel()
+                )
+
+            task = asyncio.get_event_loop().create_task(
+                self.run_account(account_id, is_invisible=is_invisible)
+            )
+            self.account_tasks[account_id] = task
+
+        return task
+
+    async def run(self, *, is_invisible: bool = False):
+        """
+        Run every registered account until all of their connections end.
+        """
+        account_ids = list(self.clients)
+
+        results = await asyncio.gather(
+            *(
+                self.start_account(account_id, is_invisible=is_invisible)
+                for account_id in account_ids
+            ),
+            return_exceptions=True,
+        )
+
+        for account_id, result in zip(account_ids, results):
+            if isinstance(result, BaseException) and not isinstance(
+                result, asyncio.CancelledError
+            ):
+                self.logger.error(
+                    f"Connection of account {account_id!r} failed", exc_info=result
+                )
+
+    async def close(self):
+        for account_id in list(self.account_tasks):
+            self.account_tasks.pop(account_id).cancel()
+
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+
+        if self.owns_session and self.session is not None:
+            await self.session.close()
+
+    async def schedule_heartbeat(
+        self, client: SpotifyClient, ws: aiohttp.ClientWebSocketResponse, interval=None
+    ):
+        # Connections are spread evenly across the wheel's slots.
+        self.heartbeat_wheel[self.next_heartbeat_slot][ws] = client
+        self.next_heartbeat_slot = (self.next_heartbeat_slot + 1) % len(
+            self.heartbeat_wheel
+        )
+
+    async def run_heartbeat_wheel(self):
+        loop = asyncio.get_event_loop()
+
+        tick = self.heartbeat_interval / len(self.heartbeat_wheel)
+        next_tick = loop.time()
+
+        while True:
+            # A wheel that fell behind skips ahead rather than pinging in bursts.
+            next_tick = max(next_tick + tick, loop.time())
+            await asyncio.sleep(next_tick - loop.time())
+
+            connections = self.heartbeat_wheel[self.heartbeat_cursor]
+            self.heartbeat_cursor = (self.heartbeat_cursor + 1) % len(
+                self.heartbeat_wheel
+            )
+
+            sent_at = time.time()
+
+            for ws, client in list(connections.items()):
+                if ws.closed:
+                    del connections[ws]
+                    continue
+
+                client.last_ping = sent_at
+                client.latency_monitor.ping_sent(sent_at)
+
+                try:
+                    await ws.send_str(PING_FRAME)
+                except ConnectionError:
+                    del connections[ws]
+
+    def register(
+        self,
+        mutable_callbacks,
+        *,
+        accounts=None,
+        coalesce_window: t.Optional[float] = None,
+        **options,
+    ):
+        """
+        Register the decorated function onto `mutable_callbacks` as
+        `SpotifyClient.event_handler_wrapper` does, then route it to
+        `accounts` only and, with `coalesce_window`, coalesce its calls per
+        account.
+        """
+        registered = []
+        register = SpotifyClient.event_handler_wrapper(
+            registered, runtimes=self.handler_runtimes, **options
+        )
+
+        def inner(func):
+            register(func)
+            registered_callback = registered.pop()
+
+            for mutable_callback in mutable_callbacks:
+                callback = registered_callback
+
+                # One coalescer per list, as every list is a separate getter.
+                if coalesce_window is not None:
+                    callback = AccountCoalescingHandler(
+                        callback,
+                        coalesce_window,
+                        functools.partial(
+                            SpotifyClient.dispatch_event_callbacks,
+                            runtimes=self.handler_runtimes,
+                        ),
+                        self.current_account,
+                    )
+
+                if accounts is not None:
+                    callback = AccountRoutedHandler(
+                        callback, accounts, self.current_account
+                    )
+
+                mutable_callback.append(callback)
+
+            return func
+
+        return inner
+
+    def on_cluster_change(
+        self,
+        *cluster_getters: t.Union[str, t.Callable[..., t.Any]],
+        accounts: t.Optional[t.Iterable[str]] = None,
+        coalesce: t.Optional[float] = None,
+        **options,
+    ):
+        """
+        Register a `(cluster, old_value, new_value)` handler shared by every
+        account, or by `accounts` only. Options apply hub-wide: a
+        `max_concurrency` caps the handler across all accounts. `coalesce`
+        folds changes per account, as `SpotifyClient.on_cluster_change`.
+        """
+        for cluster_getter in cluster_getters:
+            if not isinstance(cluster_getter, str) and not hasattr(
+                cluster_getter, "__call__"
+            ):
+                raise TypeError("cluster_getter must be a string or a function")
+
+        return self.register(
+            [
+                self.cluster_change_handlers[cluster_getter]
+                for cluster_getter in cluster_getters
+            ],
+            accounts=accounts,
+            coalesce_window=coalesce,
+            **options,
+        )
+
+    def on_cluster_receive(
+        self, *, accounts: t.Optional[t.Iterable[str]] = None, **options
+    ):
+        return self.register(
+            [self.cluster_receive_callbacks], accounts=accounts, **options
+        )
+
+    def on_cluster_ready(
+        self, *, accounts: t.Optional[t.Iterable[str]] = None, **options
+    ):
+        return self.register(
+            [self.cluster_ready_callbacks], accounts=accounts, **options
+        )
+
+    def on_cluster_merged(
+        self, *, accounts: t.Optional[t.Iterable[str]] = None, **options
+    ):
+        return self.register(
+            [self.cluster_merged_callbacks], accounts=accounts, **options
+        )
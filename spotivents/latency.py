@@ -0,0 +1,110 @@
+import math
+import time
+import typing as t
+from collections import deque
+
+from .utils import Histogram
+
+
+class LatencySeries:
+    """
+    Latency samples in seconds: percentiles over the most recent `window`
+    samples, count and maximum over the lifetime of the series.
+    """
+
+    def __init__(self, window: int = 256):
+        self.samples: t.Deque[float] = deque(maxlen=window)
+        self.histogram = Histogram()
+
+    def record(self, value: float):
+        self.samples.append(value)
+        self.histogram.record(value)
+
+    @property
+    def last(self) -> t.Optional[float]:
+        return self.samples[-1] if self.samples else None
+
+    def percentile(self, percentile: float) -> float:
+        if not self.samples:
+            return 0.0
+
+        ordered = sorted(self.samples)
+        return ordered[max(0, math.ceil(len(ordered) * percentile / 100) - 1)]
+
+    def summary(self) -> t.Dict[str, t.Any]:
+        return {
+            "count": self.histogram.count,
+            "last": self.last,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.histogram.maximum,
+        }
+
+
+class LatencyMonitor:
+    """
+    Round trips of the dealer heartbeat and the age of cluster events on
+    receipt.
+
+    The dealer's pongs do not echo anything back, so they cannot be matched
+    to their ping by id; each pong is matched to the oldest outstanding ping
+    instead. The socket is ordered, so this pairs them exactly as long as no
+    pong is lost. Pings left unanswered for `ping_timeout` seconds are
+    counted as lost.
+    """
+
+    ping_timeout = 60.0
+
+    def __init__(self, *, window: int = 256):
+        self.outstanding_pings: t.Deque[float] = deque()
+
+        self.rtt = LatencySeries(window)
+        self.event_age = LatencySeries(window)
+
+        self.lost_pings = 0
+
+    def ping_sent(self, sent_at: t.Optional[float] = None):
+        self.outstanding_pings.append(time.time() if sent_at is None else sent_at)
+
+    def pong_received(self, received_at: t.Optional[float] = None) -> t.Optional[float]:
+        if received_at is None:
+            received_at = time.time()
+
+        while self.outstanding_pings:
+            sent_at = self.outstanding_pings.popleft()
+
+            if received_at - sent_at > self.ping_timeout:
+                self.lost_pings += 1
+                continue
+
+            rtt = received_at - sent_at
+            self.rtt.record(rtt)
+            return rtt
+
+        return None
+
+    def event_received(
+        self,
+        server_timestamp_ms: t.Union[str, int, None],
+        received_at: t.Optional[float] = None,
+    ) -> t.Optional[float]:
+        """
+        Record how long ago, by the local clock, the dealer stamped an event.
+        """
+        if not server_timestamp_ms:
+            return None
+
+        age = (time.time() if received_at is None else received_at) - int(
+            server_timestamp_ms
+        ) / 1000
+        self.event_age.record(age)
+        return age
+
+    def summary(self) -> t.Dict[str, t.Any]:
+        return {
+            "rtt": self.rtt.summary(),
+            "event_age": self.event_age.summary(),
+            "outstanding_pings": len(self.outstanding_pings),
+            "lost_pings": self.lost_pings,
+        }
@@ -0,0 +1,274 @@
+"""
+Optimistic local state for controller commands.
+
+Once `SpotifyAPIControllerClient.link` ties a controller to a running
+`SpotifyClient`, commands that have a predictable effect (pause, resume,
+seek, volume, shuffle and repeat) apply it to the client's cluster and emit
+the change to its change handlers as soon as they are issued, instead of a
+round trip later. Receive and merged callbacks, which persist or forward
+clusters, only ever see clusters received from the dealer.
+
+The client keeps the last cluster received from the dealer as the confirmed
+state and shows it with every pending prediction laid over it. Each
+predicted value is settled once a received cluster reports it; predictions
+are rolled back when their command fails, or when the dealer has not
+confirmed them within `timeout` seconds.
+
+Predicted clusters are shallow copies along the predicted paths: models
+shared between clusters (devices, queue entries) are never mutated.
+"""
+
+import asyncio
+import copy
+import time
+import typing as t
+
+from .clustercls import merge_absent_fields
+from .utils import TimePosition, server_clock
+
+if t.TYPE_CHECKING:
+    from .client import SpotifyClient
+    from .clustercls import SpotifyDeviceStateChangeCluster
+
+Path = t.Tuple[str, ...]
+
+MISSING = object()
+
+IS_PAUSED = ("player_state", "is_paused")
+POSITION = ("player_state", "position_as_of_timestamp")
+
+
+def value_at(node, path: Path):
+    for key in path:
+        if node is None:
+            return MISSING
+
+        node = (
+            node.get(key, MISSING)
+            if isinstance(node, dict)
+            else getattr(node, key, MISSING)
+        )
+
+        if node is MISSING:
+            return MISSING
+
+    return node
+
+
+def replaced(node, path: Path, value):
+    """
+    Copy of `node` with `value` at `path`, copying only the nodes on the way.
+    """
+    key, rest = path[0], path[1:]
+
+    if isinstance(node, dict):
+        node = dict(node)
+        node[key] = replaced(node[key], rest, value) if rest else value
+        return node
+
+    child = getattr(node, key)
+    node = copy.copy(node)
+    setattr(node, key, replaced(child, rest, value) if rest else value)
+    return node
+
+
+class Prediction:
+    __slots__ = ("changes", "issued_at", "expiry")
+
+    def __init__(self, changes: t.Dict[Path, t.Any]):
+        self.changes = changes
+        self.issued_at = time.time()
+        self.expiry: t.Optional[asyncio.TimerHandle] = None
+
+
+class Expectations:
+    """
+    The changes commands are expected to make to `client`'s cluster, as
+    `{path: value}`, and whether a cluster shows them; positions match
+    within `position_tolerance` milliseconds.
+    """
+
+    def __init__(self, client: "SpotifyClient", *, position_tolerance: int = 1500):
+        self.client = client
+        self.position_tolerance = position_tolerance
+
+    def matches(self, actual, predicted) -> bool:
+        if isinstance(predicted, TimePosition):
+            return (
+                isinstance(actual, TimePosition)
+                and bool(actual.is_moving) == bool(predicted.is_moving)
+                and abs(actual.value() - predicted.value()) <= self.position_tolerance
+            )
+
+        return actual == predicted
+
+    def shows(self, cluster, changes: t.Dict[Path, t.Any]) -> bool:
+        return all(
+            self.matches(value_at(cluster, path), value)
+            for path, value in changes.items()
+        )
+
+    def position(self, is_moving: bool, position: t.Optional[int] = None):
+        current = value_at(self.client.cluster, POSITION)
+
+        if not isinstance(current, TimePosition):
+            return MISSING
+
+        return TimePosition(
+            is_moving,
+            current.value() if position is None else position,
+            int(server_clock.now() * 1000),
+            current.playback_speed,
+        )
+
+    def paused(self, is_paused: bool) -> t.Dict[Path, t.Any]:
+        changes = {IS_PAUSED: is_paused}
+        position = self.position(not is_paused)
+
+        if position is not MISSING:
+            changes[POSITION] = position
+
+        return changes
+
+    def seeked(self, position: int) -> t.Dict[Path, t.Any]:
+        is_paused = value_at(self.client.cluster, IS_PAUSED)
+        predicted = self.position(is_paused is False, position)
+
+        return {} if predicted is MISSING else {POSITION: predicted}
+
+    def volume(
+        self, volume: int, device_id: t.Optional[str] = None
+    ) -> t.Dict[Path, t.Any]:
+        cluster = self.client.cluster
+
+        if device_id is None and cluster is not None:
+            device_id = cluster.active_device_id
+
+        if value_at(cluster, ("devices", device_id)) in (None, MISSING):
+            return {}
+
+        return {("devices", device_id, "volume"): volume}
+
+    def options(self, **options: bool) -> t.Dict[Path, t.Any]:
+        return {
+            ("player_state", "options", name): value for name, value in options.items()
+        }
+
+
+class OptimisticState(Expectations):
+    """
+    Predicted changes laid over the clusters `client` receives.
+    """
+
+    def __init__(
+        self,
+        client: "SpotifyClient",
+        *,
+        timeout: float = 3.0,
+        position_tolerance: int = 1500,
+    ):
+        super().__init__(client, position_tolerance=position_tolerance)
+        self.timeout = timeout
+
+        self.confirmed: t.Optional["SpotifyDeviceStateChangeCluster"] = client.cluster
+        self.pending: t.List[Prediction] = []
+
+        self.settled = 0
+        self.rolled_back = 0
+        self.expired = 0
+
+        client.optimistic = self
+
+    def overlay(self, cluster):
+        for prediction in self.pending:
+            for path, value in prediction.changes.items():
+                if value_at(cluster, path[:-1]) not in (None, MISSING):
+                    cluster = replaced(cluster, path, value)
+
+        return cluster
+
+    def reconcile(self, cluster: "SpotifyDeviceStateChangeCluster"):
+        """
+        Merge a received cluster into the confirmed state, settle the
+        predictions it confirms and return it with the others laid over.
+        """
+        merge_absent_fields(self.confirmed, cluster)
+        self.confirmed = cluster
+
+        for prediction in list(self.pending):
+            for path, value in list(prediction.changes.items()):
+                if self.matches(value_at(cluster, path), value):
+                    del prediction.changes[path]
+
+            if not prediction.changes:
+                self.discard(prediction)
+                self.settled += 1
+
+        return self.overlay(cluster)
+
+    def discard(self, prediction: Prediction):
+        self.pending.remove(prediction)
+
+        if prediction.expiry is not None:
+            prediction.expiry.cancel()
+
+    def predict(self, changes: t.Dict[Path, t.Any]) -> t.Optional[Prediction]:
+        if not changes or self.confirmed is None:
+            return None
+
+        # Later predictions supersede earlier ones on the same paths.
+        for pending in list(self.pending):
+            for path in changes:
+                pending.changes.pop(path, None)
+
+            if not pending.changes:
+                self.discard(pending)
+
+        prediction = Prediction(changes)
+        prediction.expiry = self.client.loop.call_later(
+            self.timeout, self.expire, prediction
+        )
+
+        self.pending.append(prediction)
+        self.client.emit_cluster(self.overlay(self.confirmed))
+
+        return prediction
+
+    def rollback(self, prediction: t.Optional[Prediction]):
+        if prediction is None or prediction not in self.pending:
+            return
+
+        self.discard(prediction)
+        self.rolled_back += 1
+
+        self.client.emit_cluster(self.overlay(self.confirmed))
+
+    def expire(self, prediction: Prediction):
+        if prediction not in self.pending:
+            return
+
+        self.discard(prediction)
+        self.expired += 1
+
+        self.client.emit_cluster(self.overlay(self.confirmed))
+
+    async def run(self, call: t.Awaitable, changes: t.Dict[Path, t.Any]):
+        """
+        Await the command `call` with `changes` predicted meanwhile, rolling
+        them back if it raises.
+        """
+        prediction = self.predict(changes)
+
+        try:
+            return await call
+        except BaseException:
+            self.rollback(prediction)
+            raise
+
+    def summary(self) -> t.Dict[str, t.Any]:
+        return {
+            "pending": len(self.pending),
+            "settled": self.settled,
+            "rolled_back": self.rolled_back,
+            "expired": self.expired,
+        }
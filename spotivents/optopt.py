@@ -11,3 +11,17 @@ try:
 
 except ImportError:
     import json
+
+
+def __getattr__(name: str):
+    # msgspec is only needed for typed decoding; import it on first use.
+    if name != "msgspec":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    try:
+        import msgspec
+    except ImportError:
+        msgspec = None
+
+    globals()["msgspec"] = msgspec
+    return msgspec
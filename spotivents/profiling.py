@@ -0,0 +1,248 @@
+"""
+Runtime profiling of a running client, started and stopped without a
+restart through `SpotifyClient.start_profiling`, `start_loop_monitor` and
+`start_slow_event_watchdog`.
+
+- `CProfileSession`: deterministic profile of the event loop thread, dumped
+  in the `pstats` format;
+- `SamplingProfiler`: stacks of the event loop thread sampled from a
+  background thread, dumped as collapsed stacks (`frame;frame;frame count`)
+  for flame graph tools; costs the loop nothing but the GIL hand-offs;
+- `LoopLagMonitor`: how late the loop wakes up from a periodic sleep;
+- `SlowEventWatchdog`: the payload and the loop thread's stack of every
+  frame still being processed after `threshold` seconds.
+"""
+
+import asyncio
+import cProfile
+import logging
+import sys
+import threading
+import time
+import traceback
+import typing as t
+from collections import Counter, deque
+
+from .latency import LatencySeries
+from .optopt import json
+from .utils import truncated_repl
+
+
+class CProfileSession:
+    """
+    `cProfile` of the thread it is started from, normally the loop's.
+    """
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self, path: str) -> str:
+        self.profile.disable()
+        self.profile.dump_stats(path)
+        return path
+
+
+class SamplingProfiler:
+    """
+    Stacks of the thread `thread_id` sampled every `interval` seconds.
+    """
+
+    def __init__(self, thread_id: int, *, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+
+        self.stacks: t.Counter[t.Tuple[str, ...]] = Counter()
+        self.samples = 0
+
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self.sample, name="spotivents-sampler", daemon=True
+        )
+
+    def start(self):
+        self.thread.start()
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+
+            if frame is None:
+                continue
+
+            stack = []
+
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                frame = frame.f_back
+
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self, path: str) -> str:
+        self.stopped.set()
+        self.thread.join()
+
+        with open(path, "w") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{';'.join(stack)} {count}\n")
+
+        return path
+
+
+class LoopLagMonitor:
+    """
+    Lag of the event loop: how much later than requested a sleep of
+    `interval` seconds returns.
+    """
+
+    def __init__(self, *, interval: float = 0.1, window: int = 256):
+        self.interval = interval
+        self.lag = LatencySeries(window)
+        self.task: t.Optional[asyncio.Task] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self.task = loop.create_task(self.run(loop))
+
+    async def run(self, loop: asyncio.AbstractEventLoop):
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag.record(max(0.0, loop.time() - expected))
+
+    def stop(self, path: t.Optional[str] = None) -> t.Dict[str, t.Any]:
+        if self.task is not None:
+            self.task.cancel()
+
+        summary = self.lag.summary()
+
+        if path is not None:
+            with open(path, "w") as file:
+                file.write(json.dumps(summary))
+
+        return summary
+
+
+class SlowEvent:
+    __slots__ = ("generation", "captured_at", "duration", "payload", "stack")
+
+    def __init__(
+        self,
+        generation: int,
+        captured_at: float,
+        payload: t.Union[bytes, str],
+        stack: str,
+    ):
+        self.generation = generation
+        self.captured_at = captured_at
+        self.duration: t.Optional[float] = None
+        self.payload = payload
+        self.stack = stack
+
+    def as_dict(self) -> t.Dict[str, t.Any]:
+        payload = self.payload
+
+        return {
+            "captured_at": self.captured_at,
+            "duration": self.duration,
+            "payload": payload.decode() if isinstance(payload, bytes) else payload,
+            "stack": self.stack,
+        }
+
+
+class SlowEventWatchdog:
+    """
+    Captures the payload and the stack of the event loop thread whenever a
+    frame is still being processed `threshold` seconds after it started.
+    The last `keep` captures are kept on `events` and, with `path`, appended
+    to that file as JSON lines once the frame is done.
+    """
+
+    logger = logging.getLogger("spotivents.profiling")
+
+    def __init__(
+        self,
+        threshold: float,
+        *,
+        thread_id: int,
+        path: t.Optional[str] = None,
+        keep: int = 16,
+    ):
+        self.threshold = threshold
+        self.thread_id = thread_id
+        self.path = path
+
+        self.events: t.Deque[SlowEvent] = deque(maxlen=keep)
+
+        self.payload: t.Optional[t.Union[bytes, str]] = None
+        self.started = 0.0
+        self.generation = 0
+        self.captured: t.Optional[SlowEvent] = None
+
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self.watch, name="spotivents-watchdog", daemon=True
+        )
+
+    def start(self):
+        self.thread.start()
+
+    def begin(self, payload: t.Union[bytes, str]):
+        self.generation += 1
+        self.started = time.perf_counter()
+        self.payload = payload
+
+    def end(self):
+        captured, self.captured = self.captured, None
+        self.payload = None
+
+        if captured is None or captured.generation != self.generation:
+            return
+
+        captured.duration = time.perf_counter() - self.started
+        self.logger.warning(
+            "Processing a frame took %.2fms: %s",
+            captured.duration * 1000,
+            truncated_repl(captured.payload),
+        )
+
+        if self.path is not None:
+            with open(self.path, "a") as file:
+                file.write(json.dumps(captured.as_dict()))
+                file.write("\n")
+
+    def watch(self):
+        while not self.stopped.wait(self.threshold / 4):
+            generation, payload, started = self.generation, self.payload, self.started
+
+            if (
+                payload is None
+                or self.captured is not None
+                or time.perf_counter() - started < self.threshold
+            ):
+                continue
+
+            frame = sys._current_frames().get(self.thread_id)
+
+            if frame is None:
+                continue
+
+            captured = SlowEvent(
+                generation,
+                time.time(),
+                payload,
+                "".join(traceback.format_stack(frame)),
+            )
+            del frame
+
+            # The frame may have finished while the stack was captured.
+            if self.generation == generation:
+                self.captured = captured
+                self.events.append(captured)
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
@@ -0,0 +1,241 @@
+"""
+Recording and offline replay of dealer traffic.
+
+Recordings are append-only sequences of `<kind:u8><timestamp:f64><length:u32>`
+headers followed by the UTF-8 payload; `kind` is either a dealer frame or the
+connect-state cluster returned when the client registers.
+
+`DealerStandIn` serves a recording over a local aiohttp application that
+implements the dealer websocket and the connect-state endpoints, so a
+`SpotifyClient` can be driven end-to-end without an account:
+
+```py
+async with DealerStandIn("session.rec", speed=None) as stand_in:
+    client = SpotifyClient(
+        session,
+        ReplayAuthenticator(),
+        dealer_endpoint=stand_in.dealer_endpoint,
+        spclient_endpoint=stand_in.spclient_endpoint,
+    )
+    await client.run()
+```
+"""
+
+import asyncio
+import struct
+import time
+import typing as t
+
+import aiohttp
+import yarl
+from aiohttp import web
+
+from .optopt import json
+
+RECORD_HEADER = struct.Struct("<BdI")
+
+FRAME_RECORD = 0
+CLUSTER_STATE_RECORD = 1
+
+
+class FrameRecorder:
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "ab")
+
+    def write(self, kind: int, data: t.Union[bytes, str], timestamp=None):
+        if isinstance(data, str):
+            data = data.encode()
+
+        self.file.write(
+            RECORD_HEADER.pack(
+                kind, time.time() if timestamp is None else timestamp, len(data)
+            )
+        )
+        self.file.write(data)
+
+    def write_frame(self, data: t.Union[bytes, str]):
+        self.write(FRAME_RECORD, data)
+
+    def write_cluster_state(self, data: t.Union[bytes, str]):
+        self.write(CLUSTER_STATE_RECORD, data)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def iter_records(path: str) -> t.Iterator[t.Tuple[int, float, bytes]]:
+    with open(path, "rb") as file:
+        while True:
+            header = file.read(RECORD_HEADER.size)
+
+            if len(header) < RECORD_HEADER.size:
+                return
+
+            kind, timestamp, length = RECORD_HEADER.unpack(header)
+            yield kind, timestamp, file.read(length)
+
+
+class ReplayAuthenticator:
+    """
+    Stand-in for `SpotifyAuthenticator` that never leaves the machine.
+    """
+
+    def __init__(self, session=None, cookie=None):
+        self.session = session
+        self.cookie = cookie
+
+    async def bearer_token(self):
+        return {
+            "accessToken": "spotivents-replay",
+            "accessTokenExpirationTimestampMs": (time.time() + 3600) * 1000,
+            "clientId": "spotivents-replay",
+        }
+
+    async def client_token(self):
+        return {"granted_token": {"token": "spotivents-replay"}}
+
+
+class DealerStandIn:
+    """
+    Local dealer and connect-state server replaying a recording at `speed`
+    times the recorded pace; `speed=None` replays as fast as possible. The
+    websocket is closed once the recording is exhausted, unless
+    `close_after_replay` is unset, in which case it keeps answering pings
+    until the client leaves.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        speed: t.Optional[float] = 1.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        close_after_replay: bool = True,
+    ):
+        self.speed = speed
+        self.close_after_replay = close_after_replay
+        self.host = host
+        self.port = port
+
+        self.cluster_state = b"{}"
+        self.frames: t.List[t.Tuple[float, bytes]] = []
+
+        for kind, timestamp, data in iter_records(path):
+            if kind == CLUSTER_STATE_RECORD:
+                self.cluster_state = data
+            else:
+                self.frames.append((timestamp, data))
+
+        self.sent = 0
+        self.pings = 0
+
+        self.app = web.Application()
+        self.app.router.add_get("/", self.dealer)
+        self.app.router.add_post("/track-playback/v1/devices", self.register_device)
+        self.app.router.add_put(
+            "/connect-state/v1/devices/{device_id}", self.connect_state
+        )
+
+        self.runner: t.Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> yarl.URL:
+        return yarl.URL.build(scheme="http", host=self.host, port=self.port)
+
+    @property
+    def dealer_endpoint(self) -> yarl.URL:
+        return self.base_url.with_scheme("ws")
+
+    @property
+    def spclient_endpoint(self) -> yarl.URL:
+        return self.base_url
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+
+        # With port 0 the system picks one; read back the one bound.
+        self.port = self.runner.addresses[0][1]
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *_):
+        await self.stop()
+
+    async def register_device(self, request: web.Request):
+        return web.json_response({})
+
+    async def connect_state(self, request: web.Request):
+        return web.Response(body=self.cluster_state, content_type="application/json")
+
+    async def answer_pings(self, ws: web.WebSocketResponse):
+        async for msg in ws:
+            if (
+                msg.type == aiohttp.WSMsgType.TEXT
+                and json.loads(msg.data).get("type") == "ping"
+            ):
+                self.pings += 1
+                await ws.send_str(json.dumps({"type": "pong"}))
+
+    async def dealer(self, request: web.Request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        await ws.send_str(
+            json.dumps(
+                {
+                    "type": "message",
+                    "method": "PUT",
+                    "uri": "hm://pusher/v1/connections/spotivents-replay",
+                    "headers": {"Spotify-Connection-Id": "spotivents-replay"},
+                }
+            )
+        )
+
+        pinger = asyncio.get_event_loop().create_task(self.answer_pings(ws))
+        await asyncio.sleep(0)
+
+        previous_timestamp = None
+
+        for timestamp, data in self.frames:
+            if self.speed and previous_timestamp is not None:
+                await asyncio.sleep((timestamp - previous_timestamp) / self.speed)
+
+            previous_timestamp = timestamp
+
+            await ws.send_str(data.decode())
+            self.sent += 1
+
+        if not self.close_after_replay:
+            await pinger
+            return ws
+
+        pinger.cancel()
+
+        try:
+            await pinger
+        except asyncio.CancelledError:
+            pass
+
+        # Closing only once nothing else is receiving makes aiohttp wait for
+        # the client's close reply, so slow clients still drain every frame.
+        await ws.close()
+
+        return ws
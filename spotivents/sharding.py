@@ -0,0 +1,419 @@
+"""
+Sharding of accounts across worker processes.
+
+Cluster parsing is pure Python, so one event loop can only parse events for
+so many connections. `ShardSupervisor` spreads accounts over worker
+processes, each running a `SpotifyClientHub`; the workers forward the changes
+of the subscribed cluster getters to the parent as JSON batches over a pipe,
+where they are dispatched to the supervisor's handlers.
+
+Workers that exit are restarted, and accounts are moved between workers so
+that every live worker carries an even share.
+"""
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import typing as t
+from dataclasses import is_dataclass
+from multiprocessing.connection import Connection
+
+from .auth import SpotifyAuthenticator
+from .client import SpotifyClient
+from .hub import SpotifyClientHub
+from .optopt import json
+from .utils import TimePosition
+
+
+def encode_value(value):
+    if is_dataclass(value):
+        return {name: getattr(value, name) for name in value.__dataclass_fields__}
+
+    if isinstance(value, TimePosition):
+        return int(value.value())
+
+    raise TypeError(f"Cannot forward {type(value).__name__} values")
+
+
+class ShardWorker:
+    """
+    The accounts of one worker process, in a `SpotifyClient` hub.
+
+    Changes of the subscribed cluster getters are sent to the supervisor in
+    one JSON batch per loop iteration. Connections that end are restarted
+    with the supervisor's backoff until their account is removed.
+    """
+
+    logger = logging.getLogger("spotivents.sharding")
+
+    def __init__(
+        self,
+        connection: Connection,
+        cluster_getters: t.Tuple[str, ...],
+        authenticator: t.Callable,
+        client_options: t.Dict[str, t.Any],
+    ):
+        self.connection = connection
+        self.authenticator = authenticator
+
+        self.hub = SpotifyClientHub(**client_options)
+        self.pending: t.List[t.Tuple] = []
+        self.stopped = asyncio.Event()
+
+        self.started_at: t.Dict[str, float] = {}
+        self.crashes: t.Dict[str, int] = {}
+
+        for cluster_getter in cluster_getters:
+            self.hub.on_cluster_change(cluster_getter)(self.forward(cluster_getter))
+
+    def forward(self, cluster_getter: str):
+        def forward_change(cluster, old_value, new_value):
+            if not self.pending:
+                asyncio.get_event_loop().call_soon(self.flush)
+
+            self.pending.append(
+                (self.hub.current_account.get(), cluster_getter, old_value, new_value)
+            )
+
+        return forward_change
+
+    def flush(self):
+        # Whatever happens, the next change schedules a new batch.
+        try:
+            self.connection.send_bytes(
+                json.dumps(self.pending, default=encode_value).encode()
+            )
+        except Exception:
+            self.logger.exception(f"Could not forward {len(self.pending)} changes")
+        finally:
+            self.pending.clear()
+
+    def start_account(self, account_id: str):
+        if self.stopped.is_set() or account_id not in self.hub.clients:
+            return
+
+        self.started_at[account_id] = asyncio.get_event_loop().time()
+        self.hub.start_account(account_id).add_done_callback(
+            functools.partial(self.account_stopped, account_id)
+        )
+
+    def account_stopped(self, account_id: str, task: asyncio.Task):
+        if (
+            task.cancelled()
+            or self.stopped.is_set()
+            or self.hub.account_tasks.get(account_id) is not task
+        ):
+            return
+
+        loop = asyncio.get_event_loop()
+
+        # Connections that ran for a while start backing off from scratch.
+        if loop.time() - self.started_at[account_id] > (
+            ShardSupervisor.max_restart_delay
+        ):
+            self.crashes[account_id] = 0
+
+        crashes = self.crashes[account_id] = self.crashes.get(account_id, 0) + 1
+        delay = min(
+            ShardSupervisor.restart_delay * 2 ** (crashes - 1),
+            ShardSupervisor.max_restart_delay,
+        )
+
+        self.logger.error(
+            f"Connection of account {account_id!r} ended, restarting in {delay:.1f}s",
+            exc_info=task.exception(),
+        )
+        loop.call_later(delay, self.start_account, account_id)
+
+    def receive_control(self):
+        try:
+            control = json.loads(self.connection.recv_bytes())
+        except EOFError:
+            asyncio.get_event_loop().remove_reader(self.connection.fileno())
+            self.stopped.set()
+            return
+
+        for account_id in control.get("remove", ()):
+            self.hub.remove_account(account_id)
+            self.crashes.pop(account_id, None)
+
+        for account_id, cookie in control.get("add", {}).items():
+            self.hub.add_account(
+                account_id, self.authenticator(self.hub.get_session(), cookie)
+            )
+            self.start_account(account_id)
+
+    async def serve(self):
+        asyncio.get_event_loop().add_reader(
+            self.connection.fileno(), self.receive_control
+        )
+
+        await self.stopped.wait()
+        await self.hub.close()
+
+
+async def serve_shard(
+    connection: Connection,
+    cluster_getters: t.Tuple[str, ...],
+    authenticator: t.Callable,
+    client_options: t.Dict[str, t.Any],
+):
+    await ShardWorker(
+        connection, cluster_getters, authenticator, client_options
+    ).serve()
+
+
+def run_shard(
+    connection: Connection,
+    cluster_getters: t.Tuple[str, ...],
+    authenticator: t.Callable,
+    client_options: t.Dict[str, t.Any],
+):
+    asyncio.run(serve_shard(connection, cluster_getters, authenticator, client_options))
+
+
+class Shard:
+    def __init__(self, index: int):
+        self.index = index
+
+        self.process: t.Optional[multiprocessing.Process] = None
+        self.connection: t.Optional[Connection] = None
+
+        self.accounts: t.Set[str] = set()
+        self.started_at = 0.0
+        self.crashes = 0
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None
+
+
+class ShardSupervisor:
+    """
+    Run `accounts` (account id to `sp_dc` cookie) across `processes` worker
+    processes and dispatch `(account_id, cluster_getter, old_value,
+    new_value)` to the `on_change` handlers for every change of
+    `cluster_getters`.
+
+    `authenticator` builds an account's authenticator from the worker's
+    session and the cookie; it and `client_options` must be picklable.
+    """
+
+    logger = logging.getLogger("spotivents.sharding")
+
+    restart_delay = 1.0
+    max_restart_delay = 60.0
+
+    def __init__(
+        self,
+        accounts: t.Dict[str, str],
+        cluster_getters: t.Iterable[str],
+        *,
+        processes: t.Optional[int] = None,
+        authenticator: t.Callable = SpotifyAuthenticator,
+        **client_options,
+    ):
+        self.accounts = dict(accounts)
+        self.cluster_getters = tuple(cluster_getters)
+        self.authenticator = authenticator
+        self.client_options = client_options
+
+        self.shards = [
+            Shard(index) for index in range(processes or os.cpu_count() or 1)
+        ]
+        self.assignments: t.Dict[str, Shard] = {}
+
+        self.change_callbacks = list()
+        self.context = multiprocessing.get_context("spawn")
+        self.closed: t.Optional[asyncio.Event] = None
+
+    def on_change(self, **options):
+        return SpotifyClient.event_handler_wrapper(self.change_callbacks, **options)
+
+    def start_shard(self, shard: Shard):
+        if self.closed is None or self.closed.is_set():
+            return
+
+        loop = asyncio.get_event_loop()
+        connection, child_connection = self.context.Pipe()
+
+        shard.process = self.context.Process(
+            target=run_shard,
+            args=(
+                child_connection,
+                self.cluster_getters,
+                self.authenticator,
+                self.client_options,
+            ),
+            name=f"spotivents-shard-{shard.index}",
+            daemon=True,
+        )
+        shard.process.start()
+        shard.started_at = loop.time()
+        child_connection.close()
+
+        shard.connection = connection
+
+        loop.add_reader(connection.fileno(), self.receive_changes, shard)
+        loop.add_reader(shard.process.sentinel, self.shard_exited, shard)
+
+    def restart_shard(self, shard: Shard):
+        self.start_shard(shard)
+
+        if shard.alive:
+            self.rebalance()
+
+    def shard_exited(self, shard: Shard):
+        loop = asyncio.get_event_loop()
+
+        loop.remove_reader(shard.process.sentinel)
+        loop.remove_reader(shard.connection.fileno())
+
+        shard.process.join()
+        exitcode = shard.process.exitcode
+        shard.connection.close()
+
+        shard.process = shard.connection = None
+
+        for account_id in shard.accounts:
+            del self.assignments[account_id]
+
+        shard.accounts.clear()
+
+        if self.closed.is_set():
+            return
+
+        # Workers that ran for a while start backing off from scratch again.
+        if loop.time() - shard.started_at > self.max_restart_delay:
+            shard.crashes = 0
+
+        shard.crashes += 1
+        delay = min(
+            self.restart_delay * 2 ** (shard.crashes - 1), self.max_restart_delay
+        )
+
+        self.logger.error(
+            f"Shard {shard.index} exited with {exitcode}, restarting in {delay:.1f}s"
+        )
+
+        self.rebalance()
+        loop.call_later(delay, self.restart_shard, shard)
+
+    def receive_changes(self, shard: Shard):
+        try:
+            changes = json.loads(shard.connection.recv_bytes())
+        except (EOFError, OSError):
+            asyncio.get_event_loop().remove_reader(shard.connection.fileno())
+            return
+
+        loop = asyncio.get_event_loop()
+
+        for account_id, cluster_getter, old_value, new_value in changes:
+            SpotifyClient.dispatch_event_callbacks(
+                loop,
+                self.change_callbacks,
+                account_id,
+                cluster_getter,
+                old_value,
+                new_value,
+            )
+
+    def rebalance(self):
+        """
+        Assign accounts of exited workers to live ones, then move accounts
+        from the fullest to the emptiest workers until they differ by at most
+        one account.
+        """
+        live_shards = [shard for shard in self.shards if shard.alive]
+
+        if not live_shards:
+            return
+
+        added: t.Dict[Shard, t.Dict[str, str]] = {shard: {} for shard in live_shards}
+        removed: t.Dict[Shard, t.List[str]] = {shard: [] for shard in live_shards}
+
+        def assign(account_id: str, shard: Shard):
+            self.assignments[account_id] = shard
+            shard.accounts.add(account_id)
+            added[shard][account_id] = self.accounts[account_id]
+
+        for account_id in self.accounts:
+            if account_id not in self.assignments:
+                assign(
+                    account_id, min(live_shards, key=lambda shard: len(shard.accounts))
+                )
+
+        while True:
+            fullest = max(live_shards, key=lambda shard: len(shard.accounts))
+            emptiest = min(live_shards, key=lambda shard: len(shard.accounts))
+
+            if len(fullest.accounts) - len(emptiest.accounts) <= 1:
+                break
+
+            account_id = fullest.accounts.pop()
+
+            if added[fullest].pop(account_id, None) is None:
+                removed[fullest].append(account_id)
+
+            assign(account_id, emptiest)
+
+        for shard in live_shards:
+            if added[shard] or removed[shard]:
+                shard.connection.send_bytes(
+                    json.dumps({"add": added[shard], "remove": removed[shard]}).encode()
+                )
+
+    async def run(self):
+        """
+        Run the workers until `close` is called.
+        """
+        self.closed = asyncio.Event()
+
+        # Every worker is up before accounts are assigned, so none moves.
+        for shard in self.shards:
+            self.start_shard(shard)
+
+        self.rebalance()
+
+        await self.closed.wait()
+
+    async def close(self, timeout: float = 5.0):
+        if self.closed is None:
+            return
+
+        self.closed.set()
+
+        loop = asyncio.get_event_loop()
+        processes = []
+
+        for shard in self.shards:
+            if shard.alive:
+                loop.remove_reader(shard.process.sentinel)
+                loop.remove_reader(shard.connection.fileno())
+                # Closing the pipe tells the worker to shut its clients down.
+                shard.connection.close()
+                processes.append(shard.process)
+
+                shard.process = shard.connection = None
+                shard.accounts.clear()
+
+        self.assignments.clear()
+
+        for process in processes:
+            await loop.run_in_executor(None, process.join, timeout)
+
+            if process.is_alive():
+                process.terminate()
+
+    def summary(self) -> t.Dict[int, t.Dict[str, t.Any]]:
+        return {
+            shard.index: {
+                "alive": shard.alive,
+                "pid": shard.process.pid if shard.alive else None,
+                "accounts": len(shard.accounts),
+                "crashes": shard.crashes,
+            }
+            for shard in self.shards
+        }
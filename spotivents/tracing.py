@@ -0,0 +1,317 @@
+"""
+Per-frame timings of the event pipeline and counters of controller HTTP
+calls, exported through a pluggable `MetricsSink`.
+
+A `SpotifyClient` given a `Tracer` stamps every frame with the time spent in
+each stage, under `frame.<stage>`:
+
+- `receive`: from the websocket read to the frame being handled;
+- `decode`: parsing the frame;
+- `iter_handled_payloads`: producing the payloads, `from_dict` included;
+- `from_dict`: materialising clusters;
+- `diff`: comparing the watched values of the previous and new cluster;
+- `dispatch`: running synchronous handlers and scheduling coroutine ones;
+- `handlers`: from the frame being handled until every coroutine handler
+  scheduled for it has finished;
+- `total`: from the websocket read until then.
+
+Without a tracer every stage costs a single `is not None` check.
+
+```py
+sink = PrometheusSink()
+client = SpotifyClient(session, auth, tracer=Tracer(sink))
+controller = SpotifyAPIControllerClient(session, auth, metrics=sink)
+
+app.router.add_get("/metrics", sink.handle)
+```
+"""
+
+import abc
+import asyncio
+import inspect
+import socket
+import sys
+import time
+import typing as t
+
+from .utils import Histogram
+
+Tags = t.Tuple[t.Tuple[str, str], ...]
+
+
+class MetricsSink(abc.ABC):
+    """
+    Receiver of timings, in seconds, and counter increments.
+    """
+
+    @abc.abstractmethod
+    def timing(self, name: str, seconds: float, tags: Tags = ()): ...
+
+    @abc.abstractmethod
+    def increment(self, name: str, value: int = 1, tags: Tags = ()): ...
+
+
+class MemorySink(MetricsSink):
+    """
+    Histograms and counters per name and tags, kept in memory.
+    """
+
+    def __init__(self):
+        self.histograms: t.Dict[t.Tuple[str, Tags], Histogram] = {}
+        self.counters: t.Dict[t.Tuple[str, Tags], int] = {}
+
+    def timing(self, name: str, seconds: float, tags: Tags = ()):
+        histogram = self.histograms.get((name, tags))
+
+        if histogram is None:
+            histogram = self.histograms[name, tags] = Histogram()
+
+        histogram.record(seconds)
+
+    def increment(self, name: str, value: int = 1, tags: Tags = ()):
+        self.counters[name, tags] = self.counters.get((name, tags), 0) + value
+
+    def summary(self) -> t.Dict[str, t.Any]:
+        return {
+            "timings": {
+                series_name(name, tags): histogram.summary()
+                for (name, tags), histogram in self.histograms.items()
+            },
+            "counters": {
+                series_name(name, tags): value
+                for (name, tags), value in self.counters.items()
+            },
+        }
+
+
+def series_name(name: str, tags: Tags) -> str:
+    if not tags:
+        return name
+
+    return f"{name}{{{','.join(f'{key}={value}' for key, value in tags)}}}"
+
+
+def prometheus_labels(tags: Tags, **extra: str) -> str:
+    labels = [*tags, *extra.items()]
+
+    if not labels:
+        return ""
+
+    return "{%s}" % ",".join(f'{key}="{value}"' for key, value in labels)
+
+
+class PrometheusSink(MemorySink):
+    """
+    `MemorySink` rendered in the Prometheus text exposition format, timings
+    as histograms over the `utils.Histogram` buckets.
+    """
+
+    def __init__(self, namespace: str = "spotivents"):
+        super().__init__()
+        self.namespace = namespace
+
+    def metric_name(self, name: str, suffix: str = "") -> str:
+        return f"{self.namespace}_{name.replace('.', '_')}{suffix}"
+
+    def render(self) -> str:
+        lines = []
+        declared = set()
+
+        for (name, tags), histogram in sorted(self.histograms.items()):
+            metric = self.metric_name(name, "_seconds")
+
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+
+            cumulative = 0
+
+            for bound, count in zip(histogram.bounds, histogram.counts):
+                cumulative += count
+                lines.append(
+                    f"{metric}_bucket{prometheus_labels(tags, le=repr(bound))} {cumulative}"
+                )
+
+            lines.append(
+                f"{metric}_bucket{prometheus_labels(tags, le='+Inf')} {histogram.count}"
+            )
+            lines.append(f"{metric}_sum{prometheus_labels(tags)} {histogram.total}")
+            lines.append(f"{metric}_count{prometheus_labels(tags)} {histogram.count}")
+
+        for (name, tags), value in sorted(self.counters.items()):
+            metric = self.metric_name(name, "_total")
+
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+
+            lines.append(f"{metric}{prometheus_labels(tags)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    async def handle(self, request):
+        """
+        aiohttp handler serving `render()`.
+        """
+        from aiohttp import web
+
+        return web.Response(text=self.render(), content_type="text/plain")
+
+
+class StatsdSink(MetricsSink):
+    """
+    Fire-and-forget StatsD datagrams, tags in the DogStatsD `|#key:value`
+    extension. Datagrams that cannot be sent are dropped.
+    """
+
+    def __init__(
+        self, host: str = "127.0.0.1", port: int = 8125, prefix: str = "spotivents"
+    ):
+        self.prefix = prefix
+        self.dropped = 0
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.socket.connect((host, port))
+
+    def send(self, name: str, value: str, kind: str, tags: Tags):
+        datagram = f"{self.prefix}.{name}:{value}|{kind}"
+
+        if tags:
+            datagram += "|#" + ",".join(f"{key}:{tag}" for key, tag in tags)
+
+        try:
+            self.socket.send(datagram.encode())
+        except OSError:
+            self.dropped += 1
+
+    def timing(self, name: str, seconds: float, tags: Tags = ()):
+        self.send(name, f"{seconds * 1000:.3f}", "ms", tags)
+
+    def increment(self, name: str, value: int = 1, tags: Tags = ()):
+        self.send(name, str(value), "c", tags)
+
+    def close(self):
+        self.socket.close()
+
+
+class FrameTrace:
+    """
+    Stage timings of a single frame, emitted once the frame and every
+    coroutine handler scheduled for it are done.
+    """
+
+    __slots__ = ("sink", "received_at", "started", "stages", "pending", "handled")
+
+    def __init__(self, sink: MetricsSink, received_at: float):
+        self.sink = sink
+        self.received_at = received_at
+        self.started = time.perf_counter()
+        self.stages: t.Dict[str, float] = {"receive": time.time() - received_at}
+        self.pending = 0
+        self.handled = False
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def timed(self, stage: str, iterable: t.Iterable) -> t.Iterator:
+        iterator = iter(iterable)
+
+        while True:
+            started = time.perf_counter()
+
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(stage, time.perf_counter() - started)
+                return
+
+            self.add(stage, time.perf_counter() - started)
+            yield item
+
+    def wait_for(self, task: "asyncio.Future"):
+        self.pending += 1
+        task.add_done_callback(self.handler_done)
+
+    def handler_done(self, _):
+        self.pending -= 1
+
+        if self.handled and not self.pending:
+            self.emit()
+
+    def finish(self):
+        """
+        Mark the frame handled; emits unless handlers are still running.
+        """
+        self.handled = True
+
+        if not self.pending:
+            self.emit()
+
+    def emit(self):
+        handlers = time.perf_counter() - self.started
+
+        for stage, seconds in self.stages.items():
+            self.sink.timing(f"frame.{stage}", seconds)
+
+        self.sink.timing("frame.handlers", handlers)
+        self.sink.timing("frame.total", self.stages["receive"] + handlers)
+
+
+class Tracer:
+    def __init__(self, sink: MetricsSink):
+        self.sink = sink
+
+    def frame(self, received_at: float) -> FrameTrace:
+        return FrameTrace(self.sink, received_at)
+
+
+class MeteredSession:
+    """
+    Proxy of an aiohttp session counting requests under
+    `controller.http_requests`, tagged with the HTTP method and the
+    outermost method of `owner` on the stack that issued them.
+    """
+
+    request_methods = frozenset(("request", "get", "post", "put", "delete", "head"))
+
+    def __init__(self, session, sink: MetricsSink, owner: type):
+        self.session = session
+        self.sink = sink
+        self.owner_codes = {
+            function.__code__: name
+            for name, function in inspect.getmembers(owner, inspect.isfunction)
+        }
+
+    def issuing_method(self) -> str:
+        method = "unknown"
+        frame = sys._getframe(2)
+
+        while frame is not None:
+            method = self.owner_codes.get(frame.f_code, method)
+            frame = frame.f_back
+
+        return method
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self.session, name)
+
+        if name not in self.request_methods:
+            return attribute
+
+        def counted(*args, **kwargs):
+            http_method = name
+
+            if name == "request":
+                http_method = args[0] if args else kwargs.get("method")
+
+            self.sink.increment(
+                "controller.http_requests",
+                tags=(
+                    ("method", self.issuing_method()),
+                    ("http_method", str(http_method).upper()),
+                ),
+            )
+            return attribute(*args, **kwargs)
+
+        return counted
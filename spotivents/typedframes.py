@@ -0,0 +1,64 @@
+"""
+Typed decoding of raw dealer frames.
+
+The default path decodes frames with `optopt.json` and materialises
+clusters from the resulting dicts without copying them.
+
+The typed path (msgspec, opt-in, see `typedstructs`) decodes frame bytes
+straight into the cluster models. msgspec and the typed structs are only
+imported once a frame is decoded with `typed=True`.
+"""
+
+import typing as t
+
+from . import optopt
+from .clustercls import SharedObjects, iter_handled_payloads
+from .optopt import json
+
+if t.TYPE_CHECKING:
+    from .tracing import FrameTrace
+
+
+def iter_fallback_payloads(
+    payloads: t.List[t.Any],
+    subtrees: t.Optional[t.Set[str]] = None,
+    trace: t.Optional["FrameTrace"] = None,
+    shared: t.Optional[SharedObjects] = None,
+):
+    yield from iter_handled_payloads(
+        payloads, copy=False, subtrees=subtrees, trace=trace, shared=shared
+    )
+
+
+def decode_frame_fallback(
+    data: t.Union[bytes, str],
+    subtrees: t.Optional[t.Set[str]] = None,
+    trace: t.Optional["FrameTrace"] = None,
+    shared: t.Optional[SharedObjects] = None,
+) -> t.Dict:
+    frame = json.loads(data)
+    frame["payloads"] = iter_fallback_payloads(
+        frame.get("payloads", []), subtrees, trace, shared
+    )
+    return frame
+
+
+def decode_frame(
+    data: t.Union[bytes, str],
+    *,
+    typed: bool = False,
+    subtrees: t.Optional[t.Set[str]] = None,
+    trace: t.Optional["FrameTrace"] = None,
+    shared: t.Optional[SharedObjects] = None,
+) -> t.Dict:
+    """
+    Decode a raw dealer frame; its `payloads` are yielded lazily with
+    clusters already materialised, limited to `subtrees` when given and
+    sharing unchanged parts through `shared`.
+    """
+    if typed and optopt.msgspec is not None:
+        from .typedstructs import decode_typed_frame
+
+        return decode_typed_frame(data, subtrees, trace, shared)
+
+    return decode_frame_fallback(data, subtrees, trace, shared)
@@ -0,0 +1,272 @@
+"""
+msgspec structs decoding dealer frames straight into the cluster models,
+used by `typedframes.decode_frame` with `typed=True`; importing this module
+requires msgspec.
+
+Devices, playback options and playback quality are built natively by
+msgspec, everything else is materialised from typed structs that mirror the
+model schemas. Devices and queue entries are shared through `SharedObjects`
+as on the dict-based path. Frames that do not fit the schema fall back to the dict-based
+path.
+"""
+
+import time
+import typing as t
+from dataclasses import _MISSING_TYPE
+
+import msgspec
+
+from .clustercls import (
+    DEVICE_INTERNED_FIELDS,
+    SharedObjects,
+    SpotifyConnectDevice,
+    SpotifyDeviceStateChangeCluster,
+    SpotifyPlaybackQuality,
+    SpotifyPlayerState,
+    SpotifyPlayerStateOptions,
+    SpotifyPlayerStatePartialTrack,
+    SpotifyTrack,
+    intern_value,
+    needs_subtree,
+    subscribed_update_reasons,
+)
+from .optopt import json
+from .typedframes import decode_frame_fallback, iter_fallback_payloads
+from .utils import TimePosition
+
+if t.TYPE_CHECKING:
+    from .tracing import FrameTrace
+
+asdict = msgspec.structs.asdict
+
+
+def shadow_default(dataclass_field):
+    if not isinstance(dataclass_field.default, _MISSING_TYPE):
+        return dataclass_field.default
+
+    if not isinstance(dataclass_field.default_factory, _MISSING_TYPE):
+        return msgspec.field(default_factory=dataclass_field.default_factory)
+
+    return None
+
+
+def shadow_struct(model, overrides: t.Dict[str, t.Any]):
+    """
+    Mirror a model's schema as a msgspec struct; required fields that are
+    absent from a frame decode as None rather than being reported.
+    """
+    return msgspec.defstruct(
+        f"{model.__name__}Struct",
+        [
+            (name, overrides.get(name, t.Any), shadow_default(dataclass_field))
+            for name, dataclass_field in model.__dataclass_fields__.items()
+        ],
+    )
+
+
+TrackStruct = shadow_struct(SpotifyTrack, {"metadata": t.Optional[t.Dict[str, t.Any]]})
+PartialTrackStruct = shadow_struct(
+    SpotifyPlayerStatePartialTrack, {"metadata": t.Optional[t.Dict[str, t.Any]]}
+)
+
+PlayerStateStruct = shadow_struct(
+    SpotifyPlayerState,
+    {
+        "track": t.Optional[TrackStruct],
+        "next_tracks": t.List[t.Optional[PartialTrackStruct]],
+        "prev_tracks": t.List[t.Optional[PartialTrackStruct]],
+        "options": t.Optional[SpotifyPlayerStateOptions],
+        "playback_quality": t.Optional[SpotifyPlaybackQuality],
+    },
+)
+
+ClusterStruct = shadow_struct(
+    SpotifyDeviceStateChangeCluster,
+    {
+        "player_state": t.Optional[PlayerStateStruct],
+        "devices": t.Dict[str, t.Optional[SpotifyConnectDevice]],
+    },
+)
+
+
+class FrameStruct(msgspec.Struct):
+    type: str
+    headers: t.Dict[str, str] = {}
+    payloads: t.List[msgspec.Raw] = []
+    uri: t.Optional[str] = None
+
+
+class PayloadHeadStruct(msgspec.Struct):
+    type: t.Optional[str] = None
+    update_reason: str = "CLIENT_CALLBACK"
+
+
+class ClusterPayloadStruct(msgspec.Struct):
+    cluster: t.Optional[ClusterStruct] = None
+    update_reason: str = "CLIENT_CALLBACK"
+    devices_that_changed: t.Optional[t.List[str]] = None
+
+
+frame_decoder = msgspec.json.Decoder(FrameStruct)
+payload_head_decoder = msgspec.json.Decoder(PayloadHeadStruct)
+cluster_payload_decoder = msgspec.json.Decoder(ClusterPayloadStruct)
+
+
+def tracks_from_struct(structs, subtrees, path, shared):
+    if not needs_subtree(subtrees, path):
+        return None
+
+    return [
+        SpotifyPlayerStatePartialTrack.from_dict(asdict(struct), shared)
+        for struct in structs or ()
+        if struct is not None
+    ]
+
+
+def shared_device(device, shared: t.Optional[SharedObjects]):
+    """
+    `device`, decoded by msgspec, or the equal one `shared` already holds.
+    """
+    if device is None or shared is None:
+        return device
+
+    key = (SpotifyConnectDevice, device.device_id)
+    cached = shared.get(key, device)
+
+    if cached is not None:
+        return cached
+
+    for name in DEVICE_INTERNED_FIELDS:
+        setattr(device, name, intern_value(getattr(device, name)))
+
+    return shared.put(key, device, device)
+
+
+def player_state_from_struct(
+    struct,
+    subtrees: t.Optional[t.Set[str]] = None,
+    shared: t.Optional[SharedObjects] = None,
+) -> t.Optional[SpotifyPlayerState]:
+    if struct is None or not needs_subtree(subtrees, "player_state"):
+        return None
+
+    data = asdict(struct)
+
+    position_as_of_timestamp = data.pop("position_as_of_timestamp")
+    is_playing = not data.get("is_paused", False)
+    track = data.pop("track")
+
+    return SpotifyPlayerState(
+        track=(
+            SpotifyTrack.from_dict(None if track is None else asdict(track))
+            if needs_subtree(subtrees, "player_state.track")
+            else None
+        ),
+        next_tracks=tracks_from_struct(
+            data.pop("next_tracks"), subtrees, "player_state.next_tracks", shared
+        ),
+        prev_tracks=tracks_from_struct(
+            data.pop("prev_tracks"), subtrees, "player_state.prev_tracks", shared
+        ),
+        position_as_of_timestamp=TimePosition(
+            is_playing,
+            int(position_as_of_timestamp),
+            data.get("timestamp"),
+            data.get("playback_speed"),
+        ),
+        **data,
+    )
+
+
+def cluster_from_struct(
+    update_reason: str,
+    struct,
+    subtrees: t.Optional[t.Set[str]] = None,
+    shared: t.Optional[SharedObjects] = None,
+) -> t.Optional[SpotifyDeviceStateChangeCluster]:
+    if struct is None:
+        return None
+
+    data = asdict(struct)
+    data["type"] = update_reason
+
+    player_state = data.pop("player_state")
+    devices = data.pop("devices")
+
+    return SpotifyDeviceStateChangeCluster(
+        player_state=player_state_from_struct(player_state, subtrees, shared),
+        devices=(
+            {
+                device_id: shared_device(device, shared)
+                for device_id, device in devices.items()
+            }
+            if devices is not None and needs_subtree(subtrees, "devices")
+            else None
+        ),
+        **data,
+    )
+
+
+def iter_typed_payloads(
+    payloads: t.List[msgspec.Raw],
+    subtrees: t.Optional[t.Set[str]] = None,
+    trace: t.Optional["FrameTrace"] = None,
+    shared: t.Optional[SharedObjects] = None,
+):
+    update_reasons = subscribed_update_reasons(subtrees)
+
+    for raw in payloads:
+        try:
+            head = payload_head_decoder.decode(raw)
+        except msgspec.ValidationError:
+            continue
+
+        if head.type == "replace_state":
+            yield json.loads(bytes(raw))
+            continue
+
+        if head.update_reason not in update_reasons:
+            continue
+
+        try:
+            payload = cluster_payload_decoder.decode(raw)
+        except msgspec.ValidationError:
+            yield from iter_fallback_payloads(
+                [json.loads(bytes(raw))], subtrees, trace, shared
+            )
+            continue
+
+        if trace is not None:
+            started = time.perf_counter()
+
+        cluster = cluster_from_struct(
+            payload.update_reason, payload.cluster, subtrees, shared
+        )
+
+        if trace is not None:
+            trace.add("from_dict", time.perf_counter() - started)
+
+        yield {
+            "cluster": cluster,
+            "update_reason": payload.update_reason,
+            "devices_that_changed": payload.devices_that_changed,
+        }
+
+
+def decode_typed_frame(
+    data: t.Union[bytes, str],
+    subtrees: t.Optional[t.Set[str]] = None,
+    trace: t.Optional["FrameTrace"] = None,
+    shared: t.Optional[SharedObjects] = None,
+) -> t.Dict:
+    try:
+        frame = frame_decoder.decode(data)
+    except msgspec.ValidationError:
+        return decode_frame_fallback(data, subtrees, trace, shared)
+
+    return {
+        "type": frame.type,
+        "uri": frame.uri,
+        "headers": frame.headers,
+        "payloads": iter_typed_payloads(frame.payloads, subtrees, trace, shared),
+    }
@@ -1,51 +1,73 @@
+import bisect
+import reprlib
 import time
 import typing as t
-import webbrowser
-from dataclasses import is_dataclass
+from collections import deque
 
 forgivable_errors = (AttributeError, KeyError, TypeError)
 
 
-def get_from_cluster_string(cluster, attributes: frozenset) -> t.Optional[str]:
+def get_from_cluster_string(cluster, attributes: t.Sequence[str]) -> t.Optional[str]:
 
-    attr, *attrs = attributes
-    content = getattr(cluster, attr, None)
+    for attr in attributes:
+        cluster = getattr(cluster, attr, None)
 
-    if content is None:
-        return None
+        if cluster is None:
+            return None
 
-    if attrs:
-        return get_from_cluster_string(content, frozenset(attrs))
+    return cluster
 
-    return content
 
+def set_from_cluster_string(cluster, attributes: t.Sequence[str], value):
+    *attrs, attr = attributes
 
-def set_from_cluster_string(cluster: str, attributes: frozenset, value: str):
-    attr, *attrs = attributes
+    for parent in attrs:
+        cluster = getattr(cluster, parent)
 
-    if attrs:
-        set_from_cluster_string(getattr(cluster, attr), frozenset(attrs), value)
-    else:
-        setattr(cluster, attr, value)
+    setattr(cluster, attr, value)
+
+
+def merge_patch(old: t.Dict, new: t.Dict) -> t.Dict:
+    """
+    JSON merge patch (RFC 7396) turning `old` into `new`.
 
+    Null means removal in a merge patch, so a member whose value becomes
+    None is removed by `apply_patch` rather than set to null: patched trees
+    can lack members that are None in `new`, and their readers must take
+    absent members as None. Absent and None members compare equal here.
+    """
+    patch = {}
+
+    for key in old.keys() - new.keys():
+        patch[key] = None
 
-def retain_nulled_values(old_dataclass, new_dataclass):
+    for key, value in new.items():
+        old_value = old.get(key)
 
-    if not is_dataclass(old_dataclass):
-        return
+        if old_value == value and (key in old or value is None):
+            continue
 
-    for field in old_dataclass.__dataclass_fields__:
-        old_value = getattr(old_dataclass, field)
-        new_value = getattr(new_dataclass, field, None)
+        if isinstance(value, dict) and isinstance(old_value, dict):
+            nested_patch = merge_patch(old_value, value)
 
-        if new_value is None and old_value is not None:
-            if isinstance(old_value, bool) and old_value:
-                setattr(new_dataclass, field, False)
-            else:
-                setattr(new_dataclass, field, old_value)
+            if nested_patch:
+                patch[key] = nested_patch
         else:
-            if is_dataclass(new_value):
-                retain_nulled_values(old_value, new_value)
+            patch[key] = value
+
+    return patch
+
+
+def apply_patch(target: t.Dict, patch: t.Dict) -> t.Dict:
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            apply_patch(target[key], value)
+        else:
+            target[key] = value
+
+    return target
 
 
 def get_from_cluster_getter(
@@ -117,16 +139,46 @@ def run_spotify_protocol(
     """
     Opens up a closed Spotify client.
     """
+    # Only ever needed here; keeps it off the import path of the package.
+    import webbrowser
+
     return webbrowser.open(
         f"spotify://spotify:{content_type}:{content_id}", autoraise=autoraise
     )
 
 
+class ShortRepr(reprlib.Repr):
+    def __init__(self, maxlen: int):
+        super().__init__()
+        self.maxlevel = 2
+        self.maxtuple = self.maxlist = self.maxdict = 4
+        self.maxstring = self.maxother = maxlen
+
+    def repr_instance(self, x, level):
+        # Cluster reprs run into the hundreds of kilobytes. Checked as in
+        # `dataclasses.is_dataclass`, which is costly to import.
+        if hasattr(type(x), "__dataclass_fields__"):
+            return f"{type(x).__name__}(…)"
+
+        return super().repr_instance(x, level)
+
+
+short_reprs: t.Dict[int, ShortRepr] = {}
+
+
 def truncated_repl(object, *, maxlen: int = 50):
     """
     Change <xyz object at 0x000000000000> to <xyz…> for eye bleaching.
     """
-    out = repr(object)
+    if isinstance(object, (str, bytes, bytearray)):
+        out = repr(object[: maxlen + 1])
+    else:
+        short_repr = short_reprs.get(maxlen)
+
+        if short_repr is None:
+            short_repr = short_reprs[maxlen] = ShortRepr(maxlen)
+
+        out = short_repr.repr(object)
 
     suffix = out[-1]
 
@@ -139,6 +191,18 @@ def truncated_repl(object, *, maxlen: int = 50):
     return out
 
 
+def header_value(headers: t.Mapping[str, str], name: str) -> t.Optional[str]:
+    """
+    Case-insensitive lookup of the lower-case header `name`, without copying
+    `headers` into a `CaseInsensitiveDict`.
+    """
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+
+    return None
+
+
 class CaseInsensitiveDict(dict):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -158,7 +222,7 @@ class CaseInsensitiveDict(dict):
 
     def __normalise_keys(self):
         for key in list(self.keys()):
-            self[key.lower()] = self.pop(key)
+            super().__setitem__(key.lower(), super().pop(key))
 
     def update(self, *args, **kwargs):
         super().update(*args, **kwargs)
@@ -197,15 +261,173 @@ class CaseInsensitiveDict(dict):
         return dict(self.items()) == dict(other.items())
 
 
+class ServerClock:
+    """
+    NTP-style estimate of the Spotify server clock.
+
+    Each sample brackets a server timestamp between the local send and
+    receive times; the server is assumed to have stamped it half-way, so the
+    sample's offset is only off by the asymmetry of its transit. Only samples
+    with at most the median round trip are trusted; the drift of the local
+    clock is fitted across them once they span `drift_span` seconds, and the
+    offset is taken from the quickest of the latest ones.
+    """
+
+    max_samples = 32
+    drift_span = 60.0
+
+    def __init__(self) -> None:
+        self.samples: t.Deque[t.Tuple[float, float, float]] = deque(
+            maxlen=self.max_samples
+        )
+        self.drift = 0.0
+
+    @property
+    def synchronised(self) -> bool:
+        return bool(self.samples)
+
+    def add_sample(self, sent_at: float, server_time: float, received_at: float):
+        midpoint = (sent_at + received_at) / 2
+
+        self.samples.append((midpoint, server_time - midpoint, received_at - sent_at))
+        self.drift = self.fit_drift()
+
+    def trusted_samples(self) -> t.List[t.Tuple[float, float, float]]:
+        median_delay = sorted(delay for _, _, delay in self.samples)[
+            (len(self.samples) - 1) // 2
+        ]
+        return [sample for sample in self.samples if sample[2] <= median_delay]
+
+    def fit_drift(self) -> float:
+        samples = self.trusted_samples()
+
+        if samples[-1][0] - samples[0][0] < self.drift_span:
+            return 0.0
+
+        mean_time = sum(midpoint for midpoint, _, _ in samples) / len(samples)
+        mean_offset = sum(offset for _, offset, _ in samples) / len(samples)
+
+        return sum(
+            (midpoint - mean_time) * (offset - mean_offset)
+            for midpoint, offset, _ in samples
+        ) / sum((midpoint - mean_time) ** 2 for midpoint, _, _ in samples)
+
+    def offset(self, at: t.Optional[float] = None) -> float:
+        """
+        Seconds to add to the local clock to read the server clock.
+        """
+        if not self.samples:
+            return 0.0
+
+        midpoint, offset, _ = min(
+            self.trusted_samples()[-4:], key=lambda sample: sample[2]
+        )
+        return offset + self.drift * ((time.time() if at is None else at) - midpoint)
+
+    def age(self) -> float:
+        if not self.samples:
+            return float("inf")
+
+        return time.time() - self.samples[-1][0]
+
+    def now(self) -> float:
+        now = time.time()
+        return now + self.offset(now)
+
+
+server_clock = ServerClock()
+
+
 class TimePosition:
-    def __init__(self, is_moving: bool, position: int) -> None:
+    """
+    Playback position in milliseconds, extrapolated while moving.
+
+    With the server `timestamp` the position was reported at and a
+    synchronised `server_clock`, the extrapolation accounts for the transit
+    of the event and the skew between the clocks; otherwise it runs from the
+    moment the position was parsed.
+    """
+
+    def __init__(
+        self,
+        is_moving: bool,
+        position: int,
+        timestamp: t.Union[str, int, None] = None,
+        playback_speed: t.Optional[float] = None,
+        clock: ServerClock = server_clock,
+    ) -> None:
         self.is_moving = is_moving
         self.position = position
+        self.timestamp = int(timestamp) if timestamp else None
+        self.playback_speed = 1.0 if playback_speed is None else playback_speed
+        self.clock = clock
 
         self.time = time.time()
 
     def value(self):
-        if self.is_moving:
-            return self.position + (time.time() - self.time) * 1000
-        else:
+        if not self.is_moving:
             return self.position
+
+        if self.timestamp is not None and self.clock.synchronised:
+            elapsed = self.clock.now() * 1000 - self.timestamp
+        else:
+            elapsed = (time.time() - self.time) * 1000
+
+        return self.position + elapsed * self.playback_speed
+
+
+class Histogram:
+    """
+    Fixed, log-scaled histogram of durations in seconds (1µs to ~35min).
+    """
+
+    bounds = tuple(1e-6 * 2**exponent for exponent in range(32))
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(self.bounds) + 1)
+
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+
+        self.count += 1
+        self.total += value
+
+        if value > self.maximum:
+            self.maximum = value
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percentile: float) -> float:
+        """
+        Upper bound of the bucket holding the given percentile (0-100).
+        """
+        if not self.count:
+            return 0.0
+
+        threshold = self.count * percentile / 100
+        seen = 0
+
+        for index, count in enumerate(self.counts):
+            seen += count
+
+            if seen >= threshold and count:
+                if index == len(self.bounds):
+                    return self.maximum
+                return min(self.bounds[index], self.maximum)
+
+        return self.maximum
+
+    def summary(self) -> t.Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.mean(),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.maximum,
+        }
@@ -1,7 +1,10 @@
 import asyncio
 import threading
+import time
+import typing as t
 
 import aiohttp
+import yarl
 
 from .constants import (
     DEVICE_PAYLOAD,
@@ -41,6 +44,119 @@ WS_CONNECT_STATE_PAYLOAD = {
     },
 }
 
+# Serialised once; every connection registers with the same body.
+WS_CONNECT_STATE_BODY = json.dumps(WS_CONNECT_STATE_PAYLOAD)
+
+PING_FRAME = json.dumps({"type": "ping"})
+
+CLUSTER_FRAME_URI = "hm://connect-state/v1/cluster"
+
+# Only the cluster's own timestamps: the player state's anchors its position.
+VOLATILE_CLUSTER_FIELDS = ("timestamp", "server_timestamp_ms")
+
+
+class FrameDeduplicator:
+    """
+    Suppresses cluster frames identical to the previous one, ignoring the
+    cluster timestamps the dealer bumps on every resend.
+
+    Frames are only fingerprinted when their length matches the previous
+    frame's, so changed frames usually cost a single `len` comparison.
+    """
+
+    def __init__(self):
+        self.last_frame: t.Optional[str] = None
+        self.last_fingerprint: t.Optional[t.Dict] = None
+
+        self.received = 0
+        self.suppressed = 0
+
+    @staticmethod
+    def fingerprint(data: str) -> t.Dict:
+        """
+        The parsed frame without the volatile fields of its clusters.
+        """
+        frame = json.loads(data)
+
+        for payload in frame.get("payloads") or ():
+            cluster = payload.get("cluster") if isinstance(payload, dict) else None
+
+            if isinstance(cluster, dict):
+                for name in VOLATILE_CLUSTER_FIELDS:
+                    cluster.pop(name, None)
+
+        return frame
+
+    def is_duplicate(self, data: t.Union[bytes, str]) -> bool:
+        if isinstance(data, bytes):
+            data = data.decode()
+
+        if CLUSTER_FRAME_URI not in data:
+            return False
+
+        self.received += 1
+
+        last_frame, self.last_frame = self.last_frame, data
+
+        if last_frame is None or len(last_frame) != len(data):
+            self.last_fingerprint = None
+            return False
+
+        if self.last_fingerprint is None:
+            self.last_fingerprint = self.fingerprint(last_frame)
+
+        fingerprint = self.fingerprint(data)
+
+        if fingerprint == self.last_fingerprint:
+            self.suppressed += 1
+            return True
+
+        self.last_fingerprint = fingerprint
+        return False
+
+
+async def register_connection(
+    session: aiohttp.ClientSession,
+    access_token: str,
+    connection_id: str,
+    *,
+    invisible: bool,
+    spclient_endpoint: yarl.URL,
+) -> str:
+    """
+    Register the connection with connect-state and return the current
+    cluster as sent by the server.
+    """
+    if not invisible:
+
+        async with session.post(
+            spclient_endpoint.with_path(f"/track-playback/v1/devices"),
+            headers={
+                "Authorization": f"Bearer {access_token}",
+            },
+            json={
+                "device": DEVICE_PAYLOAD,
+                "connection_id": connection_id,
+                "client_version": "harmony:4.27.1-af7f4f3",
+                "volume": (1 << 16) - 1,
+            },
+        ) as response:
+            response.raise_for_status()
+
+    async with session.put(
+        spclient_endpoint.with_path(
+            f"/connect-state/v1/devices/hobs_{SPOTIVENTS_DEVICE_ID}"
+        ),
+        headers={
+            "Authorization": f"Bearer {access_token}",
+            "x-spotify-connection-id": connection_id,
+            "Content-Type": "application/json",
+        },
+        data=WS_CONNECT_STATE_BODY,
+    ) as response:
+        response.raise_for_status()
+        return await response.text()
+
 
 async def ws_connect(
     session: aiohttp.ClientSession,
@@ -49,49 +165,50 @@ async def ws_connect(
     heartbeat_coro,
     invisible=True,
     cluster_future=None,
+    *,
+    dealer_endpoint: yarl.URL = EVENT_DEALER_WS,
+    spclient_endpoint: yarl.URL = SPCLIENT_ENDPOINT,
+    recorder=None,
 ):
 
     access_token = (await auth.bearer_token())["accessToken"]
 
     async with session.ws_connect(
-        EVENT_DEALER_WS, params={"access_token": access_token}
+        dealer_endpoint, params={"access_token": access_token}
     ) as ws:
 
         connection_state = await ws.receive_json()
         connection_id = connection_state["headers"]["Spotify-Connection-Id"]
 
-        if not invisible:
+        cluster_state = await register_connection(
+            session,
+            access_token,
+            connection_id,
+            invisible=invisible,
+            spclient_endpoint=spclient_endpoint,
+        )
 
-            async with session.post(
-                SPCLIENT_ENDPOINT.with_path(f"/track-playback/v1/devices"),
-                headers={
-                    "Authorization": f"Bearer {access_token}",
-                },
-                json={
-                    "device": DEVICE_PAYLOAD,
-                    "connection_id": connection_id,
-                    "client_version": "harmony:4.27.1-af7f4f3",
-                    "volume": (1 << 16) - 1,
-                },
-            ) as response:
-                response.raise_for_status()
+        if recorder is not None:
+            recorder.write_cluster_state(cluster_state)
 
-        async with session.put(
-            SPCLIENT_ENDPOINT.with_path(
-                f"/connect-state/v1/devices/hobs_{SPOTIVENTS_DEVICE_ID}"
-            ),
-            headers={
-                "Authorization": f"Bearer {access_token}",
-                "x-spotify-connection-id": connection_id,
-            },
-            json=WS_CONNECT_STATE_PAYLOAD,
-        ) as response:
-            response.raise_for_status()
-            if cluster_future:
-                cluster_future.set_result(json.loads(await response.text()))
+        if cluster_future:
+            cluster_future.set_result(json.loads(cluster_state))
+
+        # This frame lives as long as the connection; do not keep the initial
+        # cluster alive with it.
+        cluster_state = cluster_future = None
 
         event_loop = asyncio.get_event_loop()
         event_loop.create_task(heartbeat_coro(ws, interval=15))
 
         async for msg in ws:
-            _ = event_loop.create_task(event_handler(msg.json()))
+            if recorder is not None and msg.type in (
+                aiohttp.WSMsgType.TEXT,
+                aiohttp.WSMsgType.BINARY,
+            ):
+                recorder.write_frame(msg.data)
+
+            _ = event_loop.create_task(event_handler(msg.data, time.time()))
+
+            # Idle connections would otherwise hold on to their last frame.
+            del msg
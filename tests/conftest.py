@@ -0,0 +1,113 @@
+import asyncio
+import copy
+
+import pytest
+
+from spotivents.client import SpotifyClient
+from spotivents.optopt import json
+
+# Trimmed down from real traffic: false booleans are omitted, as the dealer
+# does, and some fields only recent clients send are kept.
+CLUSTER_FRAME = {
+    "headers": {"Content-Type": "application/json"},
+    "method": "PUT",
+    "type": "message",
+    "uri": "hm://connect-state/v1/cluster",
+    "payloads": [
+        {
+            "cluster": {
+                "timestamp": "1666172400000",
+                "active_device_id": "d1",
+                "player_state": {
+                    "timestamp": "1666172399000",
+                    "context_uri": "spotify:playlist:37i9dQZF1DXcBWIGoYBM5M",
+                    "context_url": "context://spotify:playlist:37i9dQZF1DXcBWIGoYBM5M",
+                    "context_restrictions": {},
+                    "play_origin": {"feature_identifier": "playlist"},
+                    "index": {"track": 3},
+                    "track": {
+                        "uri": "spotify:track:4uLU6hMCjMI75M1A2tKUQC",
+                        "uid": "a1b2c3",
+                        "metadata": {"title": "Song", "artist_name": "Lead"},
+                        "provider": "context",
+                    },
+                    "playback_id": "f00",
+                    "playback_speed": 1,
+                    "position_as_of_timestamp": "12345",
+                    "duration": "210000",
+                    "is_playing": True,
+                    "is_system_initiated": True,
+                    "options": {"repeating_context": True},
+                    "restrictions": {},
+                    "suppressions": {},
+                    "prev_tracks": [],
+                    "next_tracks": [
+                        {
+                            "uri": "spotify:track:next",
+                            "uid": "n1",
+                            "metadata": {},
+                            "provider": "context",
+                        }
+                    ],
+                    "context_metadata": {},
+                    "page_metadata": {},
+                    "session_id": "s1",
+                    "queue_revision": "1",
+                    "playback_quality": {
+                        "bitrate_level": "VERY_HIGH",
+                        "hifi_status": "NONE",
+                    },
+                },
+                "devices": {
+                    "d1": {
+                        "can_play": True,
+                        "volume": 65535,
+                        "name": "Web Player",
+                        "capabilities": {"can_be_player": True, "volume_steps": 64},
+                        "device_software_version": "1.0",
+                        "device_type": "COMPUTER",
+                        "device_id": "d1",
+                        "client_id": "c1",
+                        "brand": "spotify",
+                        "model": "web_player",
+                    },
+                    "d2": {
+                        "name": "Phone",
+                        "capabilities": {},
+                        "device_type": "SMARTPHONE",
+                        "device_id": "d2",
+                    },
+                },
+                "server_timestamp_ms": "1666172400100",
+            },
+            "update_reason": "DEVICE_STATE_CHANGED",
+            "devices_that_changed": ["d1"],
+        }
+    ],
+}
+
+
+@pytest.fixture
+def cluster_frame():
+    return copy.deepcopy(CLUSTER_FRAME)
+
+
+@pytest.fixture
+def cluster_frame_data(cluster_frame):
+    return json.dumps(cluster_frame)
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    yield loop
+
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+@pytest.fixture
+def client(loop):
+    return SpotifyClient(None, None)
@@ -0,0 +1,62 @@
+import aiohttp
+
+from spotivents.broadcaster import ClusterBroadcaster
+from spotivents.optopt import json
+from spotivents.utils import apply_patch
+
+
+def without_nulls(tree):
+    if isinstance(tree, list):
+        return [without_nulls(item) for item in tree]
+
+    if not isinstance(tree, dict):
+        return tree
+
+    return {
+        key: without_nulls(value) for key, value in tree.items() if value is not None
+    }
+
+
+def test_subscribers_follow_the_cluster_from_deltas(loop, client, cluster_frame):
+    frames = [json.dumps(cluster_frame)]
+
+    cluster = cluster_frame["payloads"][0]["cluster"]
+    cluster["player_state"]["context_metadata"] = {"sorting.criteria": "title"}
+    cluster["devices"]["d1"]["volume"] = 1000
+    frames.append(json.dumps(cluster_frame))
+
+    cluster["player_state"]["context_metadata"] = {"sorting.criteria": None}
+    del cluster["devices"]["d2"]
+    frames.append(json.dumps(cluster_frame))
+
+    async def subscribe():
+        async with ClusterBroadcaster(client) as broadcaster:
+            async with aiohttp.ClientSession() as session:
+                async with session.ws_connect(
+                    f"http://127.0.0.1:{broadcaster.port}/"
+                ) as ws:
+                    messages = []
+
+                    for frame in frames:
+                        await client.event_handler(frame)
+                        messages.append(await ws.receive_json())
+
+                    return messages, broadcaster.snapshot
+
+    messages, snapshot = loop.run_until_complete(subscribe())
+
+    assert [message["type"] for message in messages] == ["snapshot", "delta", "delta"]
+    assert [message["seq"] for message in messages] == [1, 2, 3]
+
+    tree = messages[0]["cluster"]
+
+    for message in messages[1:]:
+        apply_patch(tree, message["patch"])
+
+    assert tree["devices"]["d1"]["volume"] == 1000
+    assert "d2" not in tree["devices"]
+
+    # Members that became null are removed rather than set to null.
+    assert snapshot["player_state"]["context_metadata"] == {"sorting.criteria": None}
+    assert tree["player_state"]["context_metadata"] == {}
+    assert without_nulls(tree) == without_nulls(snapshot)
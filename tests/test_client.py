@@ -0,0 +1,121 @@
+import asyncio
+import gc
+import weakref
+
+import pytest
+
+from spotivents.client import SpotifyClient
+from spotivents.optopt import json
+
+
+def test_first_cluster_is_decoded_without_hooks(loop, cluster_frame_data):
+    client = SpotifyClient(None, None, filter_payloads=True)
+
+    assert client.subscribed_subtrees() is None
+
+    loop.run_until_complete(client.event_handler(cluster_frame_data))
+
+    assert client.cluster is not None
+    assert client.cluster.active_device_id == "d1"
+    assert client.subscribed_subtrees() == set()
+
+
+def test_filtered_clusters_keep_unobserved_parts(
+    loop, cluster_frame, cluster_frame_data
+):
+    client = SpotifyClient(None, None, filter_payloads=True)
+    changes = []
+
+    @client.on_cluster_change("player_state.track.uri")
+    def on_track_change(cluster, old_value, new_value):
+        changes.append((old_value, new_value))
+
+    loop.run_until_complete(client.event_handler(cluster_frame_data))
+
+    cluster = cluster_frame["payloads"][0]["cluster"]
+    cluster["player_state"]["track"]["uri"] = "spotify:track:other"
+    cluster["active_device_id"] = "d2"
+
+    loop.run_until_complete(client.event_handler(json.dumps(cluster_frame)))
+
+    assert changes == [
+        (None, "spotify:track:4uLU6hMCjMI75M1A2tKUQC"),
+        ("spotify:track:4uLU6hMCjMI75M1A2tKUQC", "spotify:track:other"),
+    ]
+    assert client.subscribed_subtrees() == {"player_state.track.uri"}
+    assert client.cluster.devices["d1"].name == "Web Player"
+
+
+def test_coroutine_handlers_do_not_wait_for_each_other(loop, caplog):
+    finished = []
+    callbacks = []
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        finished.append("slow")
+
+    async def failing():
+        raise ValueError("handler failure")
+
+    async def fast():
+        finished.append("fast")
+
+    for handler in (slow, failing, fast):
+        SpotifyClient.event_handler_wrapper(callbacks)(handler)
+
+    task = SpotifyClient.dispatch_event_callbacks(loop, callbacks)
+    loop.run_until_complete(task)
+
+    assert finished == ["fast", "slow"]
+    assert "Event handler raised" in caplog.text
+    assert "handler failure" in caplog.text
+
+
+def test_handler_runtimes_are_kept_per_client(loop, cluster_frame_data):
+    first, second = SpotifyClient(None, None), SpotifyClient(None, None)
+
+    class Recorder:
+        def on_cluster(self, cluster):
+            pass
+
+    recorder = Recorder()
+    first.on_cluster_receive()(recorder.on_cluster)
+
+    loop.run_until_complete(first.event_handler(cluster_frame_data))
+
+    ((handler, summary),) = first.slowest_handlers()
+    assert handler == recorder.on_cluster
+    assert summary["count"] == 1
+    assert second.slowest_handlers() == []
+
+    reference = weakref.ref(recorder)
+    del first, handler, recorder
+    gc.collect()
+
+    assert reference() is None
+
+
+def test_coalescing_is_kept_per_cluster_getter(client, loop):
+    changes = []
+
+    @client.on_cluster_change("active_device_id", "timestamp", coalesce=0.01)
+    def on_change(cluster, old_value, new_value):
+        changes.append((old_value, new_value))
+
+    (device_coalescer,) = client.cluster_change_handlers["active_device_id"]
+    (timestamp_coalescer,) = client.cluster_change_handlers["timestamp"]
+
+    assert device_coalescer is not timestamp_coalescer
+
+    device_coalescer(None, "d1", "d2")
+    timestamp_coalescer(None, "1", "2")
+    device_coalescer(None, "d2", "d3")
+
+    loop.run_until_complete(asyncio.sleep(0.05))
+
+    assert sorted(changes) == [("1", "2"), ("d1", "d3")]
+
+
+def test_coalesce_is_rejected_outside_change_hooks(client):
+    with pytest.raises(TypeError):
+        client.on_cluster_receive(coalesce=0.1)
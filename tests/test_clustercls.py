@@ -0,0 +1,238 @@
+import copy
+import typing as t
+import warnings
+
+import pytest
+
+from spotivents.broadcaster import plain_value
+from spotivents.clustercls import (
+    SafeDataclass,
+    SharedObjects,
+    SpotifyDeviceStateChangeCluster,
+    SpotifyPlayerState,
+    SpotifyTrackMetadata,
+    handled_update_reasons,
+    intern_strings,
+    merge_absent_fields,
+    safe_dataclass,
+    subscribed_update_reasons,
+)
+from spotivents.deltalog import encode_tree
+from spotivents.sharding import encode_value
+
+
+@safe_dataclass
+class Model(SafeDataclass):
+
+    name: str
+    is_enabled: bool
+    is_hidden: bool = False
+
+    volume: int = 0
+    tags: t.List[str] = None
+    label: t.Optional[str] = None
+
+
+def test_compiled_constructor_is_slotted():
+    model = Model(name="a", is_enabled=True)
+
+    assert Model.__slots__ == (
+        "name",
+        "is_enabled",
+        "is_hidden",
+        "volume",
+        "tags",
+        "label",
+        "_absent_fields",
+    )
+
+    with pytest.raises(AttributeError):
+        model.unknown = 1
+
+
+def test_omitted_and_null_booleans_are_false():
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model = Model(name="a", is_hidden=None)
+
+    assert model.is_enabled is False
+    assert model.is_hidden is False
+    assert model._absent_fields == ("tags", "label")
+
+
+def test_null_fields_are_recorded_as_absent():
+    model = Model(name=None, is_enabled=True, label=None, volume=3)
+
+    assert model.name is None
+    assert model.volume == 3
+    assert set(model._absent_fields) == {"name", "tags", "label"}
+
+
+def test_models_missing_required_fields_repr_and_encode(cluster_frame):
+    data = cluster_frame["payloads"][0]["cluster"]["player_state"]
+    del data["context_url"]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        player_state = SpotifyPlayerState.from_dict(data)
+
+    assert player_state.context_url is None
+    assert "context_url" in player_state._absent_fields
+    assert "context_url=None" in repr(player_state)
+    assert player_state == copy.copy(player_state)
+
+    assert plain_value(player_state)["context_url"] is None
+    assert encode_tree(player_state)["context_url"] is None
+    assert encode_value(player_state)["context_url"] is None
+
+
+def test_schema_drift_is_reported_once():
+    @safe_dataclass
+    class Drifting(SafeDataclass):
+        name: str
+
+    with pytest.warns(UserWarning, match="New fields"):
+        Drifting(name="a", extra=1)
+
+    with pytest.warns(UserWarning, match="Missing fields"):
+        Drifting()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        Drifting(name="a", extra=1)
+        Drifting()
+
+
+def test_track_metadata_groups_dotted_keys():
+    metadata = SpotifyTrackMetadata.from_dict(
+        {
+            "actions.skipping_next_past_track": "resume",
+            "autoplay.is_autoplay": "false",
+            "media.start_position": "0",
+            "collection.artist.is_banned": "true",
+            "collection.is_banned": "false",
+            "shuffle.distribution": "1",
+            "title": "Song",
+            "artist_name": "Lead",
+            "artist_name:1": "Featured",
+            "artist_uri:1": "spotify:artist:featured",
+            "artist_name:2": "Uncredited",
+        }
+    )
+
+    assert metadata.actions == {
+        "advancing_past_track": None,
+        "skipping_next_past_track": "resume",
+        "skipping_prev_past_track": None,
+    }
+    assert metadata.autoplay == {"is_autoplay": "false"}
+    assert metadata.media == {"media_type": None, "media_start_position": "0"}
+    assert metadata.collection == {
+        "artist": {"is_banned": "true"},
+        "is_banned": "false",
+    }
+    assert metadata.shuffle == {"distribution": "1"}
+
+    assert metadata.title == "Song"
+    assert metadata.artist_name == "Lead"
+    assert metadata.artists == [
+        {"name": "Featured", "index": "1", "uri": "spotify:artist:featured"},
+        {"name": "Uncredited", "index": "2", "uri": None},
+    ]
+
+
+def test_empty_track_metadata_is_none():
+    assert SpotifyTrackMetadata.from_dict({}) is None
+    assert SpotifyTrackMetadata.from_dict(None) is None
+
+
+def test_player_state_subscriptions_skip_volume_changes():
+    reasons = subscribed_update_reasons({"player_state.track.uri", "player_state"})
+
+    assert "DEVICE_VOLUME_CHANGED" not in reasons
+    assert "DEVICE_STATE_CHANGED" in reasons
+
+
+def test_sibling_keys_are_not_player_state_subscriptions():
+    assert subscribed_update_reasons({"player_state_v2"}) == handled_update_reasons
+    assert subscribed_update_reasons(set()) == frozenset()
+    assert subscribed_update_reasons(None) == handled_update_reasons
+
+
+def materialise(cluster_frame, shared=None):
+    data = copy.deepcopy(cluster_frame["payloads"][0]["cluster"])
+    return SpotifyDeviceStateChangeCluster.from_dict(
+        "DEVICE_STATE_CHANGED", data, shared=shared
+    )
+
+
+def test_unchanged_parts_are_shared_within_a_cache(cluster_frame):
+    shared = SharedObjects()
+
+    first = materialise(cluster_frame, shared)
+    second = materialise(cluster_frame, shared)
+
+    assert second.devices["d1"] is first.devices["d1"]
+    assert second.player_state.next_tracks[0] is first.player_state.next_tracks[0]
+    assert second.player_state.track is not first.player_state.track
+
+    cluster_frame["payloads"][0]["cluster"]["devices"]["d1"]["volume"] = 1000
+    third = materialise(cluster_frame, shared)
+
+    assert third.devices["d1"] is not first.devices["d1"]
+    assert third.devices["d2"] is first.devices["d2"]
+
+
+def test_caches_are_not_shared_between_clients(cluster_frame, client, loop):
+    other = type(client)(None, None)
+
+    first = materialise(cluster_frame, client.shared_objects)
+    second = materialise(cluster_frame, other.shared_objects)
+
+    assert other.shared_objects is not client.shared_objects
+    assert second.devices["d1"] is not first.devices["d1"]
+    assert second.devices["d1"] == first.devices["d1"]
+
+
+def test_nothing_is_shared_without_a_cache(cluster_frame):
+    first = materialise(cluster_frame)
+    second = materialise(cluster_frame)
+
+    assert second.devices["d1"] is not first.devices["d1"]
+
+
+def test_intern_strings_leaves_its_input_alone():
+    data = {"uri": "".join(("spotify:", "track")), "uid": 1}
+    interned = intern_strings(data, ("uri", "uid", "provider"))
+
+    assert interned == data
+    assert interned is not data
+    assert interned["uri"] is intern_strings({"uri": "spotify:track"}, ("uri",))["uri"]
+
+
+def test_absent_fields_are_carried_over(cluster_frame):
+    old = materialise(cluster_frame)
+
+    cluster = cluster_frame["payloads"][0]["cluster"]
+    del cluster["active_device_id"]
+    del cluster["player_state"]["track"]
+    cluster["player_state"]["context_uri"] = "spotify:album:other"
+    cluster["devices"]["d2"] = None
+
+    new = materialise(cluster_frame)
+    merge_absent_fields(old, new)
+
+    assert new.active_device_id == "d1"
+    assert new.player_state.track is old.player_state.track
+    assert new.player_state.context_uri == "spotify:album:other"
+    assert new.devices["d2"] is old.devices["d2"]
+
+
+def test_devices_absent_from_a_cluster_are_carried_over(cluster_frame):
+    old = materialise(cluster_frame)
+
+    del cluster_frame["payloads"][0]["cluster"]["devices"]
+    new = materialise(cluster_frame)
+    merge_absent_fields(old, new)
+
+    assert new.devices is old.devices
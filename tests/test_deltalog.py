@@ -0,0 +1,55 @@
+import copy
+
+from spotivents.clustercls import SpotifyDeviceStateChangeCluster
+from spotivents.deltalog import DeltaLogReader, DeltaLogWriter, encode_tree
+
+
+def clusters(cluster_frame):
+    data = cluster_frame["payloads"][0]["cluster"]
+
+    yield copy.deepcopy(data)
+
+    data["player_state"]["context_metadata"] = {"sorting.criteria": "title"}
+    data["devices"]["d1"]["volume"] = 1000
+    yield copy.deepcopy(data)
+
+    data["player_state"]["context_metadata"] = {"sorting.criteria": None}
+    data["player_state"]["position_as_of_timestamp"] = "54321"
+    del data["devices"]["d2"]
+    yield copy.deepcopy(data)
+
+
+def write_log(path, cluster_frame, snapshot_interval):
+    with DeltaLogWriter(str(path), snapshot_interval=snapshot_interval) as writer:
+        for timestamp, data in enumerate(clusters(copy.deepcopy(cluster_frame)), 1):
+            writer.write(
+                SpotifyDeviceStateChangeCluster.from_dict("DEVICE_STATE_CHANGED", data),
+                timestamp,
+            )
+
+    return DeltaLogReader(str(path))
+
+
+def test_deltas_decode_like_snapshots(tmp_path, cluster_frame):
+    snapshots = write_log(tmp_path / "snapshots.log", cluster_frame, 0)
+    deltas = write_log(tmp_path / "deltas.log", cluster_frame, 256)
+
+    assert len(snapshots.snapshot_offsets) == 3
+    assert len(deltas.snapshot_offsets) == 1
+
+    for timestamp in (1, 2, 3):
+        from_snapshot = snapshots.at(timestamp)
+        from_deltas = deltas.at(timestamp)
+
+        assert encode_tree(from_deltas) == encode_tree(from_snapshot)
+
+    cluster = deltas.at(3)
+
+    assert cluster.player_state.context_metadata == {}
+    assert cluster.player_state.position_as_of_timestamp.position == 54321
+    assert set(cluster.devices) == {"d1"}
+    assert cluster.devices["d1"].volume == 1000
+
+
+def test_before_the_first_cluster(tmp_path, cluster_frame):
+    assert write_log(tmp_path / "deltas.log", cluster_frame, 256).at(0.5) is None
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from spotivents.controller import SpotifyAPIControllerClient
+from spotivents.effects import EffectTracker
+from spotivents.optimistic import IS_PAUSED, POSITION, Expectations
+from spotivents.optopt import json
+
+
+def receive(client, loop, cluster_frame, **changes):
+    cluster_frame["payloads"][0]["cluster"]["player_state"].update(changes)
+    loop.run_until_complete(client.event_handler(json.dumps(cluster_frame)))
+
+
+def test_pause_and_resume_effects_ignore_the_position(client, loop, cluster_frame_data):
+    loop.run_until_complete(client.event_handler(cluster_frame_data))
+
+    assert set(Expectations(client).paused(True)) == {IS_PAUSED, POSITION}
+    assert EffectTracker(client).paused(True) == {IS_PAUSED: True}
+    assert set(EffectTracker(client).seeked(1000)) == {POSITION}
+
+
+def test_effects_are_timed_once_received(
+    client, loop, cluster_frame, cluster_frame_data
+):
+    loop.run_until_complete(client.event_handler(cluster_frame_data))
+    effects = EffectTracker(client)
+
+    expectation = effects.expect("pause", effects.paused(True))
+    receive(client, loop, cluster_frame, position_as_of_timestamp="99999")
+
+    assert not expectation.future.done()
+
+    receive(client, loop, cluster_frame, is_paused=True)
+    latency = loop.run_until_complete(effects.wait(expectation))
+
+    assert latency > 0
+    assert effects.waiting == []
+    assert effects.summary()["pause@d1"]["count"] == 1
+    assert effects.expect("pause", effects.paused(True)) is None
+
+
+def test_effects_not_shown_time_out(client, loop, cluster_frame_data):
+    loop.run_until_complete(client.event_handler(cluster_frame_data))
+    effects = EffectTracker(client)
+
+    expectation = effects.expect("pause", effects.paused(True))
+
+    with pytest.raises(asyncio.TimeoutError):
+        loop.run_until_complete(effects.wait(expectation, 0.01))
+
+    assert effects.waiting == []
+    assert effects.summary()["pause@d1"]["timeouts"] == 1
+
+
+@pytest.mark.parametrize("playback", ("skip_next", "skip_prev"))
+def test_skips_have_no_effect_to_wait_for(client, loop, playback):
+    controller = SpotifyAPIControllerClient(None, None).link(client)
+
+    with pytest.raises(ValueError):
+        loop.run_until_complete(controller.set_playback(playback, wait_for_effect=True))
@@ -0,0 +1,60 @@
+import copy
+
+from spotivents.clustercls import SpotifyDeviceStateChangeCluster
+from spotivents.history import PlaybackHistory
+
+
+def cluster_at(cluster_frame, timestamp, **player_state):
+    data = copy.deepcopy(cluster_frame["payloads"][0]["cluster"])
+    data["server_timestamp_ms"] = str(timestamp * 1000)
+    data["player_state"].update(player_state)
+
+    return SpotifyDeviceStateChangeCluster.from_dict("DEVICE_STATE_CHANGED", data)
+
+
+def test_unchanged_states_are_recorded_once(cluster_frame):
+    history = PlaybackHistory()
+
+    history.record(cluster_at(cluster_frame, 10))
+    history.record(cluster_at(cluster_frame, 11))
+
+    assert len(history) == 1
+
+
+def test_played_between_merges_stretches_of_a_track(cluster_frame):
+    history = PlaybackHistory()
+    other = {"uri": "spotify:track:other", "provider": "context"}
+
+    history.record(cluster_at(cluster_frame, 10))
+    history.record(cluster_at(cluster_frame, 20, position_as_of_timestamp="50000"))
+    history.record(cluster_at(cluster_frame, 30, is_paused=True))
+    history.record(cluster_at(cluster_frame, 40, track=other))
+
+    track = cluster_frame["payloads"][0]["cluster"]["player_state"]["track"]["uri"]
+
+    assert history.played_between(until=50) == [
+        (track, 10, 30),
+        ("spotify:track:other", 40, 50),
+    ]
+    assert history.played_between(15, 45) == [
+        (track, 15, 30),
+        ("spotify:track:other", 40, 45),
+    ]
+    assert history.time_per_device(until=50) == {"d1": 30}
+
+
+def test_evicted_entries_release_their_strings(cluster_frame):
+    history = PlaybackHistory(capacity=2)
+
+    for timestamp in range(3):
+        uri = f"spotify:track:{timestamp}"
+        history.record(
+            cluster_at(cluster_frame, timestamp, track={"uri": uri, "provider": "c"})
+        )
+
+    assert len(history) == 2
+    assert "spotify:track:0" not in history.track_uris.ids
+    assert [uri for uri, *_ in history.played_between(until=3)] == [
+        "spotify:track:1",
+        "spotify:track:2",
+    ]
@@ -0,0 +1,164 @@
+import asyncio
+import contextvars
+
+import aiohttp
+import pytest
+
+from spotivents.hub import SpotifyClientHub
+from spotivents.optopt import json
+from spotivents.replay import DealerStandIn, FrameRecorder, ReplayAuthenticator
+
+
+@pytest.fixture
+def recording(tmp_path, cluster_frame):
+    path = tmp_path / "session.rec"
+
+    with FrameRecorder(str(path)) as recorder:
+        recorder.write_cluster_state(
+            json.dumps(cluster_frame["payloads"][0]["cluster"])
+        )
+
+        cluster_frame["payloads"][0]["cluster"]["active_device_id"] = "d2"
+        recorder.write_frame(json.dumps(cluster_frame))
+
+    return str(path)
+
+
+def stand_in_hub(session, stand_in, **options):
+    return SpotifyClientHub(
+        session,
+        dealer_endpoint=stand_in.dealer_endpoint,
+        spclient_endpoint=stand_in.spclient_endpoint,
+        **options,
+    )
+
+
+def test_handlers_are_routed_to_their_accounts(loop, recording):
+    received, routed = [], []
+
+    async def run():
+        async with DealerStandIn(recording, speed=None) as stand_in:
+            async with aiohttp.ClientSession() as session:
+                hub = stand_in_hub(session, stand_in)
+
+                @hub.on_cluster_receive()
+                def on_receive(cluster):
+                    received.append((hub.current_account.get(), cluster.type))
+
+                @hub.on_cluster_change("active_device_id", accounts=["b"])
+                async def on_device_change(cluster, old_value, new_value):
+                    routed.append((hub.current_account.get(), new_value))
+
+                for account_id in ("a", "b"):
+                    hub.add_account(account_id, ReplayAuthenticator())
+
+                await hub.run()
+
+                for _ in range(10):
+                    await asyncio.sleep(0)
+
+                await hub.close()
+
+    loop.run_until_complete(run())
+
+    assert sorted(received) == [
+        ("a", "DEVICE_STATE_CHANGED"),
+        ("a", "ON_LOAD"),
+        ("b", "DEVICE_STATE_CHANGED"),
+        ("b", "ON_LOAD"),
+    ]
+    assert ("b", "d2") in routed
+    assert {account_id for account_id, _ in routed} == {"b"}
+
+
+def test_heartbeats_are_sent_from_the_wheel(loop, recording):
+    async def run():
+        async with DealerStandIn(
+            recording, speed=None, close_after_replay=False
+        ) as stand_in:
+            async with aiohttp.ClientSession() as session:
+                hub = stand_in_hub(
+                    session,
+                    stand_in,
+                    heartbeat_interval=0.1,
+                    heartbeat_resolution=0.025,
+                )
+
+                for account_id in ("a", "b"):
+                    hub.add_account(account_id, ReplayAuthenticator())
+                    hub.start_account(account_id)
+
+                await asyncio.sleep(0.35)
+                await hub.close()
+
+                return stand_in.pings, list(hub.clients.values())
+
+    pings, clients = loop.run_until_complete(run())
+
+    # Two connections pinged about every 0.1s each, from a single task.
+    assert pings >= 4
+    assert all(client.latency != float("inf") for client in clients)
+
+
+def test_accounts_are_added_started_and_removed(loop):
+    hub = SpotifyClientHub(None)
+    client = hub.add_account("a", ReplayAuthenticator())
+
+    assert hub.client("a") is client
+    assert client.cluster_change_handlers is hub.cluster_change_handlers
+    assert client.handler_runtimes is hub.handler_runtimes
+
+    with pytest.raises(ValueError):
+        hub.add_account("a", ReplayAuthenticator())
+
+    started = asyncio.Event()
+
+    async def run_account(account_id, *, is_invisible=False):
+        started.set()
+        await asyncio.sleep(3600)
+
+    hub.run_account = run_account
+
+    task = hub.start_account("a")
+
+    assert hub.start_account("a") is task
+
+    loop.run_until_complete(started.wait())
+    hub.remove_account("a")
+    loop.run_until_complete(asyncio.sleep(0))
+
+    assert task.cancelled()
+    assert "a" not in hub.clients
+    assert hub.account_tasks == {}
+
+    loop.run_until_complete(hub.close())
+
+
+def test_changes_are_coalesced_per_account(loop):
+    hub = SpotifyClientHub(None)
+    changes = []
+
+    @hub.on_cluster_change("active_device_id", coalesce=0.01)
+    def on_device_change(cluster, old_value, new_value):
+        changes.append((hub.current_account.get(), old_value, new_value))
+
+    (handler,) = hub.cluster_change_handlers["active_device_id"]
+
+    def change(account_id, old_value, new_value):
+        context = contextvars.copy_context()
+        context.run(hub.current_account.set, account_id)
+        context.run(handler, None, old_value, new_value)
+
+    change("a", "d1", "d2")
+    change("b", "d3", "d4")
+    change("a", "d2", "d5")
+    loop.run_until_complete(asyncio.sleep(0.05))
+
+    assert sorted(changes) == [("a", "d1", "d5"), ("b", "d3", "d4")]
+
+
+def test_coalesce_is_rejected_on_other_hooks():
+    hub = SpotifyClientHub(None)
+
+    with pytest.raises(TypeError, match="coalesce"):
+        hub.on_cluster_receive(coalesce=0.1)
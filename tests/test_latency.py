@@ -0,0 +1,46 @@
+from spotivents.latency import LatencyMonitor, LatencySeries
+
+
+def test_pongs_are_matched_to_the_oldest_outstanding_ping():
+    monitor = LatencyMonitor()
+
+    monitor.ping_sent(100.0)
+    monitor.ping_sent(115.0)
+
+    assert monitor.pong_received(100.25) == 0.25
+    assert monitor.pong_received(115.5) == 0.5
+    assert monitor.pong_received(116.0) is None
+
+    assert monitor.summary()["rtt"]["count"] == 2
+
+
+def test_pings_unanswered_past_the_timeout_are_lost():
+    monitor = LatencyMonitor()
+
+    monitor.ping_sent(0.0)
+    monitor.ping_sent(90.0)
+
+    assert monitor.pong_received(90.1) == 90.1 - 90.0
+    assert monitor.lost_pings == 1
+    assert monitor.summary()["outstanding_pings"] == 0
+
+
+def test_event_age():
+    monitor = LatencyMonitor()
+
+    assert monitor.event_received("1000", 1.5) == 0.5
+    assert monitor.event_received(None, 1.5) is None
+
+
+def test_latency_series_percentiles_cover_the_window():
+    series = LatencySeries(window=4)
+
+    for value in (10.0, 1.0, 2.0, 3.0, 4.0):
+        series.record(value)
+
+    summary = series.summary()
+
+    assert summary["count"] == 5
+    assert summary["max"] == 10.0
+    assert summary["last"] == 4.0
+    assert (summary["p50"], summary["p99"]) == (2.0, 4.0)
@@ -0,0 +1,127 @@
+import asyncio
+
+from spotivents.optimistic import (
+    IS_PAUSED,
+    MISSING,
+    OptimisticState,
+    replaced,
+    value_at,
+)
+from spotivents.optopt import json
+
+VOLUME = ("devices", "d1", "volume")
+
+
+class Model:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+def test_value_at_walks_models_and_dicts():
+    node = Model(devices={"d1": Model(volume=10)}, player_state=None)
+
+    assert value_at(node, VOLUME) == 10
+    assert value_at(node, ("devices", "d2", "volume")) is MISSING
+    assert value_at(node, ("player_state", "is_paused")) is MISSING
+    assert value_at(node, ("missing",)) is MISSING
+
+
+def test_replaced_copies_only_the_path():
+    device, other = Model(volume=10), Model(volume=20)
+    node = Model(devices={"d1": device, "d2": other})
+
+    copied = replaced(node, VOLUME, 30)
+
+    assert value_at(copied, VOLUME) == 30
+    assert device.volume == 10 and value_at(node, VOLUME) == 10
+    assert copied.devices["d2"] is other
+
+
+def optimistic_client(client, loop, cluster_frame_data, **options):
+    loop.run_until_complete(client.event_handler(cluster_frame_data))
+
+    merged, changes = [], []
+    client.on_cluster_merged()(merged.append)
+
+    @client.on_cluster_change("player_state.is_paused")
+    def on_pause(cluster, old_value, new_value):
+        changes.append(new_value)
+
+    return OptimisticState(client, **options), merged, changes
+
+
+def receive(client, loop, cluster_frame, **changes):
+    cluster_frame["payloads"][0]["cluster"]["player_state"].update(changes)
+    loop.run_until_complete(client.event_handler(json.dumps(cluster_frame)))
+
+
+def test_predictions_only_reach_change_handlers(
+    client, loop, cluster_frame, cluster_frame_data
+):
+    optimistic, merged, changes = optimistic_client(client, loop, cluster_frame_data)
+
+    prediction = optimistic.predict({IS_PAUSED: True})
+
+    assert client.cluster.player_state.is_paused is True
+    assert optimistic.confirmed.player_state.is_paused is False
+    assert changes == [True]
+    assert merged == []
+
+    optimistic.rollback(prediction)
+
+    assert client.cluster.player_state.is_paused is False
+    assert changes == [True, False]
+    assert merged == []
+    assert optimistic.summary()["rolled_back"] == 1
+
+
+def test_received_clusters_settle_predictions(
+    client, loop, cluster_frame, cluster_frame_data
+):
+    optimistic, merged, changes = optimistic_client(client, loop, cluster_frame_data)
+
+    optimistic.predict({IS_PAUSED: True})
+    receive(client, loop, cluster_frame, is_paused=False, playback_id="other")
+
+    # Not confirmed yet: the prediction stays laid over what was received.
+    assert client.cluster.player_state.is_paused is True
+    assert merged[-1].player_state.is_paused is False
+    assert optimistic.pending
+
+    receive(client, loop, cluster_frame, is_paused=True)
+
+    assert client.cluster is optimistic.confirmed
+    assert merged[-1] is optimistic.confirmed
+    assert changes == [True]
+    assert optimistic.summary() == {
+        "pending": 0,
+        "settled": 1,
+        "rolled_back": 0,
+        "expired": 0,
+    }
+
+
+def test_unconfirmed_predictions_expire(client, loop, cluster_frame_data):
+    optimistic, merged, changes = optimistic_client(
+        client, loop, cluster_frame_data, timeout=0.01
+    )
+
+    optimistic.predict({IS_PAUSED: True})
+    loop.run_until_complete(asyncio.sleep(0.05))
+
+    assert client.cluster.player_state.is_paused is False
+    assert changes == [True, False]
+    assert merged == []
+    assert optimistic.summary()["expired"] == 1
+
+
+def test_later_predictions_supersede_earlier_ones(client, loop, cluster_frame_data):
+    optimistic, _, _ = optimistic_client(client, loop, cluster_frame_data)
+
+    first = optimistic.predict({IS_PAUSED: True, VOLUME: 10})
+    second = optimistic.predict({IS_PAUSED: False})
+
+    assert first.changes == {VOLUME: 10}
+    assert optimistic.pending == [first, second]
+    assert client.cluster.devices["d1"].volume == 10
+    assert optimistic.confirmed.devices["d1"].volume == 65535
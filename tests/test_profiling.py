@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import time
+
+from spotivents.client import SpotifyClient
+from spotivents.optopt import json
+from spotivents.profiling import LoopLagMonitor, SamplingProfiler
+
+
+def busy(seconds):
+    until = time.perf_counter() + seconds
+
+    while time.perf_counter() < until:
+        pass
+
+
+def test_sampled_stacks_are_aggregated(tmp_path):
+    profiler = SamplingProfiler(threading.get_ident(), interval=0.001)
+
+    profiler.start()
+    busy(0.1)
+    path = profiler.stop(str(tmp_path / "stacks.txt"))
+
+    lines = open(path).read().splitlines()
+    counts = [int(line.rsplit(" ", 1)[1]) for line in lines]
+
+    assert profiler.samples == sum(counts) > 0
+    assert len(lines) == len(profiler.stacks)
+    assert counts == sorted(counts, reverse=True)
+    assert any("busy (" in stack[-1] for stack in profiler.stacks)
+    assert all(";" in line for line in lines)
+
+
+def test_loop_lag_is_recorded(loop):
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.start(loop)
+
+    async def block():
+        await asyncio.sleep(0.02)
+        time.sleep(0.1)
+        await asyncio.sleep(0.03)
+
+    loop.run_until_complete(block())
+    summary = monitor.stop()
+    loop.run_until_complete(asyncio.sleep(0))
+
+    assert summary["count"] >= 2
+    assert summary["max"] >= 0.05
+
+
+def test_slow_events_are_captured(loop, tmp_path, cluster_frame_data):
+    client = SpotifyClient(None, None)
+    path = tmp_path / "slow.jsonl"
+
+    @client.on_cluster_receive()
+    def slow_handler(cluster):
+        time.sleep(0.2)
+
+    watchdog = client.start_slow_event_watchdog(0.05, path=str(path))
+
+    try:
+        loop.run_until_complete(client.event_handler(cluster_frame_data))
+    finally:
+        client.stop_slow_event_watchdog()
+
+    (event,) = watchdog.events
+    (logged,) = map(json.loads, path.read_text().splitlines())
+
+    assert event.duration >= 0.2
+    assert "slow_handler" in event.stack
+    assert logged["payload"] == cluster_frame_data
+    assert logged["duration"] == event.duration
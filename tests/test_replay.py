@@ -0,0 +1,68 @@
+import asyncio
+
+import aiohttp
+
+from spotivents.client import SpotifyClient
+from spotivents.optopt import json
+from spotivents.replay import (
+    CLUSTER_STATE_RECORD,
+    FRAME_RECORD,
+    DealerStandIn,
+    FrameRecorder,
+    ReplayAuthenticator,
+    iter_records,
+)
+
+
+async def no_heartbeat(ws, interval=None):
+    pass
+
+
+def test_recorded_session_replays_end_to_end(loop, tmp_path, cluster_frame):
+    recording = tmp_path / "session.rec"
+    rerecording = tmp_path / "replayed.rec"
+
+    with FrameRecorder(str(recording)) as recorder:
+        recorder.write_cluster_state(
+            json.dumps(cluster_frame["payloads"][0]["cluster"])
+        )
+
+        cluster_frame["payloads"][0]["cluster"]["active_device_id"] = "d2"
+        recorder.write_frame(json.dumps(cluster_frame))
+
+    received = []
+
+    async def replay():
+        async with DealerStandIn(str(recording), speed=None) as stand_in:
+            assert stand_in.port != 0
+
+            async with aiohttp.ClientSession() as session:
+                client = SpotifyClient(
+                    session,
+                    ReplayAuthenticator(),
+                    dealer_endpoint=stand_in.dealer_endpoint,
+                    spclient_endpoint=stand_in.spclient_endpoint,
+                )
+                client.on_cluster_receive()(
+                    lambda cluster: received.append(
+                        (cluster.type, cluster.active_device_id)
+                    )
+                )
+
+                with FrameRecorder(str(rerecording)) as recorder:
+                    await client.run(recorder=recorder, heartbeat=no_heartbeat)
+
+                for _ in range(10):
+                    await asyncio.sleep(0)
+
+                return stand_in.sent
+
+    assert loop.run_until_complete(replay()) == 1
+    assert sorted(received) == [
+        ("DEVICE_STATE_CHANGED", "d2"),
+        ("ON_LOAD", "d1"),
+    ]
+    assert [kind for kind, _, _ in iter_records(str(rerecording))] == [
+        CLUSTER_STATE_RECORD,
+        FRAME_RECORD,
+    ]
@@ -0,0 +1,143 @@
+import asyncio
+import multiprocessing
+import os
+
+from spotivents.optopt import json
+from spotivents.sharding import ShardSupervisor, ShardWorker
+
+
+class Connection:
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.batches = []
+
+    def send_bytes(self, data: bytes):
+        if self.failures:
+            self.failures -= 1
+            raise BrokenPipeError
+
+        self.batches.append(json.loads(data))
+
+
+def test_changes_are_batched_per_loop_iteration(loop):
+    connection = Connection()
+    worker = ShardWorker(connection, ("active_device_id",), None, {})
+    forward = worker.forward("active_device_id")
+
+    forward(None, "d1", "d2")
+    forward(None, "d2", "d3")
+    loop.run_until_complete(asyncio.sleep(0))
+
+    assert connection.batches == [
+        [[None, "active_device_id", "d1", "d2"], [None, "active_device_id", "d2", "d3"]]
+    ]
+
+
+def test_failed_batches_do_not_stop_forwarding(loop):
+    connection = Connection(failures=1)
+    worker = ShardWorker(connection, ("active_device_id",), None, {})
+    forward = worker.forward("active_device_id")
+
+    forward(None, "d1", "d2")
+    loop.run_until_complete(asyncio.sleep(0))
+
+    assert worker.pending == []
+
+    forward(None, "d2", "d3")
+    loop.run_until_complete(asyncio.sleep(0))
+
+    assert connection.batches == [[[None, "active_device_id", "d2", "d3"]]]
+
+
+def test_ended_connections_are_restarted(loop, monkeypatch):
+    monkeypatch.setattr(ShardSupervisor, "restart_delay", 0.01)
+
+    worker = ShardWorker(Connection(), (), None, {})
+    runs = []
+
+    async def run_account(account_id, *, is_invisible=False):
+        runs.append(account_id)
+
+        if len(runs) < 3:
+            raise ConnectionResetError
+
+        await asyncio.sleep(3600)
+
+    worker.hub.run_account = run_account
+    worker.hub.add_account("account", None)
+    worker.start_account("account")
+
+    loop.run_until_complete(asyncio.sleep(0.1))
+
+    assert runs == ["account"] * 3
+    assert worker.crashes == {"account": 2}
+
+    worker.hub.remove_account("account")
+    loop.run_until_complete(asyncio.sleep(0.05))
+
+    assert runs == ["account"] * 3
+
+    loop.run_until_complete(worker.hub.close())
+
+
+class StandInProcess:
+    def __init__(self, target, args, name, daemon):
+        self.sentinel, self.exit_pipe = os.pipe()
+        self.pid = None
+
+    def start(self):
+        pass
+
+    def join(self, timeout=None):
+        os.close(self.sentinel)
+        os.close(self.exit_pipe)
+
+    def is_alive(self):
+        return False
+
+
+class StandInChildConnection:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def close(self):
+        # The worker would keep its end open.
+        pass
+
+
+class StandInContext:
+    Process = StandInProcess
+
+    def __init__(self):
+        self.children = []
+
+    def Pipe(self):
+        connection, child_connection = multiprocessing.Pipe()
+        self.children.append(child_connection)
+        return connection, StandInChildConnection(child_connection)
+
+
+def test_accounts_are_added_once_at_startup(loop):
+    accounts = {f"account-{index}": "sp_dc" for index in range(7)}
+
+    supervisor = ShardSupervisor(accounts, ("active_device_id",), processes=3)
+    supervisor.context = context = StandInContext()
+
+    task = loop.create_task(supervisor.run())
+    loop.run_until_complete(asyncio.sleep(0))
+
+    batches = [
+        [json.loads(child.recv_bytes()) for _ in iter(child.poll, False)]
+        for child in context.children
+    ]
+    loop.run_until_complete(supervisor.close())
+    loop.run_until_complete(task)
+
+    # One batch per worker, adding its accounts and removing none.
+    assert [len(shard_batches) for shard_batches in batches] == [1, 1, 1]
+
+    added = [batch["add"] for batch, in batches]
+
+    assert [batch["remove"] for batch, in batches] == [[], [], []]
+    assert sorted(account for shard in added for account in shard) == sorted(accounts)
+    assert sorted(map(len, added)) == [2, 2, 3]
@@ -0,0 +1,118 @@
+import asyncio
+import socket
+
+import pytest
+
+from spotivents.client import SpotifyClient
+from spotivents.controller import SpotifyAPIControllerClient
+from spotivents.replay import ReplayAuthenticator
+from spotivents.tracing import (
+    MemorySink,
+    MetricsSink,
+    PrometheusSink,
+    StatsdSink,
+    Tracer,
+)
+
+
+def test_sinks_implement_timing_and_increment():
+    with pytest.raises(TypeError):
+        MetricsSink()
+
+
+def test_frames_are_timed_per_stage(loop, cluster_frame_data):
+    sink = MemorySink()
+    client = SpotifyClient(None, None, tracer=Tracer(sink))
+
+    @client.on_cluster_change("active_device_id")
+    async def on_device_change(cluster, old_value, new_value):
+        await asyncio.sleep(0)
+
+    loop.run_until_complete(client.event_handler(cluster_frame_data))
+    loop.run_until_complete(asyncio.sleep(0.01))
+
+    assert {name for name, _ in sink.histograms} == {
+        "frame.receive",
+        "frame.decode",
+        "frame.iter_handled_payloads",
+        "frame.from_dict",
+        "frame.diff",
+        "frame.dispatch",
+        "frame.handlers",
+        "frame.total",
+    }
+    assert all(histogram.count == 1 for histogram in sink.histograms.values())
+
+
+def test_prometheus_rendering():
+    sink = PrometheusSink()
+    sink.timing("frame.total", 0.5)
+    sink.increment("controller.http_requests", 2, (("method", "pause"),))
+
+    lines = sink.render().splitlines()
+
+    assert lines[0] == "# TYPE spotivents_frame_total_seconds histogram"
+    assert 'spotivents_frame_total_seconds_bucket{le="0.262144"} 0' in lines
+    assert 'spotivents_frame_total_seconds_bucket{le="0.524288"} 1' in lines
+    assert 'spotivents_frame_total_seconds_bucket{le="+Inf"} 1' in lines
+    assert "spotivents_frame_total_seconds_sum 0.5" in lines
+    assert "spotivents_frame_total_seconds_count 1" in lines
+    assert lines[-2:] == [
+        "# TYPE spotivents_controller_http_requests_total counter",
+        'spotivents_controller_http_requests_total{method="pause"} 2',
+    ]
+
+
+def test_statsd_datagrams():
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(1)
+
+    sink = StatsdSink(port=receiver.getsockname()[1])
+
+    try:
+        sink.timing("frame.total", 0.0125, (("stage", "total"),))
+        sink.increment("controller.http_requests")
+
+        assert receiver.recv(512) == b"spotivents.frame.total:12.500|ms|#stage:total"
+        assert receiver.recv(512) == b"spotivents.controller.http_requests:1|c"
+    finally:
+        sink.close()
+        receiver.close()
+
+
+class StandInResponse:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    async def text(self):
+        return ""
+
+
+class StandInSession:
+    def request(self, method, url, *args, **kwargs):
+        return StandInResponse()
+
+
+def test_requests_are_counted_per_controller_method(loop):
+    sink = MemorySink()
+    controller = SpotifyAPIControllerClient(
+        StandInSession(), ReplayAuthenticator(), metrics=sink
+    )
+
+    loop.run_until_complete(controller.set_playback("pause", to_device="d1"))
+    loop.run_until_complete(controller.pause(to_device="d1"))
+
+    assert sink.counters == {
+        (
+            "controller.http_requests",
+            (("method", "set_playback"), ("http_method", "POST")),
+        ): 1,
+        ("controller.http_requests", (("method", "pause"), ("http_method", "POST"))): 1,
+    }
@@ -0,0 +1,84 @@
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+from spotivents.clustercls import SharedObjects
+from spotivents.optopt import json
+from spotivents.typedframes import decode_frame
+
+msgspec = pytest.importorskip("msgspec")
+
+from spotivents.typedstructs import cluster_payload_decoder  # noqa: E402
+
+
+def decoded_cluster(data, **options):
+    frame = decode_frame(data, **options)
+    (payload,) = frame["payloads"]
+    return payload["cluster"]
+
+
+def test_typed_decoder_accepts_omitted_false_booleans(cluster_frame):
+    payload = cluster_payload_decoder.decode(json.dumps(cluster_frame["payloads"][0]))
+    player_state = payload.cluster.player_state
+
+    assert player_state.options.repeating_context is True
+    assert player_state.options.shuffling_context is False
+    assert player_state.playback_quality.bitrate_level == "VERY_HIGH"
+    assert payload.cluster.devices["d2"].can_play is False
+
+
+def test_typed_and_dict_paths_agree(cluster_frame_data):
+    typed = decoded_cluster(cluster_frame_data, typed=True)
+    fallback = decoded_cluster(cluster_frame_data)
+
+    assert typed.active_device_id == fallback.active_device_id == "d1"
+    assert typed.devices == fallback.devices
+    assert typed.player_state.options == fallback.player_state.options
+    assert typed.player_state.track == fallback.player_state.track
+    assert typed.player_state.next_tracks == fallback.player_state.next_tracks
+    assert (
+        typed.player_state.position_as_of_timestamp.position
+        == fallback.player_state.position_as_of_timestamp.position
+        == 12345
+    )
+
+
+def test_msgspec_is_only_imported_for_typed_decoding(cluster_frame_data):
+    script = (
+        "import sys\n"
+        "from spotivents.typedframes import decode_frame\n"
+        "from spotivents import SpotifyClient\n"
+        f"list(decode_frame({cluster_frame_data!r})['payloads'])\n"
+        "assert 'msgspec' not in sys.modules, 'msgspec imported'\n"
+        f"list(decode_frame({cluster_frame_data!r}, typed=True)['payloads'])\n"
+        "assert 'msgspec' in sys.modules\n"
+    )
+
+    subprocess.run(
+        (sys.executable, "-W", "ignore", "-c", script),
+        check=True,
+        cwd=pathlib.Path(__file__).parent.parent,
+    )
+
+
+def test_typed_decodes_share_unchanged_parts(cluster_frame, cluster_frame_data):
+    shared = SharedObjects()
+
+    first = decoded_cluster(cluster_frame_data, typed=True, shared=shared)
+    second = decoded_cluster(cluster_frame_data, typed=True, shared=shared)
+
+    assert second.devices["d1"] is first.devices["d1"]
+    assert second.player_state.next_tracks[0] is first.player_state.next_tracks[0]
+
+    cluster_frame["payloads"][0]["cluster"]["devices"]["d1"]["volume"] = 1000
+    third = decoded_cluster(json.dumps(cluster_frame), typed=True, shared=shared)
+
+    assert third.devices["d1"] is not first.devices["d1"]
+    assert third.devices["d1"].volume == 1000
+    assert third.devices["d2"] is first.devices["d2"]
+
+    unshared = decoded_cluster(cluster_frame_data, typed=True)
+
+    assert unshared.devices["d2"] is not first.devices["d2"]
@@ -0,0 +1,165 @@
+import copy
+import dataclasses
+import time
+import types
+
+import pytest
+
+from spotivents.utils import (
+    ServerClock,
+    TimePosition,
+    apply_patch,
+    get_from_cluster_getter,
+    get_from_cluster_string,
+    header_value,
+    merge_patch,
+    set_from_cluster_string,
+    truncated_repl,
+)
+
+
+def namespace(**attributes):
+    return types.SimpleNamespace(**attributes)
+
+
+def test_dotted_getters_follow_the_path_in_order():
+    cluster = namespace(
+        player_state=namespace(track=namespace(uri="spotify:track:a", track=None))
+    )
+
+    for _ in range(32):
+        assert (
+            get_from_cluster_getter(cluster, "player_state.track.uri")
+            == "spotify:track:a"
+        )
+
+    assert get_from_cluster_string(cluster, ("player_state", "track", "track")) is None
+    assert get_from_cluster_string(None, ("player_state",)) is None
+
+
+def test_callable_getters_forgive_lookup_errors():
+    assert get_from_cluster_getter(None, lambda cluster: cluster.player_state) is None
+
+
+def test_set_from_cluster_string():
+    cluster = namespace(player_state=namespace(options=namespace(repeating=False)))
+
+    set_from_cluster_string(cluster, ("player_state", "options", "repeating"), True)
+
+    assert cluster.player_state.options.repeating is True
+
+
+def test_server_clock_trusts_the_quickest_round_trips():
+    clock = ServerClock()
+
+    assert not clock.synchronised
+    assert clock.offset() == 0.0
+
+    # Server 5s ahead; the slow sample's asymmetric transit is ignored.
+    clock.add_sample(100.0, 105.05, 100.1)
+    clock.add_sample(110.0, 118.0, 112.0)
+    clock.add_sample(120.0, 125.025, 120.05)
+
+    assert clock.synchronised
+    assert clock.offset(120.0) == pytest.approx(5.0)
+
+
+def test_server_clock_fits_drift_over_a_long_span():
+    clock = ServerClock()
+
+    for second in range(0, 121, 10):
+        clock.add_sample(second, second + 1.0 + second * 0.001, second)
+
+    assert clock.drift == pytest.approx(0.001)
+    assert clock.offset(200.0) == pytest.approx(1.2)
+
+
+def test_time_position_extrapolates_from_the_server_timestamp():
+    clock = ServerClock()
+    now = time.time()
+    clock.add_sample(now, now + 2.0, now)
+
+    position = TimePosition(True, 1000, int((now + 2.0) * 1000) - 500, 1.0, clock)
+
+    assert position.value() == pytest.approx(1500, abs=50)
+    assert TimePosition(False, 1000, None, None, clock).value() == 1000
+
+
+def without_nulls(tree):
+    if not isinstance(tree, dict):
+        return tree
+
+    return {
+        key: without_nulls(value) for key, value in tree.items() if value is not None
+    }
+
+
+def test_merge_patch_round_trip():
+    old = {
+        "active_device_id": "d1",
+        "devices": {"d1": {"volume": 1, "name": "a"}, "d2": {"volume": 2}},
+        "player_state": {"track": {"uri": "a"}, "options": None},
+    }
+    new = {
+        "active_device_id": "d2",
+        "devices": {"d1": {"volume": 3, "name": "a"}},
+        "player_state": {"track": {"uri": "a"}, "options": None},
+    }
+
+    patch = merge_patch(old, new)
+
+    assert patch == {
+        "active_device_id": "d2",
+        "devices": {"d1": {"volume": 3}, "d2": None},
+    }
+    assert without_nulls(apply_patch(copy.deepcopy(old), patch)) == without_nulls(new)
+    assert merge_patch(new, new) == {}
+
+
+def test_members_becoming_null_are_removed():
+    old = {"active_device_id": "d1", "devices": {"d1": {"name": "a"}}}
+    new = {"active_device_id": None, "devices": {"d1": {"name": None}}}
+
+    patch = merge_patch(old, new)
+    patched = apply_patch(copy.deepcopy(old), patch)
+
+    # Null can only be expressed as removal: absent members read as None.
+    assert patched == {"devices": {"d1": {}}}
+    assert patched.get("active_device_id") is None
+    assert merge_patch(patched, new) == {}
+
+
+def test_truncated_repl_cuts_at_maxlen():
+    assert truncated_repl("short") == "'short'"
+
+    for value in ("a" * 100, b"a" * 100, {"key": "a" * 100}):
+        out = truncated_repl(value, maxlen=20)
+
+        assert len(out) == 20
+        assert out[-2] == "…"
+
+    assert truncated_repl("a" * 100, maxlen=20).endswith("aa…'")
+    assert truncated_repl(list(range(100)), maxlen=20) == "[0, 1, 2, 3, ...]"
+
+
+@dataclasses.dataclass
+class Cluster:
+    devices: dict
+
+    def __repr__(self):
+        raise AssertionError("clusters must not be rendered")
+
+
+def test_truncated_repl_does_not_render_models():
+    cluster = Cluster({str(index): index for index in range(1000)})
+
+    assert truncated_repl((cluster, None)) == "(Cluster(…), None)"
+
+
+def test_header_value_is_case_insensitive():
+    headers = {"Content-Type": "application/json", "X-Other": "1"}
+
+    assert header_value(headers, "content-type") == "application/json"
+    assert header_value(headers, "x-other") == "1"
+    assert header_value(headers, "spotify-connection-id") is None
+    assert header_value({}, "content-type") is None
@@ -0,0 +1,44 @@
+from spotivents.optopt import json
+from spotivents.ws import FrameDeduplicator
+
+
+def test_resent_cluster_frames_are_suppressed(cluster_frame):
+    deduplicator = FrameDeduplicator()
+    frame = json.dumps(cluster_frame)
+
+    cluster = cluster_frame["payloads"][0]["cluster"]
+    cluster["server_timestamp_ms"] = "1666172400200"
+    resent = json.dumps(cluster_frame)
+
+    cluster["active_device_id"] = "d2"
+    changed = json.dumps(cluster_frame)
+
+    assert not deduplicator.is_duplicate(frame)
+    assert deduplicator.is_duplicate(resent)
+    assert not deduplicator.is_duplicate(changed)
+    assert deduplicator.is_duplicate(changed.encode())
+
+    assert (deduplicator.received, deduplicator.suppressed) == (4, 2)
+
+
+def test_other_frames_pass_through():
+    deduplicator = FrameDeduplicator()
+    pong = json.dumps({"type": "pong"})
+
+    assert not deduplicator.is_duplicate(pong)
+    assert not deduplicator.is_duplicate(pong)
+    assert deduplicator.received == 0
+
+
+def test_new_player_state_timestamps_get_through(cluster_frame):
+    deduplicator = FrameDeduplicator()
+    frame = json.dumps(cluster_frame)
+
+    # A repeat-one restart: same position, anchored at a new time.
+    player_state = cluster_frame["payloads"][0]["cluster"]["player_state"]
+    player_state["timestamp"] = str(int(player_state["timestamp"]) + 1000)
+    restarted = json.dumps(cluster_frame)
+
+    assert len(restarted) == len(frame)
+    assert not deduplicator.is_duplicate(frame)
+    assert not deduplicator.is_duplicate(restarted)